@@ -0,0 +1,99 @@
+import math
+import numpy as np
+from regions import tiles
+
+class GridAggregator:
+
+    def __init__(self, bounds, cell_size, capacity=64, on_sample=None):
+        # Split the bounds into square cells of cell_size degrees, with row 0 along the southern edge and column 0 along the western edge
+        # on_sample, if given, is called with the number and heatmap of every sample added
+        self.bounds = tiles.normalize(*bounds)
+        self.cell_size = cell_size
+        # Spans are rounded before the ceiling, so that 0.2 degrees in cells of 0.1 is two rows rather than three
+        south, west, north, east = self.bounds
+        self.rows = max(1, math.ceil(round((north - south)/cell_size, 9)))
+        self.columns = max(1, math.ceil(round((east - west)/cell_size, 9)))
+        self.on_sample = on_sample
+        self.samples = 0
+        self.sums = np.zeros(self.rows*self.columns)
+        self.counts = np.zeros(self.rows*self.columns, dtype=np.int64)
+        # Means are time-weighted like those of aggregators/stations.py: sums and weights count each reading for the weight of its sample, while counts are readings taken
+        self.weights = np.zeros(self.rows*self.columns)
+
+        # Spatial index of every station seen so far: stations do not move, so each uid is placed in its cell once and looked up after that
+        # Stations outside the bounds are indexed into cell -1 and left out of every heatmap
+        self.index = {}
+        self.cells = np.empty(capacity, dtype=np.intp)
+
+    @property
+    def shape(self):
+        return (self.rows, self.columns)
+
+    def locate(self, lat, lng):
+        # Cell of every coordinate, or -1 outside the bounds. Points on the northern or eastern edge fall in the last row or column
+        south, west, north, east = self.bounds
+        lat = np.asarray(lat, dtype=float)
+        lng = np.asarray(lng, dtype=float)
+        with np.errstate(invalid='ignore'):
+            row = np.minimum(np.floor((lat - south)/self.cell_size), self.rows - 1)
+            column = np.minimum(np.floor((lng - west)/self.cell_size), self.columns - 1)
+            inside = (lat >= south) & (lat <= north) & (lng >= west) & (lng <= east)
+        return np.where(inside, row*self.columns + column, -1).astype(np.intp)
+
+    def _cells(self, uid, lat, lng):
+        # Look up the cell of every station in the sample, placing the stations seen for the first time in one vectorized step
+        positions = np.empty(len(uid), dtype=np.intp)
+        new = []
+        for position, station in enumerate(uid.tolist()):
+            index = self.index.get(station)
+            if index is None:
+                index = len(self.index)
+                self.index[station] = index
+                new.append(position)
+            positions[position] = index
+
+        if new:
+            while len(self.index) > len(self.cells):
+                self.cells = np.concatenate([self.cells, np.empty(len(self.cells), dtype=np.intp)])
+            self.cells[positions[new]] = self.locate(lat[new], lng[new])
+
+        return self.cells[positions]
+
+    def add_sample(self, sample, weight=1):
+        # Reduce one parsed sample (see parsers/columnar.py) to per-cell sums and counts, add them to the period, and return its heatmap
+        # weight is the number of sampling slots the sample stands for, as when the rate adapts (see schedulers/adaptive.py)
+        cells = self._cells(sample.uid, sample.lat, sample.lng)
+        inside = cells >= 0
+        size = self.rows*self.columns
+        sums = np.bincount(cells[inside], weights=sample.aqi[inside]*weight, minlength=size)
+        counts = np.bincount(cells[inside], minlength=size)
+        return self._add(sums, counts, counts*weight, 1)
+
+    def merge(self, other):
+        # Fold in the cells of another grid over the same bounds, such as a one-sample partial built on another process
+        if other.bounds != self.bounds or other.cell_size != self.cell_size:
+            raise ValueError('Grids over different bounds or cell sizes cannot be merged')
+        self._add(other.sums, other.counts, other.weights, other.samples)
+        return self
+
+    def _add(self, sums, counts, weights, samples):
+        self.sums += sums
+        self.counts += counts
+        self.weights += weights
+        self.samples += samples
+        heatmap = mean(sums, weights, self.shape)
+        if self.on_sample is not None and samples == 1:
+            self.on_sample(self.samples, heatmap)
+        return heatmap
+
+    def means(self):
+        # Mean AQI of every cell over all samples so far, NaN where no station has reported
+        return mean(self.sums, self.weights, self.shape)
+
+def mean(sums, counts, shape):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(counts > 0, sums/counts, np.nan).reshape(shape)
+
+def to_lists(heatmap):
+    # Nested lists of a heatmap for JSON, with None for cells without stations
+    return np.where(np.isnan(heatmap), None, np.round(heatmap, 2)).tolist()
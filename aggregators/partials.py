@@ -0,0 +1,116 @@
+import collections
+import concurrent.futures
+import numpy as np
+from aggregators import grids, sketches, stations
+from instrumentation import metrics
+from parsers import columnar, payloads
+from regions import batch
+
+# Regions of the sampling run, set once in every worker process rather than shipped with every response
+_regions = None
+
+def _initialize(regions):
+    global _regions
+    _regions = batch.RegionBatch(regions) if regions is not None else None
+
+def aggregate(responses, reduce=True, with_sample=False, percentiles=(), accuracy=sketches.DEFAULT_ACCURACY, grid=None, weight=1):
+    # Runs on a worker process: decode and validate the tiles of one sample (bodies as the API sent them, or responses already decoded),
+    # merge them, and reduce the stations to per-station partial statistics, per region when sampling several
+    # Returns the readings of every station, which is all the sampling process looks at itself, the partials by region name (None for a single area),
+    # how many records had no reading, the parsed samples by region name if asked for, and a one-sample grid of per-cell sums and counts
+    # when grid holds the bounds and cell size of one
+    # Without reduce, as when a change filter has to see the readings first, no partials or grid are made and the parsed samples are always returned
+    response = payloads.validated(responses)
+    readings = columnar.readings(response)
+    responses = [(None, response)] if _regions is None else _regions.split(response)
+    partials = {}
+    dropped = 0
+    samples = []
+    cells = None
+    for name, region_response in responses:
+        parsed = columnar.parse(region_response)
+        if region_response['status'] == 'ok':
+            dropped += len(region_response['data']) - len(parsed.aqi)
+        if with_sample or not reduce:
+            samples.append((name, parsed))
+        if not reduce:
+            continue
+        partial = stations.StationAggregator(max(1, len(parsed.aqi)), percentiles, accuracy)
+        partial.add_sample(parsed, weight)
+        partials[name] = partial
+        if name is None and grid is not None:
+            cells = grids.GridAggregator(*grid)
+            cells.add_sample(parsed, weight)
+    return readings, partials, dropped, samples, cells
+
+class PartialPool:
+
+    def __init__(self, workers, regions=None):
+        # Decoding, parsing and per-station reduction run on a pool of processes, so they scale with cores rather than sharing the GIL with sampling
+        # Partials are merged in the parent in the order their responses were submitted
+        spec = None
+        if regions is not None:
+            spec = [(name, *box) for name, box in zip(regions.names, regions.boxes.tolist())]
+        self.executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=_initialize, initargs=(spec,))
+        self.pending = collections.deque()
+
+    def submit(self, responses, aggregator, regions=None, tiler=None, changes=None, scheduler=None, store=None, grid=None, sink=None, weight=1):
+        # responses are the tiles of one sample, and payloads among them are shipped to the worker as the bytes the API sent
+        # Partials keep the same statistics as the aggregators they are merged into
+        target = aggregator if regions is None else regions.aggregators[regions.names[0]]
+        percentiles = getattr(target, 'percentiles', ())
+        accuracy = getattr(target, 'accuracy', sketches.DEFAULT_ACCURACY)
+        spec = (grid.bounds, grid.cell_size) if grid is not None else None
+        contents = [response.content if isinstance(response, payloads.Payload) else response for response in responses]
+        future = self.executor.submit(aggregate, contents, reduce=changes is None, with_sample=store is not None or sink is not None, percentiles=percentiles, accuracy=accuracy, grid=spec, weight=weight)
+        self.pending.append((future, aggregator, regions, tiler, changes, scheduler, store, grid, sink, weight))
+        self.collect()
+
+    def collect(self, wait=False):
+        # Merge every finished partial at the front of the queue, or every partial when waiting
+        # The readings a worker sends back are observed here, in the order the samples were submitted, as they would be without a pool
+        while self.pending and (wait or self.pending[0][0].done()):
+            future, aggregator, regions, tiler, changes, scheduler, store, grid, sink, weight = self.pending.popleft()
+            readings, partials, dropped, samples, cells = future.result()
+            metrics.registry.count('dropped_records', dropped)
+            if scheduler is not None:
+                scheduler.observe_readings(readings.uid.tolist(), readings.time.tolist(), readings.aqi.tolist())
+            if tiler is not None:
+                tiler.observe_positions(readings.lat, readings.lng)
+
+            # Unchanged readings are only known once the worker has decoded them, so the worker returns its parsed samples rather than partials,
+            # and those of stations whose reading was updated are aggregated here
+            if changes is not None:
+                keep = changes.updated(readings.uid.tolist(), readings.time.tolist())
+                metrics.registry.count('deduplicated_records', keep.count(False))
+                updated = readings.uid[np.array(keep, dtype=bool)]
+                samples = [(name, columnar.select(sample, np.isin(sample.uid, updated))) for name, sample in samples]
+                for name, sample in samples:
+                    target = aggregator if name is None else regions.aggregators[name]
+                    target.add_sample(sample, weight)
+                    if grid is not None and name is None:
+                        grid.add_sample(sample, weight)
+
+            for name, partial in partials.items():
+                target = aggregator if name is None else regions.aggregators[name]
+                target.merge(partial)
+            if store is not None:
+                store.append(dict(samples)[None])
+            if sink is not None:
+                sink(samples)
+            if cells is not None:
+                grid.merge(cells)
+
+    def close(self, wait=True):
+        # Merge whatever is still pending unless sampling ended with an error, then stop the workers
+        try:
+            if wait:
+                self.collect(wait=True)
+        finally:
+            self.executor.shutdown(cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *args):
+        self.close(exc_type is None)
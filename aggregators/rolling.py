@@ -0,0 +1,112 @@
+from loaders import lazy
+
+np = lazy.load('numpy')
+pd = lazy.load('pandas')
+station_registry = lazy.load('storage.registry')
+
+# Lengths in minutes of the rolling windows averaged over by default
+DEFAULT_WINDOWS = (5, 15, 60)
+
+class RollingAggregator:
+
+    def __init__(self, windows=DEFAULT_WINDOWS, capacity=64, registry=None):
+        # Every station has a ring buffer of per-minute sums and counts, as long as the longest window, plus running totals per window
+        # Memory only depends on the number of stations and the longest window, never on how long sampling has run
+        # Stations are rows at their id in the station registry, as in StationAggregator
+        self.windows = tuple(sorted(set(windows)))
+        self.slots = self.windows[-1]
+        self.minute = 0
+        self.registry = registry if registry is not None else station_registry.StationRegistry()
+        self.seen = np.zeros(capacity, dtype=bool)
+        self.sums = np.zeros((capacity, self.slots))
+        self.counts = np.zeros((capacity, self.slots), dtype=np.int64)
+        self.window_sums = np.zeros((len(self.windows), capacity))
+        self.window_counts = np.zeros((len(self.windows), capacity), dtype=np.int64)
+
+    def __len__(self):
+        return int(np.count_nonzero(self.seen))
+
+    def _grow(self, size):
+        capacity = len(self.sums)
+        while capacity < size:
+            capacity *= 2
+        extra = capacity - len(self.sums)
+        self.seen = np.concatenate([self.seen, np.zeros(extra, dtype=bool)])
+        self.sums = np.concatenate([self.sums, np.zeros((extra, self.slots))])
+        self.counts = np.concatenate([self.counts, np.zeros((extra, self.slots), dtype=np.int64)])
+        self.window_sums = np.concatenate([self.window_sums, np.zeros((len(self.windows), extra))], axis=1)
+        self.window_counts = np.concatenate([self.window_counts, np.zeros((len(self.windows), extra), dtype=np.int64)], axis=1)
+
+    def _rows(self, ids):
+        if len(self.registry) > len(self.sums):
+            self._grow(len(self.registry))
+        ids = np.asarray(ids, dtype=np.intp)
+        self.seen[ids] = True
+        return ids
+
+    def add_sample(self, sample, weight=1):
+        # Add one parsed sample (see parsers/columnar.py), whose stations are interned by uid
+        self.add_rows(self.registry.intern(sample.uid, sample.name, sample.lat, sample.lng, sample.time), sample.aqi, weight)
+
+    def add_columns(self, names, values, weight=1):
+        # Add one sample given as parallel arrays of station names and AQI values, for readings without uids
+        self.add_rows(self.registry.intern_names(names), values, weight)
+
+    def add_rows(self, ids, values, weight=1):
+        # Add one sample's readings to the current minute's bucket and to every window, touching only the rows of the sample's stations
+        # A sample standing for weight sampling slots counts weight times, as in StationAggregator
+        if not len(values):
+            return
+        self._add(self._rows(ids), weight*np.asarray(values, dtype=float), np.full(len(values), weight, dtype=np.int64))
+
+    def merge(self, other):
+        # Add the readings of a per-station partial (see aggregators/partials.py) to the current minute
+        rows = np.flatnonzero(other.count)
+        if not len(rows):
+            return self
+        indices = self._rows(rows if other.registry is self.registry else self.registry.adopt(other.registry, rows))
+        self._add(indices, other.mean[rows]*other.weight[rows], other.weight[rows].astype(np.int64))
+        return self
+
+    def _add(self, indices, sums, counts):
+        # Unbuffered adds, so that a station appearing twice in a sample (as where tiles overlap) counts twice
+        slot = self.minute % self.slots
+        np.add.at(self.sums[:, slot], indices, sums)
+        np.add.at(self.counts[:, slot], indices, counts)
+        np.add.at(self.window_sums, (slice(None), indices), sums)
+        np.add.at(self.window_counts, (slice(None), indices), counts)
+
+    def advance(self, minute):
+        # Move on to a later minute, subtracting the buckets that fall out of each window and clearing the slots about to be reused
+        # AQI readings are integers, so the running sums stay exact in float64 however long this runs
+        if minute - self.minute >= self.slots:
+            self.sums[:] = 0
+            self.counts[:] = 0
+            self.window_sums[:] = 0
+            self.window_counts[:] = 0
+            self.minute = minute
+            return
+
+        while self.minute < minute:
+            self.minute += 1
+            for position, window in enumerate(self.windows):
+                leaving = (self.minute - window) % self.slots
+                self.window_sums[position] -= self.sums[:, leaving]
+                self.window_counts[position] -= self.counts[:, leaving]
+            slot = self.minute % self.slots
+            self.sums[:, slot] = 0
+            self.counts[:, slot] = 0
+
+    def to_frame(self):
+        # Mean AQI of each station over every window ending at the current minute, sorted on the shortest window in descending order
+        rows = np.flatnonzero(self.seen)
+        frame = pd.DataFrame({'station.name': pd.Series(self.registry.names[rows], dtype=object)})
+        with np.errstate(invalid='ignore', divide='ignore'):
+            for position, window in enumerate(self.windows):
+                counts = self.window_counts[position, rows]
+                frame[f'mean_{window}'] = np.where(counts > 0, self.window_sums[position, rows]/counts, np.nan)
+
+        columns = [f'mean_{window}' for window in self.windows]
+        frame = frame.dropna(subset=columns, how='all')
+        frame = frame.sort_values(by=[columns[0], 'station.name'], ascending=False, na_position='last')
+        return frame.reset_index(drop=True)
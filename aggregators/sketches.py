@@ -0,0 +1,50 @@
+import math
+from loaders import lazy
+
+np = lazy.load('numpy')
+
+# Relative accuracy of every quantile estimate, e.g. 0.01 means within 1% of the true reading
+DEFAULT_ACCURACY = 0.01
+
+# Largest AQI with buckets of its own. Higher readings share the top bucket, but the exact maximum is still kept by the aggregator
+MAX_VALUE = 1000
+
+class QuantileSketch:
+
+    def __init__(self, capacity=64, accuracy=DEFAULT_ACCURACY, max_value=MAX_VALUE):
+        # One log-bucketed histogram per station (as in DDSketch): bucket i >= 1 counts readings in (gamma^(i-2), gamma^(i-1)], and bucket 0 readings of 0
+        # Counts only ever add up, so sketches built on other processes merge exactly, and memory is fixed by stations × buckets
+        self.accuracy = accuracy
+        self.gamma = (1 + accuracy)/(1 - accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.buckets = int(math.ceil(math.log(max_value)/self.log_gamma)) + 2
+        self.counts = np.zeros((capacity, self.buckets), dtype=np.uint32)
+
+    def grow(self, capacity):
+        extra = capacity - len(self.counts)
+        self.counts = np.concatenate([self.counts, np.zeros((extra, self.buckets), dtype=np.uint32)])
+
+    def add(self, indices, values, weight=1):
+        # Count every reading in its station's bucket, weight times for a sample that stands for several sampling slots
+        with np.errstate(divide='ignore'):
+            buckets = np.ceil(np.log(np.maximum(values, 1))/self.log_gamma) + 1
+        buckets = np.where(values > 0, np.clip(buckets, 1, self.buckets - 1), 0).astype(np.intp)
+        np.add.at(self.counts.reshape(-1), indices*self.buckets + buckets, weight)
+
+    def merge(self, other, indices, rows=None):
+        # Add another sketch's counts at rows (its first len(indices) by default), whose stations are at the given rows of this one
+        if other is None or other.buckets != self.buckets or other.accuracy != self.accuracy:
+            raise ValueError('Only sketches with the same accuracy can be merged')
+        self.counts[indices] += other.counts[rows if rows is not None else slice(len(indices))]
+
+    def quantiles(self, quantiles, size):
+        # Estimate every quantile (between 0 and 1) for the first size stations, NaN for stations without readings
+        cumulative = np.cumsum(self.counts[:size], axis=1, dtype=np.int64)
+        total = cumulative[:, -1]
+        estimates = np.full((size, len(quantiles)), np.nan)
+        for column, quantile in enumerate(quantiles):
+            rank = quantile*(total - 1)
+            bucket = np.argmax(cumulative > rank[:, np.newaxis], axis=1)
+            value = np.where(bucket > 0, 2*self.gamma**(bucket - 1)/(self.gamma + 1), 0.0)
+            estimates[:, column] = np.where(total > 0, value, np.nan)
+        return estimates
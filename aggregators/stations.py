@@ -0,0 +1,146 @@
+import numpy as np
+import pandas as pd
+from aggregators import sketches
+from storage import registry as station_registry
+
+class StationAggregator:
+
+    def __init__(self, capacity=64, percentiles=(), accuracy=sketches.DEFAULT_ACCURACY, registry=None):
+        # Every station is a row of the running statistic arrays, at its id in the station registry (see storage/registry.py)
+        # Stations are interned by uid, so two stations with the same name are kept apart, and names are only looked up when the table is built
+        # Aggregators of the same run (such as one per region) can share a registry. The arrays grow by doubling when a new station appears
+        # Percentiles (such as 50 and 95) are only estimated when asked for, from a quantile sketch per station
+        self.percentiles = tuple(percentiles)
+        self.accuracy = accuracy
+        self.sketch = sketches.QuantileSketch(capacity, accuracy) if self.percentiles else None
+        self.registry = registry if registry is not None else station_registry.StationRegistry()
+        self.samples = 0
+        self.count = np.zeros(capacity, dtype=np.int64)
+        self.weight = np.zeros(capacity)
+        self.mean = np.zeros(capacity)
+        self.m2 = np.zeros(capacity)
+        self.minimum = np.full(capacity, np.inf)
+        self.maximum = np.full(capacity, -np.inf)
+
+    def __len__(self):
+        # Stations with at least one reading, which can be fewer than a shared or persisted registry holds
+        return int(np.count_nonzero(self.count))
+
+    @property
+    def names(self):
+        return self.registry.names[np.flatnonzero(self.count)].tolist()
+
+    def _grow(self, size):
+        capacity = len(self.count)
+        while capacity < size:
+            capacity *= 2
+        extra = capacity - len(self.count)
+        self.count = np.concatenate([self.count, np.zeros(extra, dtype=np.int64)])
+        self.weight = np.concatenate([self.weight, np.zeros(extra)])
+        self.mean = np.concatenate([self.mean, np.zeros(extra)])
+        self.m2 = np.concatenate([self.m2, np.zeros(extra)])
+        self.minimum = np.concatenate([self.minimum, np.full(extra, np.inf)])
+        self.maximum = np.concatenate([self.maximum, np.full(extra, -np.inf)])
+        if self.sketch is not None:
+            self.sketch.grow(capacity)
+
+    def _rows(self, ids):
+        if len(self.registry) > len(self.count):
+            self._grow(len(self.registry))
+        return np.asarray(ids, dtype=np.intp)
+
+    def add(self, data):
+        # Feed one normalized sample (a DataFrame with 'aqi' and 'station.name' columns) into the running statistics
+        if data is None or data.empty:
+            self.samples += 1
+            return
+        self.add_columns(data['station.name'].to_numpy(), data['aqi'].to_numpy(dtype=float))
+
+    def add_sample(self, sample, weight=1):
+        # Feed one parsed sample (see parsers/columnar.py), whose stations are interned by uid
+        # weight is how many sampling slots the sample stands for, so that means stay time-weighted when the rate changes during a run
+        self.add_rows(self.registry.intern(sample.uid, sample.name, sample.lat, sample.lng, sample.time), sample.aqi, weight)
+
+    def add_columns(self, names, values, weight=1):
+        # Feed one sample given as parallel arrays of station names and AQI values, for readings without uids
+        self.add_rows(self.registry.intern_names(names), values, weight)
+
+    def add_rows(self, ids, values, weight=1):
+        self.samples += 1
+        if len(values):
+            self.update(ids, values, weight)
+
+    def update(self, ids, values, weight=1):
+        # Feed readings of the stations at the given registry ids, without counting a sample
+        indices = self._rows(ids)
+        values = np.asarray(values, dtype=float)
+        size = len(self.count)
+
+        # Reduce the batch per station, then merge it into the running statistics (Chan et al. parallel variance, with every reading counted weight times)
+        batch_count = np.bincount(indices, minlength=size)
+        batch_mean = np.bincount(indices, weights=values, minlength=size)
+        touched = np.flatnonzero(batch_count)
+        batch_mean[touched] /= batch_count[touched]
+        batch_m2 = weight*np.bincount(indices, weights=(values - batch_mean[indices])**2, minlength=size)
+
+        current = self.weight[touched]
+        added = weight*batch_count[touched]
+        total = current + added
+        delta = batch_mean[touched] - self.mean[touched]
+        self.mean[touched] += delta*added/total
+        self.m2[touched] += batch_m2[touched] + delta**2*current*added/total
+        self.weight[touched] = total
+        self.count[touched] += batch_count[touched]
+
+        np.minimum.at(self.minimum, indices, values)
+        np.maximum.at(self.maximum, indices, values)
+        if self.sketch is not None:
+            self.sketch.add(indices, values, weight)
+
+    def merge(self, other):
+        # Fold in the statistics of another aggregator, such as a partial built on another process (Chan et al. parallel variance)
+        # Stations of an aggregator with another registry are interned into this one by uid
+        self.samples += other.samples
+        rows = np.flatnonzero(other.count)
+        if not len(rows):
+            return self
+
+        indices = self._rows(rows if other.registry is self.registry else self.registry.adopt(other.registry, rows))
+        current = self.weight[indices]
+        added = other.weight[rows]
+        total = current + added
+        delta = other.mean[rows] - self.mean[indices]
+        self.mean[indices] += delta*added/total
+        self.m2[indices] += other.m2[rows] + delta**2*current*added/total
+        self.weight[indices] = total
+        self.count[indices] += other.count[rows]
+
+        self.minimum[indices] = np.minimum(self.minimum[indices], other.minimum[rows])
+        self.maximum[indices] = np.maximum(self.maximum[indices], other.maximum[rows])
+        if self.sketch is not None:
+            self.sketch.merge(other.sketch, indices, rows)
+        return self
+
+    def to_frame(self):
+        # Build the final per-station table in O(stations), sorted on mean AQI in descending order, looking up station names only now
+        rows = np.flatnonzero(self.count)
+        count = self.count[rows]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            std = np.where(count > 1, np.sqrt(self.m2[rows]/(self.weight[rows] - 1)), np.nan)
+
+        frame = pd.DataFrame({
+            'station.name': pd.Series(self.registry.names[rows], dtype=object),
+            'mean': self.mean[rows],
+            'count': count,
+            'min': self.minimum[rows],
+            'max': self.maximum[rows],
+            'std': std
+        })
+
+        # Estimates are clamped to the exact minimum and maximum, so a station whose reading never changed gets that reading back
+        if self.sketch is not None:
+            estimates = self.sketch.quantiles([percent/100 for percent in self.percentiles], len(self.count))[rows]
+            for column, percent in enumerate(self.percentiles):
+                frame[f'p{percent:g}'] = np.clip(estimates[:, column], self.minimum[rows], self.maximum[rows])
+        frame = frame.sort_values(by=['mean', 'station.name'], ascending=False)
+        return frame.reset_index(drop=True)
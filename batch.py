@@ -0,0 +1,50 @@
+from argparse import ArgumentParser
+from evaluators import integers
+from loaders import lazy
+import script
+
+batch = lazy.load('regions.batch')
+
+def main(regions, period, rate, options=None, **changes):
+    # Any of the Options of the run can also be given by name, as with script.main
+    options = (options if options is not None else script.Options())._replace(**changes)
+    with script.rendering(options.output) as renderer:
+        return run(regions, period, rate, options, renderer)
+
+def run(regions, period, rate, options, output):
+    # Returns the RegionBatch holding the aggregator of every region
+    # The aggregators share the station registry, which is saved at the end of the run when it was loaded from a file
+    regions = batch.RegionBatch(regions, options.tile_size, options.tile_max_stations, script.evaluated_statistics.percentiles(options.statistics), options.accuracy, options.registry)
+    samples = period*rate
+    readings = f'{samples}' if options.min_rate is None else f'time-weighted {options.min_rate} to {rate} per minute'
+    script.log(f'Calculating average of {readings} PM2.5 readings over {period} minute(s) in {len(regions.names)} region(s), with {len(regions.tiler.tiles())} API call(s) per sample.\n')
+
+    # Every tile covering the union of the regions is fetched once per sample, and stations are fanned out to each region containing them
+    south, west, north, east = regions.bounds
+    with script.instrumented(options.metrics_file, options.metrics_port), script.recording(options.record) as recorder, script.registered(regions.registry):
+        script.run_sampling(south, west, north, east, period, rate, options, script.Context(tiler=regions.tiler, regions=regions, recorder=recorder, sink=output.sink))
+
+        for name in regions.names:
+            output.averages(regions.aggregators[name], samples if options.min_rate is None else regions.aggregators[name].samples, f'{period} minute(s) in region {name}', options.weighting, options.statistics, name)
+
+    return regions
+
+if __name__ == '__main__':
+
+    # Handle command line input arguments from user
+    parser = ArgumentParser(description='Calculates the average PM2.5 readings from stations within each of several named areas over a period')
+    parser.add_argument('regions', help='File of named bounding boxes, one name,lat1,lng1,lat2,lng2 per line')
+    parser.add_argument('period', nargs='?', default=5, type=integers.positive_int, help='Sampling period in minutes')
+    parser.add_argument('rate', nargs='?', default=1, type=integers.positive_int, help='Sampling rate in samples per minute')
+    script.add_sampling_arguments(parser)
+    args = parser.parse_args()
+    script.check_rate(parser, args)
+    if args.simulate is None:
+        script.resolve_api_key(parser, args)
+
+    try:
+        regions = batch.load_regions(args.regions)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+
+    main(regions, args.period, args.rate, script.parsed_options(parser, args))
\ No newline at end of file
@@ -0,0 +1,73 @@
+import argparse
+import contextlib
+import io
+import random
+import time
+import pandas as pd
+from parsers import columnar
+import script
+
+def synthetic_response(stations, missing=0.1, seed=0):
+    # A /v2/map/bounds response with the given number of stations, a fraction of them reporting '-' for AQI
+    generator = random.Random(seed)
+    data = []
+    for uid in range(stations):
+        data.append({
+            'lat': generator.uniform(-60, 70),
+            'lon': generator.uniform(-180, 180),
+            'uid': uid,
+            'aqi': '-' if generator.random() < missing else str(generator.randint(0, 300)),
+            'station': {'name': f'Synthetic Station {uid}, Somewhere', 'time': '2022-11-08T11:00:00+09:00'}
+        })
+    return {'status': 'ok', 'data': data}
+
+def legacy_normalize(response):
+    # normalize_response as it was before the columnar fast path, kept here as the baseline
+    data = pd.json_normalize(response, 'data')
+    if not data.empty:
+        data = data[['aqi', 'station.name']]
+        data['aqi'] = pd.to_numeric(data['aqi'], errors='coerce')
+        data = data.dropna()
+        data = data.sort_values(by=['aqi', 'station.name'], ascending=False)
+        data = data.reset_index(drop=True)
+
+        for index, row in data.iterrows():
+            print('AQI: {aqi}, Station {idx}: {station}'.format(idx=index+1, aqi=row['aqi'], station=row['station.name']))
+        print('')
+
+        return data
+    else:
+        print('No data for given latitude and longitude arguments at this current time.\n')
+        return pd.DataFrame(columns=['aqi', 'station.name'])
+
+def cpu_time(function, response, repeat):
+    # Best CPU time per call over repeat runs, with anything printed discarded
+    best = float('inf')
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeat):
+            start = time.process_time()
+            function(response)
+            best = min(best, time.process_time() - start)
+    return best
+
+def main(stations, repeat):
+    response = synthetic_response(stations)
+    results = [
+        ('json_normalize + iterrows (before)', cpu_time(legacy_normalize, response, repeat)),
+        ('normalize_response, printing', cpu_time(lambda response: script.normalize_response(response, True), response, repeat)),
+        ('normalize_response, not printing', cpu_time(lambda response: script.normalize_response(response, False), response, repeat)),
+        ('columnar.parse only', cpu_time(columnar.parse, response, repeat))
+    ]
+
+    print(f'Per-sample CPU time for a response of {stations} stations (best of {repeat}):')
+    baseline = results[0][1]
+    for name, seconds in results:
+        print(f'{name:<36} {seconds*1000:9.2f} ms  {baseline/seconds:6.1f}x')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks the CPU time of normalizing one API response')
+    parser.add_argument('--stations', default=20000, type=int, help='Number of stations in the synthetic response')
+    parser.add_argument('--repeat', default=5, type=int, help='Number of runs to take the best of')
+    args = parser.parse_args()
+
+    main(args.stations, args.repeat)
@@ -0,0 +1,44 @@
+import argparse
+import json
+import os
+import time
+from benchmarks import normalize
+from aggregators import partials, stations
+from parsers import payloads
+import script
+
+def process(bodies, workers):
+    # Decode, parse and aggregate every body as sampling does, in the sampling process without workers, or on a pool of workers otherwise
+    aggregator = stations.StationAggregator()
+    if not workers:
+        for body in bodies:
+            script.process_response(payloads.validated([payloads.Payload(body)]), aggregator, verbose=False)
+        return aggregator
+
+    with partials.PartialPool(workers) as pool:
+        for body in bodies:
+            script.process_response([payloads.Payload(body)], aggregator, pool=pool)
+    return aggregator
+
+def main(stations, samples, workers):
+    body = json.dumps(normalize.synthetic_response(stations), separators=(',', ':')).encode()
+    bodies = [body]*samples
+    print(f'Processing {samples} responses of {stations} stations ({len(body)/2**20:.1f} MB each) on {os.cpu_count()} core(s):')
+
+    for count in workers:
+        start = time.perf_counter()
+        cpu = time.process_time()
+        aggregator = process(bodies, count)
+        cpu = time.process_time() - cpu
+        elapsed = time.perf_counter() - start
+        label = f'{count:>3} worker(s)' if count else ' in process  '
+        print(f'{label} {elapsed:8.2f} s  {aggregator.samples/elapsed:9.1f} samples/s  {cpu/samples*1000:8.1f} ms of sampling process CPU per sample')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks how decoding and aggregating responses on --parse-workers scales with cores')
+    parser.add_argument('--stations', default=20000, type=int, help='Number of stations in every response')
+    parser.add_argument('--samples', default=60, type=int, help='Number of responses to process')
+    parser.add_argument('--workers', nargs='+', default=[0, 1, 2, 4], type=int, help='Process pool sizes to benchmark, 0 meaning no pool')
+    args = parser.parse_args()
+
+    main(args.stations, args.samples, args.workers)
@@ -0,0 +1,36 @@
+import argparse
+import os
+import tempfile
+import time
+from benchmarks import normalize
+from storage import responses
+import script
+
+def record_day(path, stations, rate, minutes):
+    # A response log of minutes*rate samples, each a response of the given number of stations
+    response = normalize.synthetic_response(stations)
+    with responses.ResponseLog(path) as log:
+        for sample in range(minutes*rate):
+            log.write(sample, [response], timestamp=sample*60/rate)
+
+def main(stations, rate, minutes, workers):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'responses.ndjson.gz')
+        record_day(path, stations, rate, minutes)
+        print(f'Replaying {minutes*rate} samples of {stations} stations ({minutes} minute(s) at a rate of {rate}), {os.path.getsize(path)/2**20:.1f} MB compressed:')
+
+        for count in workers:
+            start = time.perf_counter()
+            aggregator = script.replay(path, workers=count)
+            elapsed = time.perf_counter() - start
+            print(f'{count:>3} worker(s) {elapsed:8.2f} s  {aggregator.samples/elapsed:9.0f} samples/s')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks reprocessing a recorded day of API responses')
+    parser.add_argument('--stations', default=50, type=int, help='Number of stations in every recorded response')
+    parser.add_argument('--rate', default=12, type=int, help='Samples per minute of the recording')
+    parser.add_argument('--minutes', default=1440, type=int, help='Minutes of recording')
+    parser.add_argument('--workers', nargs='+', default=[1, 2, 4], type=int, help='Process pool sizes to benchmark')
+    args = parser.parse_args()
+
+    main(args.stations, args.rate, args.minutes, args.workers)
@@ -0,0 +1,197 @@
+import argparse
+import contextlib
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Tokens that always get the matching error response, whatever the configured error rates
+OVER_QUOTA_TOKEN = 'over-quota'
+INVALID_KEY_TOKEN = 'invalid-key'
+
+class Latency:
+
+    def __init__(self, distribution='fixed', mean=0.0, spread=0.0, seed=0):
+        # Seconds of artificial latency added to every response
+        # fixed: always mean, uniform: mean +/- spread, exponential: mean on average, lognormal: median mean with spread as sigma
+        self.distribution = distribution
+        self.mean = mean
+        self.spread = spread
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def sample(self):
+        with self.lock:
+            if self.distribution == 'uniform':
+                return max(0.0, self.random.uniform(self.mean - self.spread, self.mean + self.spread))
+            if self.distribution == 'exponential':
+                return self.random.expovariate(1/self.mean) if self.mean > 0 else 0.0
+            if self.distribution == 'lognormal':
+                return self.random.lognormvariate(0, self.spread)*self.mean
+            return self.mean
+
+class Stations:
+
+    def __init__(self, count, seed=0, update_every=3600):
+        # A fixed set of synthetic stations spread over the whole globe, each updating its reading every update_every seconds
+        generator = random.Random(seed)
+        self.update_every = update_every
+        self.stations = [{
+            'lat': generator.uniform(-60, 70),
+            'lon': generator.uniform(-180, 180),
+            'uid': uid,
+            'base': generator.randint(0, 200),
+            'missing': generator.random() < 0.05,
+            'name': f'Stand-in Station {uid}'
+        } for uid in range(count)]
+
+    def within(self, lat1, lng1, lat2, lng2):
+        south, north = min(lat1, lat2), max(lat1, lat2)
+        west, east = min(lng1, lng2), max(lng1, lng2)
+        epoch = int(time.time()//self.update_every)
+        updated = time.strftime('%Y-%m-%dT%H:%M:%S+00:00', time.gmtime(epoch*self.update_every))
+        return [{
+            'lat': station['lat'],
+            'lon': station['lon'],
+            'uid': station['uid'],
+            'aqi': '-' if station['missing'] else str(station['base'] + (station['uid'] + epoch) % 10),
+            'station': {'name': station['name'], 'time': updated}
+        } for station in self.stations if south <= station['lat'] <= north and west <= station['lon'] <= east]
+
+class StandInServer(ThreadingHTTPServer):
+
+    daemon_threads = True
+
+    def __init__(self, address, stations=1000, latency=None, error_rate=0.0, quota_rate=0.0, invalid_rate=0.0, seed=0, token_quota=None, quota_window=60):
+        # Imitates /v2/map/bounds of the World Air Quality Index API, with configurable latency and error rates
+        # With a token_quota, each token may make that many requests in every quota_window seconds, and is over quota for the rest of the window
+        super().__init__(address, StandInHandler)
+        self.stations = Stations(stations, seed)
+        self.latency = latency or Latency()
+        self.error_rate = error_rate
+        self.quota_rate = quota_rate
+        self.invalid_rate = invalid_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.token_quota = token_quota
+        self.quota_window = quota_window
+        self.token_requests = {}
+
+    def handle_error(self, request, client_address):
+        # Clients hang up on slow responses on purpose (a hedged call that lost its race is cancelled), which is not worth a traceback
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def outcome(self, token):
+        # Decide whether this request fails, and how
+        with self.lock:
+            self.requests += 1
+            roll = self.random.random()
+            window = int(time.monotonic()//self.quota_window)
+            used = self.token_requests.get(token)
+            used = used[1] + 1 if used is not None and used[0] == window else 1
+            self.token_requests[token] = (window, used)
+        if token == OVER_QUOTA_TOKEN or roll < self.quota_rate or (self.token_quota is not None and used > self.token_quota):
+            return 200, {'status': 'error', 'data': 'Over quota'}
+        if token == INVALID_KEY_TOKEN or roll < self.quota_rate + self.invalid_rate:
+            return 200, {'status': 'error', 'data': 'Invalid key'}
+        if roll < self.quota_rate + self.invalid_rate + self.error_rate:
+            return 500, {'status': 'error', 'data': 'Internal error'}
+        return None
+
+class StandInHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != '/v2/map/bounds':
+            return self.respond(404, {'status': 'error', 'data': 'Unknown endpoint'})
+
+        query = parse_qs(url.query)
+        time.sleep(self.server.latency.sample())
+
+        outcome = self.server.outcome(query.get('token', [''])[0])
+        if outcome is not None:
+            return self.respond(*outcome)
+
+        try:
+            lat1, lng1, lat2, lng2 = [float(value) for value in query['latlng'][0].split(',')]
+        except (KeyError, ValueError):
+            return self.respond(200, {'status': 'error', 'data': 'Invalid latlng'})
+
+        self.respond(200, {'status': 'ok', 'data': self.server.stations.within(lat1, lng1, lat2, lng2)})
+
+    def respond(self, code, body):
+        payload = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+@contextlib.contextmanager
+def serve(host='127.0.0.1', port=0, **options):
+    # Run a stand-in server on a background thread for the duration of the block (port 0 picks a free port)
+    server = StandInServer((host, port), **options)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+def add_server_arguments(parser):
+    parser.add_argument('--stations', default=1000, type=int, help='Number of synthetic stations spread over the globe')
+    parser.add_argument('--latency', default='fixed', choices=['fixed', 'uniform', 'exponential', 'lognormal'], help='Distribution of the latency added to every response')
+    parser.add_argument('--latency-mean', default=0.0, type=float, help='Mean (median for lognormal) latency in seconds')
+    parser.add_argument('--latency-spread', default=0.0, type=float, help='Half-width for uniform, or sigma for lognormal latency')
+    parser.add_argument('--error-rate', default=0.0, type=float, help='Fraction of requests answered with an HTTP 500')
+    parser.add_argument('--quota-rate', default=0.0, type=float, help='Fraction of requests answered with "Over quota"')
+    parser.add_argument('--invalid-rate', default=0.0, type=float, help='Fraction of requests answered with "Invalid key"')
+    parser.add_argument('--token-quota', type=int, help='Requests each token may make per quota window before it is over quota')
+    parser.add_argument('--quota-window', default=60.0, type=float, help='Seconds in a quota window')
+    parser.add_argument('--seed', default=0, type=int, help='Seed for the synthetic stations, latencies and errors')
+
+def server_options(args):
+    return {
+        'stations': args.stations,
+        'latency': Latency(args.latency, args.latency_mean, args.latency_spread, args.seed),
+        'error_rate': args.error_rate,
+        'quota_rate': args.quota_rate,
+        'invalid_rate': args.invalid_rate,
+        'seed': args.seed,
+        'token_quota': args.token_quota,
+        'quota_window': args.quota_window
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Runs a local stand-in for the World Air Quality Index /v2/map/bounds endpoint')
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on')
+    parser.add_argument('--port', default=8000, type=int, help='Port to listen on')
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    server = StandInServer((args.host, args.port), **server_options(args))
+    print(f'Serving a stand-in World Air Quality Index API at {server.url}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
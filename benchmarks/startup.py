@@ -0,0 +1,37 @@
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+# Commands timed from a fresh interpreter, as a cron job would start them
+COMMANDS = [
+    ('import script', [sys.executable, '-c', 'import script']),
+    ('script.py -h', [sys.executable, 'script.py', '-h']),
+    ('batch.py -h', [sys.executable, 'batch.py', '-h']),
+    ('import script, first aggregator', [sys.executable, '-c', 'import script; script.stations.StationAggregator().to_frame()']),
+    ('import pandas, numpy, requests', [sys.executable, '-c', 'import pandas, numpy, requests']),
+    ('python (baseline)', [sys.executable, '-c', 'pass'])
+]
+
+def wall_times(command, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(command, stdout=subprocess.DEVNULL, check=True)
+        times.append(time.perf_counter() - start)
+    return times
+
+def main(repeat):
+    print(f'Wall time of starting a fresh interpreter ({repeat} runs):')
+    print(f'{"command":<34} {"best ms":>8} {"median ms":>10}')
+    for name, command in COMMANDS:
+        times = wall_times(command, repeat)
+        print(f'{name:<34} {min(times)*1000:>8.1f} {statistics.median(times)*1000:>10.1f}')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks the startup time of the command line entry points')
+    parser.add_argument('--repeat', default=10, type=int, help='Number of runs of each command')
+    args = parser.parse_args()
+
+    main(args.repeat)
@@ -0,0 +1,98 @@
+import argparse
+import contextlib
+import io
+import itertools
+import multiprocessing
+import resource
+import time
+import numpy as np
+from benchmarks import server
+
+def timed_clients(latencies):
+    # Record the latency of every API call made through either engine's client
+    from clients import http
+    original_get = http.HTTPClient.get
+
+    def get(self, url):
+        start = time.perf_counter()
+        try:
+            return original_get(self, url)
+        finally:
+            latencies.append(time.perf_counter() - start)
+
+    http.HTTPClient.get = get
+
+    try:
+        from clients import asynchronous
+    except ImportError:
+        return
+    original_get_json = asynchronous.AsyncHTTPClient.get_json
+
+    async def get_json(self, url):
+        start = time.perf_counter()
+        try:
+            return await original_get_json(self, url)
+        finally:
+            latencies.append(time.perf_counter() - start)
+
+    asynchronous.AsyncHTTPClient.get_json = get_json
+
+def run_configuration(url, token, bounds, engine, period, rate, minute):
+    # Runs in a fresh process, so CPU time and peak RSS belong to this configuration alone
+    import script
+
+    script.API_URL = url
+    script.API_KEY = ','.join(token)
+    script.MINUTE = minute
+    latencies = []
+    timed_clients(latencies)
+
+    error = ''
+    before = resource.getrusage(resource.RUSAGE_SELF)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        try:
+            script.run_sampling(*bounds, period, rate, script.Options(engine=engine))
+        except (script.exceptions.APIRequestQuotaError, script.exceptions.APIInvalidKeyError) as e:
+            error = type(e).__name__
+    elapsed = time.perf_counter() - start
+    after = resource.getrusage(resource.RUSAGE_SELF)
+
+    requests = len(latencies)
+    latencies = np.array(latencies) if latencies else np.array([np.nan])
+    return {
+        'requests': requests,
+        'elapsed': elapsed,
+        'p50': np.percentile(latencies, 50),
+        'p99': np.percentile(latencies, 99),
+        'cpu': (after.ru_utime - before.ru_utime) + (after.ru_stime - before.ru_stime),
+        'rss': after.ru_maxrss/1024,
+        'error': error
+    }
+
+def main(args):
+    configurations = list(itertools.product(args.engines, args.periods, args.rates))
+    context = multiprocessing.get_context('spawn')
+
+    with server.serve(**server.server_options(args)) as stand_in:
+        print(f'Stand-in API at {stand_in.url} with {args.stations} stations, a sampling minute of {args.minute} s\n')
+        print(f'{"engine":<8} {"period":>6} {"rate":>5} {"requests":>8} {"req/s":>8} {"p50 ms":>8} {"p99 ms":>8} {"CPU s":>7} {"RSS MB":>7}  error')
+
+        for engine, period, rate in configurations:
+            with context.Pool(1) as pool:
+                result = pool.apply(run_configuration, (stand_in.url, args.token, args.bounds, engine, period, rate, args.minute))
+
+            print(f'{engine:<8} {period:>6} {rate:>5} {result["requests"]:>8} {result["requests"]/result["elapsed"]:>8.1f} {result["p50"]*1000:>8.1f} {result["p99"]*1000:>8.1f} {result["cpu"]:>7.2f} {result["rss"]:>7.1f}  {result["error"]}')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks end-to-end sampling throughput and latency against a local stand-in API')
+    parser.add_argument('--engines', nargs='+', default=['threads', 'asyncio'], choices=['threads', 'asyncio'], help='Engines to benchmark')
+    parser.add_argument('--rates', nargs='+', default=[4, 16], type=int, help='Sampling rates to benchmark')
+    parser.add_argument('--periods', nargs='+', default=[2], type=int, help='Sampling periods to benchmark')
+    parser.add_argument('--minute', default=1.0, type=float, help='Seconds in a sampling minute, shortened so runs finish quickly')
+    parser.add_argument('--bounds', nargs=4, default=[-60, -180, 70, 180], type=float, help='lat1 lng1 lat2 lng2 to sample')
+    parser.add_argument('--token', nargs='+', default=['benchmark'], help=f'API tokens to spread requests over ({server.OVER_QUOTA_TOKEN} or {server.INVALID_KEY_TOKEN} force errors)')
+    server.add_server_arguments(parser)
+    args = parser.parse_args()
+
+    main(args)
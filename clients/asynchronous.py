@@ -0,0 +1,33 @@
+import aiohttp
+from clients.http import DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT
+
+class AsyncHTTPClient:
+
+    def __init__(self, pool_size=100, connect_timeout=DEFAULT_CONNECT_TIMEOUT, read_timeout=DEFAULT_READ_TIMEOUT):
+        # The session has to be created inside a running event loop, so it is only opened on entering the context
+        self.pool_size = pool_size
+        self.timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+        self.headers = {'Accept-Encoding': 'gzip, deflate'}
+        self.session = None
+
+    async def get_json(self, url):
+        async with self.session.get(url) as response:
+            return await response.json(content_type=None)
+
+    async def get_content(self, url):
+        # The body as it was sent, for runs that decode responses on parse workers
+        async with self.session.get(url) as response:
+            return await response.read()
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.pool_size)
+        self.session = aiohttp.ClientSession(connector=connector, timeout=self.timeout, headers=self.headers)
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
@@ -0,0 +1,134 @@
+import asyncio
+import collections
+import concurrent.futures
+import threading
+import time
+from exceptions.api import exceptions
+from instrumentation import metrics
+
+# Calls slower than this percentile of recent latencies are hedged
+DEFAULT_PERCENTILE = 0.95
+
+class Hedger:
+
+    def __init__(self, budget=0.0, percentile=DEFAULT_PERCENTILE, slots=1, window=256, warmup=20, clock=time.monotonic):
+        # Cuts the tail latency of API calls: a call still running after the percentile of the last window latencies gets a duplicate,
+        # and whichever answers first is used. At most budget extra calls are made per call (0.05 is one hedge per 20 calls),
+        # and nothing is hedged until warmup latencies have been seen
+        # Every call also has to answer within slots sampling slots of its sample's deadline, or the sample is missed
+        self.budget = budget
+        self.percentile = percentile
+        self.slots = slots
+        self.warmup = warmup
+        self.clock = clock
+        self.latencies = collections.deque(maxlen=window)
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.hedges = 0
+        self.wins = 0
+
+    def observe(self, seconds):
+        with self.lock:
+            self.latencies.append(seconds)
+
+    def delay(self):
+        # Seconds after which a call is hedged, or None while there are too few latencies to tell what slow is
+        with self.lock:
+            if not self.budget or len(self.latencies) < self.warmup:
+                return None
+            latencies = sorted(self.latencies)
+        return latencies[int(self.percentile*(len(latencies) - 1))]
+
+    def allow(self, limiter=None):
+        # Whether a hedge fits in the extra-call budget and, as it is optional, in the request budget without waiting for a token
+        with self.lock:
+            if self.hedges + 1 > self.budget*self.calls:
+                return False
+            if limiter is not None and not limiter.try_acquire():
+                return False
+            self.hedges += 1
+        metrics.registry.count('hedged_calls')
+        return True
+
+    def timed(self, attempt):
+        # Latencies are only learned from attempts that answer, including hedged calls that lost the race
+        start = self.clock()
+        result = attempt()
+        self.observe(self.clock() - start)
+        return result
+
+    async def timed_async(self, attempt):
+        start = self.clock()
+        result = await attempt()
+        self.observe(self.clock() - start)
+        return result
+
+    def remaining(self, give_up_at):
+        return None if give_up_at is None else max(0, give_up_at - self.clock())
+
+    def won(self, attempts, winner):
+        if attempts.index(winner) > 0:
+            with self.lock:
+                self.wins += 1
+            metrics.registry.count('hedge_wins')
+
+    def call(self, attempt, executor, give_up_at=None, limiter=None):
+        # Run attempt on the executor, hedge it once it is slow, and return the first result, raising APIDeadlineError if none arrives by give_up_at
+        # A blocking call cannot be interrupted, so a losing attempt is cancelled if it has not started yet, and otherwise left to finish with its result discarded
+        with self.lock:
+            self.calls += 1
+        attempts = [executor.submit(self.timed, attempt)]
+        try:
+            delay = self.delay()
+            if delay is not None:
+                remaining = self.remaining(give_up_at)
+                done, _ = concurrent.futures.wait(attempts, timeout=delay if remaining is None else min(delay, remaining))
+                if not done and self.allow(limiter):
+                    attempts.append(executor.submit(self.timed, attempt))
+
+            # An attempt that failed only ends the call once no other attempt can still answer
+            pending = set(attempts)
+            while pending:
+                done, pending = concurrent.futures.wait(pending, timeout=self.remaining(give_up_at), return_when=concurrent.futures.FIRST_COMPLETED)
+                if not done:
+                    raise exceptions.APIDeadlineError('API request failed. No response arrived before the sample\'s deadline.')
+                answered = [future for future in done if future.exception() is None]
+                if answered or not pending:
+                    winner = answered[0] if answered else next(iter(done))
+                    self.won(attempts, winner)
+                    return winner.result()
+        finally:
+            for future in attempts:
+                future.cancel()
+
+    async def call_async(self, attempt, give_up_at=None, limiter=None):
+        # As call, for a coroutine function on the running event loop, where the losing attempt is actually cancelled
+        with self.lock:
+            self.calls += 1
+        attempts = [asyncio.ensure_future(self.timed_async(attempt))]
+        try:
+            delay = self.delay()
+            if delay is not None:
+                remaining = self.remaining(give_up_at)
+                done, _ = await asyncio.wait(attempts, timeout=delay if remaining is None else min(delay, remaining))
+                if not done and self.allow(limiter):
+                    attempts.append(asyncio.ensure_future(self.timed_async(attempt)))
+
+            pending = set(attempts)
+            while pending:
+                done, pending = await asyncio.wait(pending, timeout=self.remaining(give_up_at), return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    raise exceptions.APIDeadlineError('API request failed. No response arrived before the sample\'s deadline.')
+                answered = [task for task in done if task.exception() is None]
+                if answered or not pending:
+                    winner = answered[0] if answered else next(iter(done))
+                    self.won(attempts, winner)
+                    return winner.result()
+        finally:
+            for task in attempts:
+                task.cancel()
+            await asyncio.gather(*attempts, return_exceptions=True)
+
+    def summary(self):
+        with self.lock:
+            return f'Hedged {self.hedges} of {self.calls} API call(s), and the hedge answered first {self.wins} time(s)'
@@ -0,0 +1,58 @@
+import threading
+from loaders import lazy
+
+requests = lazy.load('requests')
+
+DEFAULT_CONNECT_TIMEOUT = 5
+DEFAULT_READ_TIMEOUT = 20
+
+class HTTPClient:
+
+    def __init__(self, pool_size=10, connect_timeout=DEFAULT_CONNECT_TIMEOUT, read_timeout=DEFAULT_READ_TIMEOUT):
+        # One adapter (and so one keep-alive connection pool) is shared by every thread, while each thread gets its own session
+        # Sessions are not guaranteed to be thread-safe, but the urllib3 connection pool behind the adapter is
+        self.timeout = (connect_timeout, read_timeout)
+        self.adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.headers = {'Accept-Encoding': 'gzip, deflate', 'Connection': 'keep-alive'}
+        self.local = threading.local()
+        self.sessions = []
+        self.lock = threading.Lock()
+
+    def session(self):
+        session = getattr(self.local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.mount('https://', self.adapter)
+            session.mount('http://', self.adapter)
+            session.headers.update(self.headers)
+            self.local.session = session
+            with self.lock:
+                self.sessions.append(session)
+        return session
+
+    def get(self, url):
+        return self.session().get(url, timeout=self.timeout)
+
+    def close(self):
+        with self.lock:
+            for session in self.sessions:
+                session.close()
+            self.sessions.clear()
+        self.adapter.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+_default_client = None
+_default_lock = threading.Lock()
+
+def default_client():
+    # Shared client for callers that do not manage their own, created on first use
+    global _default_client
+    with _default_lock:
+        if _default_client is None:
+            _default_client = HTTPClient()
+        return _default_client
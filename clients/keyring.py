@@ -0,0 +1,94 @@
+import re
+import threading
+import time
+from exceptions.api import exceptions
+
+# Seconds a key is set aside after an "Over quota" response, doubled every time in a row it is over quota again
+DEFAULT_QUARANTINE = 60
+
+STRATEGIES = ('round-robin', 'least-used')
+
+def split(value):
+    # Keys can be separated by commas, spaces or new lines, in the config file, the environment or on the command line
+    return [key for key in re.split(r'[\s,]+', value) if key]
+
+def mask(key):
+    # Only the end of a key is ever printed
+    return f'...{key[-4:]}' if len(key) > 4 else '...'
+
+class KeyPool:
+
+    def __init__(self, keys, strategy='round-robin', quarantine=DEFAULT_QUARANTINE, clock=time.monotonic):
+        # Requests are spread over every key, so the total throughput is the sum of their quotas
+        # round-robin takes the keys in turn, while least-used takes the key that has made the fewest requests so far
+        self.keys = list(dict.fromkeys(keys))
+        if not self.keys:
+            raise ValueError('No API keys given')
+        if strategy not in STRATEGIES:
+            raise ValueError(f'Unknown key strategy {strategy}')
+        self.strategy = strategy
+        self.quarantine = quarantine
+        self.clock = clock
+        self.position = 0
+        self.lock = threading.Lock()
+
+        # Per-key accounting, and when each key's quarantine ends. Keys that are not valid are retired for the rest of the run
+        self.requests = dict.fromkeys(self.keys, 0)
+        self.over_quota = dict.fromkeys(self.keys, 0)
+        self.strikes = dict.fromkeys(self.keys, 0)
+        self.until = dict.fromkeys(self.keys, 0.0)
+        self.invalid = set()
+
+    def _ready(self, now):
+        return [key for key in self.keys if key not in self.invalid and self.until[key] <= now]
+
+    def acquire(self):
+        # Choose the key for the next request and count the request against it
+        # When every key is quarantined, the one whose quarantine ends first is used, as the caller backs off between attempts
+        with self.lock:
+            usable = [key for key in self.keys if key not in self.invalid]
+            if not usable:
+                raise exceptions.APIInvalidKeyError('API request failed. None of the keys are valid.')
+
+            ready = self._ready(self.clock())
+            if not ready:
+                key = min(usable, key=self.until.get)
+            elif self.strategy == 'least-used':
+                key = min(ready, key=self.requests.get)
+            else:
+                for offset in range(len(self.keys)):
+                    key = self.keys[(self.position + offset) % len(self.keys)]
+                    if key in ready:
+                        break
+                self.position = (self.keys.index(key) + 1) % len(self.keys)
+
+            self.requests[key] += 1
+            return key
+
+    def report(self, key, response):
+        # Quarantine a key that is over quota and retire a key that is not valid, returning whether the request is worth retrying on a valid key
+        # Any other response ends the key's run of quota responses
+        with self.lock:
+            if response['status'] == 'error' and response['data'] == 'Over quota':
+                self.over_quota[key] += 1
+                self.strikes[key] += 1
+                self.until[key] = self.clock() + self.quarantine*2**(self.strikes[key] - 1)
+            elif response['status'] == 'error' and response['data'] == 'Invalid key':
+                self.invalid.add(key)
+            else:
+                self.strikes[key] = 0
+                return False
+            return len(self.invalid) < len(self.keys)
+
+    def ready(self):
+        # Whether a key can be used straight away
+        with self.lock:
+            return bool(self._ready(self.clock()))
+
+    def summary(self):
+        with self.lock:
+            lines = []
+            for key in self.keys:
+                status = ', not valid' if key in self.invalid else ''
+                lines.append(f'API key {mask(key)}: {self.requests[key]} request(s), over quota {self.over_quota[key]} time(s){status}')
+            return '\n'.join(lines)
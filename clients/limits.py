@@ -0,0 +1,102 @@
+import asyncio
+import random
+import threading
+import time
+from exceptions.api import exceptions
+
+DEFAULT_QUOTA_DEADLINE = 300
+
+class RateLimiter:
+
+    def __init__(self, budget=None, burst=None, quota_deadline=DEFAULT_QUOTA_DEADLINE, backoff_base=1, backoff_cap=30, clock=time.monotonic):
+        # Token bucket shared by every worker (and region), allowing budget requests per minute with bursts of up to burst requests
+        # No budget means requests are never held back, but quota responses are still backed off from
+        self.rate = budget/60 if budget else None
+        self.capacity = burst if burst else 1 + (budget or 0)//60
+        self.tokens = self.capacity
+        self.clock = clock
+        self.updated = clock()
+
+        # Quota responses are retried with exponential backoff and full jitter, until the quota has stayed over limits for quota_deadline seconds
+        self.quota_deadline = quota_deadline
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.quota_since = None
+        self.attempts = 0
+        self.random = random.Random()
+
+        self.lock = threading.Lock()
+        self.retries = 0
+        self.missed = 0
+
+    def reserve(self, give_up_at=None):
+        # Take a token, and return how many seconds to wait until it is actually available
+        # No token is taken if it would only be available after give_up_at, and None is returned, so requests that cannot be made in time never run up a debt
+        if self.rate is None:
+            return 0
+        with self.lock:
+            now = self.clock()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated)*self.rate)
+            self.updated = now
+            wait = 0 if self.tokens >= 1 else (1 - self.tokens)/self.rate
+            if give_up_at is not None and now + wait > give_up_at:
+                return None
+            self.tokens -= 1
+            return wait
+
+    def try_acquire(self):
+        # Take a token only if one is available straight away, for optional requests such as hedged calls
+        if self.rate is None:
+            return True
+        with self.lock:
+            now = self.clock()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated)*self.rate)
+            self.updated = now
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+    def acquire(self, event, give_up_at=None):
+        # Block until a request may be made, or return False if the event to kill all threads is set first, or if no request could be made by give_up_at
+        wait = self.reserve(give_up_at)
+        if wait is None:
+            return False
+        if wait > 0:
+            return not event.wait(wait)
+        return not event.is_set()
+
+    async def acquire_async(self, cancel, give_up_at=None):
+        wait = self.reserve(give_up_at)
+        if wait is None:
+            return False
+        if wait > 0:
+            try:
+                await asyncio.wait_for(cancel.wait(), timeout=wait)
+                return False
+            except asyncio.TimeoutError:
+                pass
+        return not cancel.is_set()
+
+    def backoff(self):
+        # Return how long to back off after an "Over quota" response, or raise once the quota has been over limits for too long
+        with self.lock:
+            now = self.clock()
+            if self.quota_since is None:
+                self.quota_since = now
+                self.attempts = 0
+            if now - self.quota_since >= self.quota_deadline:
+                raise exceptions.APIRequestQuotaError(f'API request failed. The request quota has been over limits for {now - self.quota_since:.0f} seconds.')
+
+            self.attempts += 1
+            self.retries += 1
+            return self.random.uniform(0, min(self.backoff_cap, self.backoff_base*2**(self.attempts - 1)))
+
+    def succeeded(self):
+        with self.lock:
+            self.quota_since = None
+            self.attempts = 0
+
+    def record_missed(self):
+        with self.lock:
+            self.missed += 1
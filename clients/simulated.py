@@ -0,0 +1,79 @@
+import asyncio
+import json
+import random
+import time
+from urllib.parse import parse_qs, urlparse
+from loaders import lazy
+from schedulers import clocks
+from storage import responses as response_log
+
+tiling = lazy.load('regions.tiles')
+
+class SyntheticStations:
+
+    def __init__(self, count=1000, seed=0, update_every=3600, clock=None):
+        # Stations spread over the globe whose readings change every update_every seconds of (virtual) time, like the stand-in API's
+        generator = random.Random(seed)
+        self.clock = clock
+        self.update_every = update_every
+        self.lat = [generator.uniform(-60, 70) for _ in range(count)]
+        self.lng = [generator.uniform(-180, 180) for _ in range(count)]
+        self.base = [generator.randint(0, 200) for _ in range(count)]
+        self.missing = [generator.random() < 0.05 for _ in range(count)]
+
+    def within(self, south, west, north, east):
+        epoch = int(self.clock.time()//self.update_every)
+        updated = time.strftime('%Y-%m-%dT%H:%M:%S+00:00', time.gmtime(epoch*self.update_every))
+        return [{
+            'lat': self.lat[uid],
+            'lon': self.lng[uid],
+            'uid': uid,
+            'aqi': '-' if self.missing[uid] else str(self.base[uid] + (uid + epoch) % 10),
+            'station': {'name': f'Simulated Station {uid}', 'time': updated}
+        } for uid in range(len(self.lat)) if south <= self.lat[uid] <= north and west <= self.lng[uid] <= east]
+
+def canned(path):
+    # Cycle through the samples recorded with --record, merging the tiles of each, for as long as the simulation asks
+    while True:
+        found = False
+        for record in response_log.read(path):
+            found = True
+            tiles = record['responses']
+            yield tiles[0] if len(tiles) == 1 else tiling.merge_responses(tiles)
+        if not found:
+            raise ValueError(f'{path} has no recorded samples')
+
+class SimulatedClient:
+
+    def __init__(self, responses=None, stations=1000, latency=0.0, seed=0, clock=None):
+        # Stands in for AsyncHTTPClient in simulated runs, answering every call from responses (an iterable of recorded responses)
+        # or else from synthetic stations within the requested bounds, after latency seconds of virtual time
+        self.clock = clock if clock is not None else clocks.VirtualClock(epoch=time.time())
+        self.responses = iter(responses) if responses is not None else None
+        self.stations = SyntheticStations(stations, seed, clock=self.clock)
+        self.latency = latency
+        self.calls = 0
+
+    async def get_json(self, url):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.responses is not None:
+            return next(self.responses)
+
+        lat1, lng1, lat2, lng2 = [float(value) for value in parse_qs(urlparse(url).query)['latlng'][0].split(',')]
+        return {'status': 'ok', 'data': self.stations.within(min(lat1, lat2), min(lng1, lng2), max(lat1, lat2), max(lng1, lng2))}
+
+    async def get_content(self, url):
+        # The body as the API would send it, for runs that decode responses on parse workers
+        return json.dumps(await self.get_json(url), separators=(',', ':')).encode()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+def from_path(path=None, stations=1000, latency=0.0, seed=0):
+    # A simulated client replaying a response log if given one, or else answering from synthetic stations
+    return SimulatedClient(canned(path) if path is not None else None, stations, latency, seed)
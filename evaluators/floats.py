@@ -0,0 +1,13 @@
+def positive_float(value):
+    # If value is not a positive number, raise ValueError
+    value = float(value)
+    if not value > 0:
+        raise ValueError
+    return value
+
+def fraction(value):
+    # If value is not a number strictly between 0 and 1, raise ValueError
+    value = float(value)
+    if not 0 < value < 1:
+        raise ValueError
+    return value
@@ -1,6 +1,9 @@
 import os
 from argparse import ArgumentTypeError
 
+# Samples per minute allowed by the asyncio engine, i.e. ten API calls per second
+ASYNC_RATE_CEILING = 600
+
 def positive_int(value):
     # If value is not a positive integer, raise ValueError
     value = int(value)
@@ -15,4 +18,12 @@ def reasonable_positive_int(value):
     value = positive_int(value)
     if positive_int(value) > min(32, os.cpu_count() + 4):
         raise ArgumentTypeError('Too high for your CPU count. Try a lower a rate.')
-    return value
\ No newline at end of file
+    return value
+
+def async_positive_int(value):
+    # If value is not a positive integer, raise ValueError, and if it is greater than ASYNC_RATE_CEILING, raise ArgumentTypeError
+    # Coroutines are cheap enough that the ceiling is only there to keep the request rate to the API sensible
+    value = positive_int(value)
+    if value > ASYNC_RATE_CEILING:
+        raise ArgumentTypeError(f'Too high for the asyncio engine. Try a rate of at most {ASYNC_RATE_CEILING}.')
+    return value
@@ -0,0 +1,20 @@
+from argparse import ArgumentTypeError
+
+# Statistics that can be printed next to the mean, besides percentiles such as p95
+STATISTICS = ('std', 'min', 'max')
+
+def statistic(value):
+    # If value is not one of STATISTICS or a percentile between p0 and p100 (such as p50 or p99.9), raise ArgumentTypeError
+    if value in STATISTICS:
+        return value
+    try:
+        percent = float(value[1:]) if value.startswith('p') else None
+    except ValueError:
+        percent = None
+    if percent is None or not 0 <= percent <= 100:
+        raise ArgumentTypeError(f'{value} is not one of {", ".join(STATISTICS)} or a percentile such as p95')
+    return f'p{percent:g}'
+
+def percentiles(statistics):
+    # Percentiles (between 0 and 100) among the chosen statistics
+    return tuple(float(value[1:]) for value in statistics if value.startswith('p'))
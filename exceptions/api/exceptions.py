@@ -6,4 +6,9 @@ class APIRequestQuotaError(Exception):
 class APIInvalidKeyError(Exception):
 
     def __init__(self, message = ""):
-        super().__init__(message)
\ No newline at end of file
+        super().__init__(message)
+
+class APIDeadlineError(Exception):
+
+    def __init__(self, message = ""):
+        super().__init__(message)
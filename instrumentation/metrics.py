@@ -0,0 +1,169 @@
+import bisect
+import contextlib
+import os
+import threading
+import time
+
+# Upper bounds in seconds of the latency histogram buckets, the last bucket being +Inf
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+class Histogram:
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0]*(len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        # Estimate a quantile by interpolating linearly within the bucket it falls in
+        if not self.count:
+            return 0.0
+        rank = q*self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower)*(rank - seen)/count
+            seen += count
+        return self.buckets[-1]
+
+class Metrics:
+
+    def __init__(self):
+        # Latency histograms per stage, monotonic counters and gauges, all guarded by one lock as updates are tiny
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.histograms = {}
+            self.counters = {}
+            self.gauges = {}
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = Histogram()
+            histogram.observe(seconds)
+
+    @contextlib.contextmanager
+    def time(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def add(self, gauge, value):
+        with self.lock:
+            self.gauges[gauge] = self.gauges.get(gauge, 0) + value
+
+    @contextlib.contextmanager
+    def in_flight(self, gauge='requests_in_flight'):
+        self.add(gauge, 1)
+        try:
+            yield
+        finally:
+            self.add(gauge, -1)
+
+    def render(self, prefix='pm25'):
+        # Prometheus text exposition format
+        with self.lock:
+            lines = [f'# HELP {prefix}_stage_seconds Time spent in each stage of sampling', f'# TYPE {prefix}_stage_seconds histogram']
+            for stage, histogram in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, count in zip(list(histogram.buckets) + ['+Inf'], histogram.counts):
+                    cumulative += count
+                    lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {histogram.sum}')
+                lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+            for name, value in sorted(self.counters.items()):
+                lines += [f'# TYPE {prefix}_{name}_total counter', f'{prefix}_{name}_total {value}']
+            for name, value in sorted(self.gauges.items()):
+                lines += [f'# TYPE {prefix}_{name} gauge', f'{prefix}_{name} {value}']
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        # Write to a temporary file first so that a scraper never reads a half written file
+        with open(f'{path}.tmp', 'w') as f:
+            f.write(self.render())
+        os.replace(f'{path}.tmp', path)
+
+    def summary(self):
+        with self.lock:
+            lines = ['Stage timings (count, mean, p50, p99):']
+            for stage, histogram in sorted(self.histograms.items()):
+                mean = histogram.sum/histogram.count if histogram.count else 0.0
+                lines.append(f'  {stage}: {histogram.count}, {mean*1000:.1f} ms, {histogram.quantile(0.5)*1000:.1f} ms, {histogram.quantile(0.99)*1000:.1f} ms')
+            if self.counters:
+                lines.append('Counters: ' + ', '.join(f'{name} {value}' for name, value in sorted(self.counters.items())))
+        return '\n'.join(lines)
+
+    @contextlib.contextmanager
+    def serve(self, port, host='127.0.0.1'):
+        # Expose the metrics at http://host:port/metrics for the duration of the block
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                if self.path != '/metrics':
+                    self.send_error(404)
+                    return
+                payload = metrics.render().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            yield server
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+
+@contextlib.contextmanager
+def exporting(metrics, path=None, port=None, interval=15):
+    # Serve the metrics over HTTP and rewrite the text file every interval seconds while the block runs, and once more at the end
+    stop = threading.Event()
+    with contextlib.ExitStack() as stack:
+        if port is not None:
+            stack.enter_context(metrics.serve(port))
+        if path is not None:
+            def write_periodically():
+                while not stop.wait(interval):
+                    metrics.write(path)
+
+            thread = threading.Thread(target=write_periodically, daemon=True)
+            thread.start()
+        try:
+            yield metrics
+        finally:
+            stop.set()
+            if path is not None:
+                thread.join()
+                metrics.write(path)
+
+# Shared by every module, in the same way as the default registry of Prometheus clients
+registry = Metrics()
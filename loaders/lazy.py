@@ -0,0 +1,48 @@
+import importlib.util
+import sys
+import threading
+import types
+
+# One lock per lazily loaded module, held while it runs, so that threads using it at the same time wait for it to be loaded
+# (importlib's own LazyLoader marks the module as loaded before running it, and other threads then find it empty)
+locks = {}
+loading = set()
+
+class LazyModule(types.ModuleType):
+
+    def __getattribute__(self, attr):
+        # Run the module on first use of one of its attributes, after which it is a plain module and this is never called again
+        # The thread running it may use it again while it runs (as circular imports do), and then sees it as it is so far, as a regular import would
+        spec = types.ModuleType.__getattribute__(self, '__spec__')
+        with locks[spec.name]:
+            if type(self) is LazyModule and spec.name not in loading:
+                loading.add(spec.name)
+                try:
+                    spec.loader.exec_module(self)
+                finally:
+                    loading.discard(spec.name)
+                self.__class__ = types.ModuleType
+        return types.ModuleType.__getattribute__(self, attr)
+
+def load(name):
+    # Return a module that is only executed when one of its attributes is first used
+    # pandas, numpy and requests take most of the startup time, so they (and the modules of this package importing them) are bound this way,
+    # and cost nothing to runs that never touch them, such as printing --help or a bad argument. Modules whose defaults are needed while parsing
+    # command line arguments, such as DEFAULT_WINDOWS or the default timeouts, bind them the same way so that importing those modules stays cheap
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f'No module named {name!r}', name=name)
+    module = importlib.util.module_from_spec(spec)
+    locks[name] = threading.RLock()
+    module.__class__ = LazyModule
+    sys.modules[name] = module
+
+    # Bind the submodule to its package as a regular import would, so 'from package import module' finds it
+    parent, _, child = name.rpartition('.')
+    if parent:
+        setattr(sys.modules[parent], child, module)
+    return module
@@ -0,0 +1,51 @@
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+
+# One sample as typed arrays, one element per station with a numeric AQI, and the station.time of each reading when the response has them
+Sample = namedtuple('Sample', ['uid', 'aqi', 'name', 'lat', 'lng', 'time'], defaults=(None,))
+
+# Every station of a response, with a reading or not, as the columns that the tiler, the change filter and the adaptive scheduler look at
+# aqi is NaN for stations without a reading
+Readings = namedtuple('Readings', ['uid', 'time', 'aqi', 'lat', 'lng'])
+
+def _stations(response):
+    data = response.get('data')
+    if response.get('status') != 'ok' or not isinstance(data, list):
+        return []
+    return data
+
+def parse(response):
+    # Pull each field straight out of the decoded JSON into its own array, rather than flattening every record with json_normalize
+    data = _stations(response)
+    size = len(data)
+    uid = np.fromiter((station['uid'] for station in data), dtype=np.int64, count=size)
+    lat = np.fromiter((station.get('lat', np.nan) for station in data), dtype=float, count=size)
+    lng = np.fromiter((station.get('lon', np.nan) for station in data), dtype=float, count=size)
+    name = np.array([station['station']['name'] for station in data], dtype=object)
+    time = np.array([station['station'].get('time') for station in data], dtype=object)
+
+    # Stations without a reading report an AQI of '-', which is coerced to NaN and filtered out in one vectorized step
+    aqi = pd.to_numeric(np.array([station['aqi'] for station in data], dtype=object), errors='coerce').astype(float)
+    keep = ~np.isnan(aqi)
+    if keep.all():
+        return Sample(uid, aqi, name, lat, lng, time)
+    return Sample(uid[keep], aqi[keep], name[keep], lat[keep], lng[keep], time[keep])
+
+def ranked(sample):
+    # Order of the stations by AQI then name, both descending, as they are printed
+    return np.lexsort((sample.name.astype(str), sample.aqi))[::-1]
+
+def readings(response):
+    data = _stations(response)
+    size = len(data)
+    uid = np.fromiter((station['uid'] for station in data), dtype=np.int64, count=size)
+    time = np.array([station.get('station', {}).get('time') for station in data], dtype=object)
+    aqi = pd.to_numeric(np.array([station.get('aqi') for station in data], dtype=object), errors='coerce').astype(float)
+    lat = np.fromiter((station.get('lat', np.nan) for station in data), dtype=float, count=size)
+    lng = np.fromiter((station.get('lon', np.nan) for station in data), dtype=float, count=size)
+    return Readings(uid, time, aqi, lat, lng)
+
+def select(sample, keep):
+    # The stations of a sample (or of its readings) where keep is true
+    return sample._make(column[keep] for column in sample)
@@ -0,0 +1,50 @@
+import json
+from exceptions.api import exceptions
+from loaders import lazy
+
+tiles = lazy.load('regions.tiles')
+
+# Bodies shorter than this are decoded straight away for their status, as the API's errors are only a few dozen bytes
+PEEK_SIZE = 256
+
+class Payload:
+
+    def __init__(self, content):
+        # The undecoded body of one API response, which is decoded (along with the rest of its sample) on a parse worker
+        # The sampling process only decodes short bodies, to see whether they are errors, and takes any longer body to hold stations
+        self.content = content
+        self.head = json.loads(content) if len(content) < PEEK_SIZE else {'status': 'ok'}
+
+    def __getitem__(self, key):
+        return self.head[key]
+
+    def get(self, key, default=None):
+        return self.head.get(key, default)
+
+def encode(response):
+    # The body of a response as JSON bytes on one line, ready to be cached or logged, without decoding it if it is still a payload
+    if isinstance(response, Payload):
+        content = response.content
+        return content.replace(b'\r', b'').replace(b'\n', b'') if b'\n' in content or b'\r' in content else content
+    return json.dumps(response, separators=(',', ':')).encode()
+
+def decode(response):
+    # Decode a payload or the bytes of a body, leaving a response that is already decoded as it is
+    if isinstance(response, Payload):
+        response = response.content
+    return json.loads(response) if isinstance(response, bytes) else response
+
+def check_response(response):
+    # Raise the matching exception if the API responded with an error
+    if response['status'] == 'error':
+        if response['data'] == 'Over quota':
+            raise exceptions.APIRequestQuotaError('API request failed. The request quota is over limits.')
+        elif response['data'] == 'Invalid key':
+            raise exceptions.APIInvalidKeyError('API request failed. The key is not valid.')
+
+def validated(responses):
+    # Raise the matching exception if any tile's response is an error, and merge the tiles of a sample into one response
+    responses = [decode(response) for response in responses]
+    for response in responses:
+        check_response(response)
+    return responses[0] if len(responses) == 1 else tiles.merge_responses(responses)
@@ -0,0 +1,29 @@
+class ChangeFilter:
+
+    def __init__(self):
+        # Last station.time seen for every station, keyed by uid
+        self.last_seen = {}
+        self.checked = 0
+        self.skipped = 0
+
+    def filter(self, response):
+        # Drop stations whose reading has not been updated since the last sample, and return the response with how many were dropped
+        # Most stations only update hourly, so sampling many times a minute would otherwise count the same reading over and over
+        if response['status'] != 'ok' or not response['data']:
+            return response, 0
+
+        keep = self.updated([station['uid'] for station in response['data']], [station.get('station', {}).get('time') for station in response['data']])
+        data = [station for station, kept in zip(response['data'], keep) if kept]
+        return {**response, 'data': data}, len(keep) - len(data)
+
+    def updated(self, uids, times):
+        # Whether the reading of every station, given as columns of uid and station.time, was updated since the last sample
+        keep = []
+        for uid, updated in zip(uids, times):
+            keep.append(updated is None or self.last_seen.get(uid) != updated)
+            if updated is not None:
+                self.last_seen[uid] = updated
+
+        self.checked += len(keep)
+        self.skipped += keep.count(False)
+        return keep
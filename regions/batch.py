@@ -0,0 +1,56 @@
+import csv
+import numpy as np
+from aggregators import sketches, stations
+from regions import tiles
+from storage import registry as station_registry
+
+def load_regions(path):
+    # Read named bounding boxes, one 'name,lat1,lng1,lat2,lng2' per line. Blank lines and lines starting with '#' are skipped
+    regions = []
+    names = set()
+    with open(path, newline='') as f:
+        for number, row in enumerate(csv.reader(f), start=1):
+            if not row or not ''.join(row).strip() or row[0].strip().startswith('#'):
+                continue
+            if len(row) != 5:
+                raise ValueError(f'Line {number} of {path} should be name,lat1,lng1,lat2,lng2')
+
+            name = row[0].strip()
+            try:
+                bounds = [float(value) for value in row[1:]]
+            except ValueError:
+                raise ValueError(f'Line {number} of {path} has a non-numeric bound') from None
+            if name in names:
+                raise ValueError(f'Line {number} of {path} repeats the region name {name}')
+
+            names.add(name)
+            regions.append((name, *bounds))
+
+    if not regions:
+        raise ValueError(f'{path} has no regions')
+    return regions
+
+class RegionBatch:
+
+    def __init__(self, regions, tile_size=None, max_stations=None, percentiles=(), accuracy=sketches.DEFAULT_ACCURACY, registry=None):
+        # regions is a list of (name, lat1, lng1, lat2, lng2), as returned by load_regions
+        # The aggregators of every region share one station registry, so a station in several regions is only interned once
+        self.names = [region[0] for region in regions]
+        self.boxes = np.array([tiles.normalize(*region[1:]) for region in regions], dtype=float)
+        self.registry = registry if registry is not None else station_registry.StationRegistry()
+        self.aggregators = {name: stations.StationAggregator(percentiles=percentiles, accuracy=accuracy, registry=self.registry) for name in self.names}
+
+        # Tiles to fetch once per sample slot, covering the union of every region without overlap
+        self.tiler = tiles.Tiler(self.boxes.tolist(), tile_size, max_stations)
+        self.bounds = (self.boxes[:, 0].min(), self.boxes[:, 1].min(), self.boxes[:, 2].max(), self.boxes[:, 3].max())
+
+    def split(self, response):
+        # Fan every station out to each region whose box contains it, returning one response per region
+        data = response['data'] if response['status'] == 'ok' else []
+        lat = np.array([station.get('lat', np.nan) for station in data], dtype=float)
+        lng = np.array([station.get('lon', np.nan) for station in data], dtype=float)
+
+        boxes = self.boxes[:, :, np.newaxis]
+        inside = (boxes[:, 0] <= lat) & (lat <= boxes[:, 2]) & (boxes[:, 1] <= lng) & (lng <= boxes[:, 3])
+
+        return [(name, {'status': 'ok', 'data': [data[index] for index in np.flatnonzero(mask)]}) for name, mask in zip(self.names, inside)]
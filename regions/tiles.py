@@ -0,0 +1,125 @@
+import math
+import threading
+import numpy as np
+
+def normalize(lat1, lng1, lat2, lng2):
+    # Order a bounding box's corners as (south, west, north, east)
+    return (min(lat1, lat2), min(lng1, lng2), max(lat1, lat2), max(lng1, lng2))
+
+def union_tiles(boxes):
+    # Cover the union of possibly overlapping boxes with non-overlapping rectangular tiles, so no area is requested twice
+    # Every distinct edge splits the plane into elementary cells, covered cells are merged into runs along each row,
+    # and identical runs in consecutive rows are stacked into one tile
+    boxes = [normalize(*box) for box in boxes]
+    tiles = [box for box in boxes if box[0] == box[2] or box[1] == box[3]]
+    boxes = [box for box in boxes if box not in tiles]
+    if not boxes:
+        return sorted(set(tiles))
+
+    lats = sorted({box[0] for box in boxes} | {box[2] for box in boxes})
+    lngs = sorted({box[1] for box in boxes} | {box[3] for box in boxes})
+    lat_index = {lat: index for index, lat in enumerate(lats)}
+    lng_index = {lng: index for index, lng in enumerate(lngs)}
+
+    rows = len(lats) - 1
+    columns = len(lngs) - 1
+    covered = [[False]*columns for _ in range(rows)]
+    for south, west, north, east in boxes:
+        for row in range(lat_index[south], lat_index[north]):
+            for column in range(lng_index[west], lng_index[east]):
+                covered[row][column] = True
+
+    open_runs = {}
+    for row in range(rows + 1):
+        runs = set()
+        column = 0
+        while row < rows and column < columns:
+            if covered[row][column]:
+                end = column
+                while end < columns and covered[row][end]:
+                    end += 1
+                runs.add((column, end))
+                column = end
+            else:
+                column += 1
+
+        for run in [run for run in open_runs if run not in runs]:
+            start = open_runs.pop(run)
+            tiles.append((lats[start], lngs[run[0]], lats[row], lngs[run[1]]))
+        for run in runs:
+            open_runs.setdefault(run, row)
+
+    return sorted(set(tiles))
+
+def grid_tiles(box, tile_size):
+    # Split a box into an even grid of sub-boxes that are at most tile_size degrees on each side
+    south, west, north, east = normalize(*box)
+    rows = max(1, math.ceil((north - south)/tile_size))
+    columns = max(1, math.ceil((east - west)/tile_size))
+    lats = np.linspace(south, north, rows + 1).tolist()
+    lngs = np.linspace(west, east, columns + 1).tolist()
+    return [(lats[row], lngs[column], lats[row + 1], lngs[column + 1]) for row in range(rows) for column in range(columns)]
+
+def quarter(box):
+    south, west, north, east = box
+    lat = (south + north)/2
+    lng = (west + east)/2
+    return [(south, west, lat, lng), (south, lng, lat, east), (lat, west, north, lng), (lat, lng, north, east)]
+
+class Tiler:
+
+    def __init__(self, boxes, tile_size=None, max_stations=None, min_size=0.05):
+        # Tiles start as the union of the boxes, optionally cut into a grid of tile_size degrees
+        # If max_stations is given, any tile whose response held at least that many stations is quartered for later samples,
+        # down to tiles of min_size degrees, so dense areas adapt to smaller (faster, untruncated) requests
+        self.max_stations = max_stations
+        self.min_size = min_size
+        self.lock = threading.Lock()
+
+        tiles = union_tiles(boxes)
+        if tile_size is not None:
+            tiles = [grid for tile in tiles for grid in grid_tiles(tile, tile_size)]
+        self.current = tiles
+
+    def tiles(self):
+        with self.lock:
+            return list(self.current)
+
+    def observe(self, response):
+        # Count the stations of a merged response in each tile, and quarter the tiles that are too dense
+        if self.max_stations is None or response['status'] != 'ok' or not response['data']:
+            return
+
+        lat = np.array([station.get('lat', np.nan) for station in response['data']], dtype=float)
+        lng = np.array([station.get('lon', np.nan) for station in response['data']], dtype=float)
+        self.observe_positions(lat, lng)
+
+    def observe_positions(self, lat, lng):
+        # The same for the stations of a response given as arrays of latitude and longitude, as parse workers send them back
+        if self.max_stations is None or not len(lat):
+            return
+
+        with self.lock:
+            boxes = np.array(self.current, dtype=float)[:, :, np.newaxis]
+            counts = ((boxes[:, 0] <= lat) & (lat <= boxes[:, 2]) & (boxes[:, 1] <= lng) & (lng <= boxes[:, 3])).sum(axis=1)
+
+            tiles = []
+            for tile, count in zip(self.current, counts):
+                if count >= self.max_stations and min(tile[2] - tile[0], tile[3] - tile[1]) >= 2*self.min_size:
+                    tiles.extend(quarter(tile))
+                else:
+                    tiles.append(tile)
+            self.current = tiles
+
+def merge_responses(responses):
+    # Merge the stations of several tile responses into one response, keeping each station (by uid) once
+    seen = set()
+    data = []
+    for response in responses:
+        if response['status'] != 'ok':
+            continue
+        for station in response['data']:
+            if station['uid'] not in seen:
+                seen.add(station['uid'])
+                data.append(station)
+    return {'status': 'ok', 'data': data}
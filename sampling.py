@@ -0,0 +1,85 @@
+from collections import namedtuple
+from loaders import lazy
+import contextlib
+import itertools
+import os
+import queue
+import threading
+import time
+import script
+
+stations = lazy.load('aggregators.stations')
+
+# One processed sample: its number in the order samples were processed, when it was processed (seconds since the epoch),
+# and its stations with a reading as typed arrays (uid, aqi, name, lat and lng, as parsed by parsers/columnar.py)
+Record = namedtuple('Record', ['sample', 'time', 'data'])
+
+@contextlib.contextmanager
+def logged(log=None):
+    # Progress and diagnostics of the run go to log, or nowhere without one, rather than to stdout
+    with contextlib.ExitStack() as stack:
+        if log is None:
+            log = stack.enter_context(open(os.devnull, 'w'))
+        stack.enter_context(script.logging_to(log))
+        yield
+
+def samples(lat1, lng1, lat2, lng2, period=5, rate=1, aggregator=None, options=None, keys=None, buffer=64, log=None, **changes):
+    # Yield a Record for every sample as soon as it is processed, while sampling runs on a background thread, for period minutes or forever when period is None
+    # Samples are also fed into aggregator if one is given, so its to_frame() holds the averages once the generator is exhausted
+    # Up to buffer records wait for a slow consumer, after which processing waits for it. Closing the generator (or breaking out of a loop over it) stops sampling
+    # Errors raised while sampling, such as APIInvalidKeyError, are raised from the generator
+    # options are the script.Options of the run, any of which can also be given by name, such as engine='asyncio', min_rate=2 or
+    # simulation (a SimulatedClient from clients/simulated.py, to run on its virtual clock without calling the API)
+    # keys is a KeyPool from clients/keyring.py, made from API_KEY when not given
+    options = (options if options is not None else script.Options())._replace(**changes)
+    if aggregator is None:
+        aggregator = stations.StationAggregator()
+    records = queue.Queue(maxsize=buffer)
+    stop = threading.Event()
+    failures = []
+    numbers = itertools.count(1)
+    now = options.simulation.clock.time if options.simulation is not None else time.time
+
+    def sink(parsed):
+        record = Record(next(numbers), now(), parsed[0][1])
+        while not stop.is_set():
+            try:
+                records.put(record, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def sample():
+        try:
+            tiler = script.make_tiler([(lat1, lng1, lat2, lng2)], options.tile_size, options.tile_max_stations)
+            script.run_sampling(lat1, lng1, lat2, lng2, period, rate, options, script.Context(aggregator=aggregator, tiler=tiler, sink=sink, stop=stop, keys=keys))
+        except BaseException as e:
+            failures.append(e)
+
+    # LOG is shared by the whole process, so it is swapped for the duration of the run
+    with logged(log):
+        thread = threading.Thread(target=sample, daemon=True)
+        thread.start()
+        try:
+            while thread.is_alive() or not records.empty():
+                try:
+                    yield records.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+        finally:
+            stop.set()
+            thread.join()
+
+    if failures:
+        raise failures[0]
+
+def averages(lat1, lng1, lat2, lng2, period=5, rate=1, options=None, keys=None, log=None, **changes):
+    # Sample for the period without printing anything, and return the per-station table (station.name, mean, count, min, max, std
+    # and any percentiles among the statistics option, such as 'p95'), sorted on mean AQI in descending order
+    # The registry option is a StationRegistry from storage/registry.py to intern the stations into, such as one loaded from a file (saved again with its save())
+    options = (options if options is not None else script.Options())._replace(**changes)
+    aggregator = stations.StationAggregator(percentiles=script.evaluated_statistics.percentiles(options.statistics), accuracy=options.accuracy, registry=options.registry)
+    tiler = script.make_tiler([(lat1, lng1, lat2, lng2)], options.tile_size, options.tile_max_stations)
+    with logged(log):
+        script.run_sampling(lat1, lng1, lat2, lng2, period, rate, options, script.Context(aggregator=aggregator, tiler=tiler, keys=keys))
+    return aggregator.to_frame()
\ No newline at end of file
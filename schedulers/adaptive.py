@@ -0,0 +1,108 @@
+import collections
+import time
+from instrumentation import metrics
+from schedulers import deadlines
+
+# Fraction of the stations seen in consecutive samples whose reading changed, above which the rate is doubled, and at or below which it is halved
+DEFAULT_RAISE_ABOVE = 0.01
+DEFAULT_LOWER_BELOW = 0.001
+
+# Least change in AQI counted as a change of reading, when station.time stays the same
+DEFAULT_DELTA = 1.0
+
+def ladder(min_rate, max_rate):
+    # Rates that divide max_rate, so that every sample falls on a slot of the max_rate schedule and stands for a whole number of slots
+    return [rate for rate in range(1, max_rate + 1) if max_rate % rate == 0 and rate >= min_rate]
+
+def check_rates(min_rate, max_rate):
+    # Rates to adapt between, raising ValueError unless min_rate is a divisor of max_rate below it, so that there are at least two
+    if min_rate > max_rate:
+        raise ValueError(f'The lowest rate {min_rate} is above the highest rate {max_rate}')
+    rates = ladder(min_rate, max_rate)
+    if rates[0] != min_rate:
+        raise ValueError(f'The lowest rate {min_rate} does not divide the highest rate {max_rate}, so its samples would not fall on slots of it (divisors: {", ".join(map(str, ladder(1, max_rate)))})')
+    if len(rates) < 2:
+        raise ValueError(f'The lowest rate {min_rate} is the highest rate, which leaves no other rate to adapt to')
+    return rates
+
+def aqi(value):
+    # Stations without a reading report '-' (or NaN once parsed), which only counts as a change when a reading appears or goes away
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if value == value else None
+
+class AdaptiveScheduler(deadlines.DeadlineScheduler):
+
+    def __init__(self, min_rate, max_rate, minute=60, start=None, clock=time.monotonic, raise_above=DEFAULT_RAISE_ABOVE, lower_below=DEFAULT_LOWER_BELOW, delta=DEFAULT_DELTA):
+        # Samples between min_rate and max_rate times a minute, doubling the rate after a minute in which readings changed and halving it after one in which they held still
+        # Deadlines are those of max_rate, and a minute at a lower rate only uses every (max_rate/rate)th of them, so changing the rate never shifts the schedule
+        # A station has changed when its station.time was updated, or its AQI moved by at least delta, since the last sample it was seen in
+        # Runs start at min_rate, which must be a divisor of max_rate below it (see check_rates)
+        rates = check_rates(min_rate, max_rate)
+        super().__init__(max_rate, minute, start, clock)
+        self.rates = rates
+        self.raise_above = raise_above
+        self.lower_below = lower_below
+        self.delta = delta
+        self.current = self.rates[0]
+        self.stride = max_rate//self.current
+        self.last = {}
+        self.checked = 0
+        self.changed = 0
+        self.minutes = collections.Counter()
+
+    def changed_reading(self, before, after):
+        if before[0] != after[0]:
+            return True
+        if before[1] is None or after[1] is None:
+            return (before[1] is None) != (after[1] is None)
+        return abs(after[1] - before[1]) >= self.delta
+
+    def observe(self, response):
+        # Compare every station of a sample with the last sample it was seen in
+        if response['status'] != 'ok':
+            return
+        data = response['data']
+        self.observe_readings([station['uid'] for station in data], [station.get('station', {}).get('time') for station in data], [station.get('aqi') for station in data])
+
+    def observe_readings(self, uids, times, values):
+        # The same for stations given as columns of uid, station.time and AQI, as parse workers send them back
+        for uid, updated, value in zip(uids, times, values):
+            reading = (updated, aqi(value))
+            last = self.last.get(uid)
+            self.last[uid] = reading
+            if last is None:
+                continue
+            self.checked += 1
+            if self.changed_reading(last, reading):
+                self.changed += 1
+
+    def adapt(self):
+        # A minute without any station seen twice keeps its rate
+        if self.checked:
+            fraction = self.changed/self.checked
+            if fraction > self.raise_above:
+                self.current = next((rate for rate in self.rates if rate >= 2*self.current), self.rates[-1])
+            elif fraction <= self.lower_below:
+                self.current = max((rate for rate in self.rates if rate <= self.current/2), default=self.rates[0])
+        self.checked = 0
+        self.changed = 0
+        return self.current
+
+    def plan(self, minute):
+        # Choose the minute's rate from the changes seen since the last minute was planned, and return its samples
+        rate = self.adapt()
+        self.stride = self.rate//rate
+        self.minutes[rate] += 1
+        metrics.registry.count('adaptive_samples', rate)
+        return range(minute*self.rate, (minute + 1)*self.rate, self.stride)
+
+    def slot_end(self, sample, slots=1):
+        # A slot is the time between two samples at the current rate, not at the highest one
+        return self.deadline(sample + slots*self.stride)
+
+    def summary_rates(self):
+        rates = ', '.join(f'{rate}/min for {count} minute(s)' for rate, count in sorted(self.minutes.items(), reverse=True))
+        return f'Adapted the sampling rate between {self.rates[0]} and {self.rate} per minute: {rates}'
@@ -0,0 +1,65 @@
+import asyncio
+import selectors
+import threading
+
+class VirtualClock:
+
+    def __init__(self, start=0.0, epoch=0.0):
+        # Time that only moves when advanced, standing in for time.monotonic (and time.time, offset by epoch) in simulated runs
+        self.now = start
+        self.epoch = epoch
+        self.lock = threading.Lock()
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.epoch + self.now
+
+    def advance(self, seconds):
+        with self.lock:
+            self.now += max(0.0, seconds)
+
+class VirtualSelector(selectors.DefaultSelector):
+
+    def __init__(self, clock):
+        super().__init__()
+        self.clock = clock
+
+    def select(self, timeout=None):
+        # Hand over anything actually ready (such as a callback from another thread), or else jump the clock straight to the next timer instead of sleeping
+        # With no timer pending, nothing can happen until another thread wakes the loop, so that is still waited for for real
+        events = super().select(0)
+        if events or timeout == 0:
+            return events
+        if timeout is None:
+            return super().select(None)
+        self.clock.advance(timeout)
+        return []
+
+def event_loop(clock):
+    # An event loop on the virtual clock: timers, sleeps and timeouts keep their order and cancellation, but take no real time
+    class SimulatedEventLoop(asyncio.SelectorEventLoop):
+
+        def time(self):
+            return clock.monotonic()
+
+    return SimulatedEventLoop(VirtualSelector(clock))
+
+def run(coroutine, clock):
+    # asyncio.run on the virtual clock, cancelling whatever is left running once the coroutine returns
+    loop = event_loop(clock)
+    asyncio.set_event_loop(loop)
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        try:
+            pending = asyncio.all_tasks(loop)
+            for task in pending:
+                task.cancel()
+            if pending:
+                loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            loop.run_until_complete(loop.shutdown_asyncgens())
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
@@ -0,0 +1,67 @@
+import asyncio
+import threading
+import time
+
+class DeadlineScheduler:
+
+    def __init__(self, rate, minute=60, start=None, clock=time.monotonic):
+        # Every sample gets an absolute deadline on the monotonic clock, so spacing never drifts from one minute to the next
+        # Simulated runs pass a virtual clock (see schedulers/clocks.py) in place of time.monotonic
+        self.rate = rate
+        self.interval = minute/rate
+        self.clock = clock
+        self.start = clock() if start is None else start
+        self.lock = threading.Lock()
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def deadline(self, sample):
+        return self.start + sample*self.interval
+
+    def plan(self, minute):
+        # Samples of the minute, numbered across the whole run. The step of the range is how many slots each sample stands for
+        return range(minute*self.rate, (minute + 1)*self.rate)
+
+    def observe(self, response):
+        # A fixed rate does not depend on the readings (see schedulers/adaptive.py for one that does)
+        pass
+
+    def observe_readings(self, uids, times, values):
+        pass
+
+    def slot_end(self, sample, slots=1):
+        # When a sample's response is due, slots sampling slots after its deadline
+        return self.deadline(sample + slots)
+
+    def wait(self, sample, event):
+        # Block until the sample's deadline and return how late it woke up, or None if the event was set first
+        # Waiting on the event rather than sleeping means cancellation wakes every worker immediately
+        timeout = self.deadline(sample) - self.clock()
+        if event.wait(max(0, timeout)):
+            return None
+        return self.record(sample)
+
+    async def wait_async(self, sample, cancel):
+        timeout = self.deadline(sample) - self.clock()
+        try:
+            await asyncio.wait_for(cancel.wait(), timeout=max(0, timeout))
+            return None
+        except asyncio.TimeoutError:
+            if cancel.is_set():
+                return None
+            return self.record(sample)
+
+    def record(self, sample):
+        jitter = self.clock() - self.deadline(sample)
+        with self.lock:
+            self.count += 1
+            self.total += jitter
+            self.maximum = max(self.maximum, jitter)
+        return jitter
+
+    def summary(self):
+        # Mean and maximum schedule jitter in seconds over every sample that fired
+        with self.lock:
+            mean = self.total/self.count if self.count else 0.0
+            return self.count, mean, self.maximum
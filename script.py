@@ -1,94 +1,396 @@
-import requests
-import pandas as pd
-from configparser import ConfigParser
-from argparse import ArgumentParser
+from configparser import ConfigParser, Error as ConfigError
+from argparse import ArgumentParser, ArgumentTypeError
+from collections import namedtuple
+import asyncio
 import concurrent.futures
 from threading import Event
 from exceptions.api import exceptions
-from evaluators import integers
+from evaluators import integers, floats, statistics as evaluated_statistics
+from clients import hedging, http, keyring, limits
+from schedulers import adaptive, deadlines
+from parsers import payloads, readings
+from instrumentation import metrics
+from storage import responses as response_log, cache as response_cache
+from loaders import lazy
+import contextlib
+import itertools
+import json
+import os
+import sqlite3
+import sys
 import time
 
-config = ConfigParser()
-with open('config.cfg') as f:
-    config.read_file(f)
+requests = lazy.load('requests')
+pd = lazy.load('pandas')
+stations = lazy.load('aggregators.stations')
+sketches = lazy.load('aggregators.sketches')
+grids = lazy.load('aggregators.grids')
+rolling = lazy.load('aggregators.rolling')
+partials = lazy.load('aggregators.partials')
+tiling = lazy.load('regions.tiles')
+columnar = lazy.load('parsers.columnar')
+records = lazy.load('storage.records')
+clocks = lazy.load('schedulers.clocks')
+simulated = lazy.load('clients.simulated')
+station_registry = lazy.load('storage.registry')
 
-API_KEY = config.get('api_keys', 'air_quality')
+# Environment variables that can hold the API key, or the path of the config file holding it
+API_KEY_VARIABLE = 'AIR_QUALITY_API_KEY'
+CONFIG_VARIABLE = 'AIR_QUALITY_CONFIG'
+CONFIG_PATH = 'config.cfg'
 
-def normalize_response(response):
-    # Flatten the JSON response's relevant data and store it in pandas DataFrame. Transform and manipulate the sample data, print, and return
-    data = pd.json_normalize(response, 'data')
-    if not data.empty:
-        data = data[['aqi', 'station.name']]
-        data['aqi'] = pd.to_numeric(data['aqi'], errors='coerce')
-        data = data.dropna()
-        data = data.sort_values(by=['aqi', 'station.name'], ascending=False)
-        data = data.reset_index(drop=True)
+# API key, resolved on first use by api_key() unless it has been set before then
+API_KEY = None
 
-        for index, row in data.iterrows():
-            print('AQI: {aqi}, Station {idx}: {station}'.format(idx=index+1, aqi=row['aqi'], station=row['station.name']))
-        print('')
+# Base URL of the World Air Quality Index API, which can be pointed at a local stand-in server
+API_URL = 'https://api.waqi.info'
 
-        return data
-    else:
-        print('No data for given latitude and longitude arguments at this current time.\n')
-        return pd.DataFrame(columns=['aqi', 'station.name'])
+# Length of a sampling minute in seconds
+MINUTE = 60
+
+# Where progress and diagnostics (sample timings, skipped samples, summaries) are written, or None for stdout
+# JSON lines output sends them to stderr, quiet output discards them, and the Python API in sampling.py discards them unless given a log
+LOG = None
+
+# What a run is asked for, on the command line (see parsed_options) or through sampling.py, each field defaulting as its flag does
+# Fields that only some entry points use, such as daemon or grid_size, are left alone by the others
+# store is an open SampleStore, simulation a SimulatedClient, cache a ResponseCache and registry a StationRegistry, or None for none
+Options = namedtuple('Options', [
+    'connect_timeout', 'read_timeout', 'engine', 'tile_size', 'tile_max_stations', 'weighting', 'budget', 'quota_deadline', 'parse_workers',
+    'statistics', 'accuracy', 'key_strategy', 'key_quarantine', 'hedge_budget', 'hedge_percentile', 'deadline_slots', 'min_rate',
+    'metrics_file', 'metrics_port', 'record', 'output', 'daemon', 'emit_every', 'windows', 'replay_path', 'replay_workers', 'grid_size', 'grid_file',
+    'store', 'simulation', 'cache', 'registry'
+], defaults=(
+    http.DEFAULT_CONNECT_TIMEOUT, http.DEFAULT_READ_TIMEOUT, 'threads', None, None, 'sample', None, limits.DEFAULT_QUOTA_DEADLINE, None,
+    (), sketches.DEFAULT_ACCURACY, 'round-robin', keyring.DEFAULT_QUARANTINE, None, hedging.DEFAULT_PERCENTILE, None, None,
+    None, None, None, 'text', False, 5, rolling.DEFAULT_WINDOWS, None, None, None, None,
+    None, None, None, None
+))
+
+# Flags whose attribute on the parsed arguments is named differently from their option
+OPTION_FLAGS = {'accuracy': 'sketch_accuracy', 'replay_path': 'replay'}
+
+# What every sample of a run shares: where its stations go (aggregator, store, grid and sink), what is called after every minute,
+# the tiler and regions it covers, and what schedules, records, limits and hedges its calls (see run_sampling, which makes what a caller leaves out)
+Context = namedtuple('Context', [
+    'aggregator', 'scheduler', 'tiler', 'regions', 'changes', 'limiter', 'every_minute', 'store', 'recorder', 'pool', 'grid', 'sink', 'stop', 'keys', 'hedger', 'cache'
+], defaults=(None,)*16)
+
+def log_file():
+    return LOG if LOG is not None else sys.stdout
+
+def log(message):
+    print(message, file=log_file())
+
+@contextlib.contextmanager
+def logging_to(file):
+    # Send progress and diagnostics to file for the duration of the block
+    global LOG
+    previous = LOG
+    LOG = file
+    try:
+        yield
+    finally:
+        LOG = previous
+
+def print_sample(sample):
+    # Print the stations of a parsed sample, sorted on AQI in descending order
+    if not len(sample.aqi):
+        log('No data for given latitude and longitude arguments at this current time.\n')
+        return
+
+    order = columnar.ranked(sample)
+    lines = ['AQI: {aqi}, Station {idx}: {station}'.format(idx=index+1, aqi=sample.aqi[position], station=sample.name[position]) for index, position in enumerate(order)]
+    log('\n'.join(lines) + '\n')
+
+def normalize_response(response, verbose=None):
+    # Parse the JSON response's relevant data into typed columns and store it in pandas DataFrame. Print if anybody is watching stdout, and return
+    if verbose is None:
+        verbose = sys.stdout.isatty()
+
+    sample = columnar.parse(response)
+    if verbose:
+        print_sample(sample)
+
+    return pd.DataFrame({'aqi': sample.aqi, 'station.name': sample.name})
+
+def describe_sample(sample, period, rate):
+    # A daemon samples without a period, so its samples have no total
+    total = f'/{period*rate}' if period is not None else ''
+    return f'Minute: {sample//rate}, Sample: {sample%rate+1} - ({sample+1}{total})'
+
+def load_api_key(path=None):
+    # Read the API key from the config file at path, or else from the environment variable, the config file it names, or config.cfg
+    if path is None:
+        key = os.environ.get(API_KEY_VARIABLE)
+        if key:
+            return key
+        path = os.environ.get(CONFIG_VARIABLE, CONFIG_PATH)
+
+    config = ConfigParser()
+    with open(path) as f:
+        config.read_file(f)
+    return config.get('api_keys', 'air_quality')
+
+def api_key():
+    global API_KEY
+    if API_KEY is None:
+        API_KEY = load_api_key()
+    return API_KEY
+
+def build_url(lat1, lng1, lat2, lng2, key=None):
+    return f'{API_URL}/v2/map/bounds?latlng={lat1},{lng1},{lat2},{lng2}&networks=all&token={key or api_key()}'
 
-def api_call(url):
-    response = requests.get(url)
+def key_pool(strategy='round-robin', quarantine=keyring.DEFAULT_QUARANTINE):
+    # Spread the requests of a run over every key in API_KEY, which may hold several separated by commas or spaces
+    return keyring.KeyPool(keyring.split(api_key()), strategy, quarantine)
+
+def over_quota(response):
+    return response['status'] == 'error' and response['data'] == 'Over quota'
+
+def validated(responses, raw=False):
+    # Raise the matching exception if any tile's response is an error, and merge the tiles of a sample into one response
+    # Raw tiles are only checked for errors, and left for a parse worker to decode and merge
+    if not raw:
+        return payloads.validated(responses)
+    for response in responses:
+        payloads.check_response(response)
+    return responses
+
+def api_call(url, client=None):
+    # Reuse pooled keep-alive connections rather than opening a new connection for every sample
+    if client is None:
+        client = http.default_client()
+    with metrics.registry.in_flight(), metrics.registry.time('api_call'):
+        response = client.get(url)
     return response
 
-def request_data(lat1, lng1, lat2, lng2, period, rate, sample, event):
-    # Wait for thread to run given which sample number this in a minute, and continually check whether or not to kill thread while waiting
-    # TODO: Make the checks have equal time intervals regardless of sample number (problem: range only accepts integer and rate can cause irrational numbers for time intervals)
-    for _ in range(60):
-        if event.is_set():
+def fetch_tile(tile, client, event, limiter, give_up_at, *, keys=None, hedger=None, executor=None, cache=None, raw=False):
+    # Make an API call for one tile within the request budget, backing off and retrying while the quota is over limits
+    # Returns None if the sample's slot ends (or the threads are killed) before a response within quota arrives,
+    # and raises APIDeadlineError if the budget has no request to spare before the slot ends
+    # With a hedger, the call runs on the executor, is hedged once it is slow, and raises APIDeadlineError if nothing answers by give_up_at
+    # With a response cache, a response another process (or sample) already fetched for the tile in the same bucket is used instead,
+    # and waiting for another process to fetch it ends when the threads are killed, or raises APIDeadlineError once the slot ends
+    # When raw, the response is returned undecoded as a Payload, for a parse worker to decode
+    deadline_clock = limiter.clock if limiter is not None else time.monotonic
+
+    def attempt():
+        key = keys.acquire() if keys is not None else None
+        response = api_call(build_url(*tile, key), client)
+        if raw:
+            return key, payloads.Payload(response.content)
+        with metrics.registry.time('decode'):
+            return key, response.json()
+
+    while True:
+        with cache.flight(tile, event, give_up_at, deadline_clock) if cache is not None else contextlib.nullcontext() as flight:
+            if flight is not None and not flight.owned:
+                if flight.response is None and not event.is_set():
+                    raise exceptions.APIDeadlineError('API request failed. Another process was still fetching the response when the sample\'s deadline passed.')
+                return flight.response
+            if limiter is not None and not limiter.acquire(event, give_up_at):
+                if not event.is_set():
+                    raise exceptions.APIDeadlineError('API request failed. The budget had no request to spare before the sample\'s deadline.')
+                return None
+
+            key, response = attempt() if hedger is None else hedger.call(attempt, executor, give_up_at, limiter)
+            if flight is not None:
+                flight.store(response)
+
+        # A key that is over quota or not valid is set aside, and the call is retried straight away on another key if one is ready
+        retry = keys is not None and keys.report(key, response)
+        if retry and keys.ready():
+            metrics.registry.count('key_retries')
+            continue
+        if limiter is None or not (retry or over_quota(response)):
+            if limiter is not None:
+                limiter.succeeded()
+            return response
+
+        delay = limiter.backoff()
+        metrics.registry.count('retries')
+        if limiter.clock() + delay > give_up_at or event.wait(delay):
             return None
-        time.sleep((sample%rate)/rate)
 
-    # Make API call with given arguments, get API response and transform it to JSON
-    url = f'https://api.waqi.info/v2/map/bounds?latlng={lat1},{lng1},{lat2},{lng2}&networks=all&token={API_KEY}'
-    response = api_call(url)
-    response = response.json()
+def request_data(lat1, lng1, lat2, lng2, period, rate, sample, event, client=None, context=None, *, tiles=None, executor=None, call_executor=None):
+    # Uses the scheduler, limiter, recorder, keys, hedger and cache of the run's context, and leaves the tiles undecoded when it has a parse pool
+    if context is None:
+        context = Context()
+    scheduler, limiter, keys, hedger, cache = context.scheduler, context.limiter, context.keys, context.hedger, context.cache
+    raw = context.pool is not None
+
+    # Wait for this sample's deadline, waking immediately if the event to kill all threads is set while waiting
+    if scheduler is None:
+        scheduler = deadlines.DeadlineScheduler(rate, MINUTE)
+    with metrics.registry.time('schedule_wait'):
+        jitter = scheduler.wait(sample, event)
+    if jitter is None:
+        return None
+    metrics.registry.observe('schedule_slip', jitter)
 
-    print('Minute: {minute}, Sample: {num} - ({sample_num}/{total})'.format(minute=sample//rate, num=sample%rate+1, sample_num=sample+1, total=period*rate))
+    # Make an API call for every tile of the area (just the one box unless batching or tiling), get API responses and transform them to JSON
+    # Tiles are fetched concurrently on the executor when there is one, so a sample takes about as long as its slowest tile
+    if tiles is None:
+        tiles = [(lat1, lng1, lat2, lng2)]
+    give_up_at = scheduler.slot_end(sample, hedger.slots if hedger is not None else 1)
+    try:
+        if executor is not None and len(tiles) > 1:
+            responses = list(executor.map(lambda tile: fetch_tile(tile, client, event, limiter, give_up_at, keys=keys, hedger=hedger, executor=call_executor, cache=cache, raw=raw), tiles))
+        else:
+            responses = [fetch_tile(tile, client, event, limiter, give_up_at, keys=keys, hedger=hedger, executor=call_executor, cache=cache, raw=raw) for tile in tiles]
+    except requests.exceptions.Timeout:
+        # A hung or slow connection only loses this sample rather than stalling the whole minute
+        metrics.registry.count('timeouts')
+        log(f'{describe_sample(sample, period, rate)} timed out and was skipped\n')
+        return None
+    except exceptions.APIDeadlineError as e:
+        missed_sample(limiter, sample, period, rate, f'its deadline: {e}')
+        return None
+
+    # A sample that could not get a response within quota before its slot ended is recorded as missed rather than ending the run
+    if any(response is None for response in responses):
+        if not event.is_set():
+            missed_sample(limiter, sample, period, rate, 'while backing off from the request quota')
+        return None
 
-    if response['status'] == 'error':
-        if response['data'] == 'Over quota':
-            raise exceptions.APIRequestQuotaError('API request failed. The request quota is over limits.')
-        elif response['data'] == 'Invalid key':
-            raise exceptions.APIInvalidKeyError('API request failed. The key is not valid.')
+    log(f'{describe_sample(sample, period, rate)}, jitter: {jitter*1000:.1f} ms')
+    if context.recorder is not None:
+        context.recorder.write(sample, responses)
+    response = validated(responses, raw)
 
     if(event.is_set()):
         return None
 
     return response
 
-def start_threads(lat1, lng1, lat2, lng2, period, rate):
-    results_by_minute = []
+def missed_sample(limiter, sample, period, rate, cause):
+    # A sample with no response in time is recorded as missed, rather than holding up the rest of its minute or ending the run
+    if limiter is not None:
+        limiter.record_missed()
+    metrics.registry.count('missed_samples')
+    log(f'{describe_sample(sample, period, rate)} missed {cause}\n')
+
+def process_response(response, aggregator, regions=None, tiler=None, changes=None, store=None, verbose=None, pool=None, grid=None, sink=None, weight=1, scheduler=None):
+    # Feed a sample's columns straight into the aggregator, or fan its stations out to the aggregator of every region that contains them
+    # Sorting and printing are skipped entirely when nobody is watching the log, or when every sample is handed to a sink instead
+    # sink, if given, is called once per response with a list of (region name, parsed sample) pairs, the name being None for a single area
+    # weight is how many sampling slots the sample stands for, which is more than one for minutes an adaptive run sampled below its highest rate
+    # scheduler, if given, sees every station of the sample first, as an adaptive scheduler sets the rate by how many readings changed
+    if verbose is None:
+        verbose = sink is None and log_file().isatty()
+
+    # With a pool of parse workers, response holds the undecoded tiles of the sample, which are decoded, merged, parsed and reduced to per-station
+    # partials on another process, and only the readings the scheduler, tiler and change filter look at come back (without printing the sample)
+    if pool is not None:
+        pool.submit(response, aggregator, regions=regions, tiler=tiler, changes=changes, scheduler=scheduler, store=store, grid=grid, sink=sink, weight=weight)
+        return
+
+    if scheduler is not None:
+        scheduler.observe(response)
+    if tiler is not None:
+        tiler.observe(response)
+
+    # When averaging by reading, stations whose station.time has not changed since they were last seen are dropped
+    if changes is not None:
+        response, skipped = changes.filter(response)
+        metrics.registry.count('deduplicated_records', skipped)
+        if verbose:
+            log(f'Skipped {skipped} unchanged reading(s)')
+
+    if regions is None:
+        responses = [(None, response)]
+    else:
+        responses = regions.split(response)
+
+    parsed = []
+    for name, region_response in responses:
+        sample = columnar.parse(region_response)
+        parsed.append((name, sample))
+        if region_response['status'] == 'ok':
+            metrics.registry.count('dropped_records', len(region_response['data']) - len(sample.aqi))
+        if verbose:
+            if name is not None:
+                log(f'Region: {name}')
+            print_sample(sample)
+
+        target = aggregator if name is None else regions.aggregators[name]
+        target.add_sample(sample, weight)
+
+        # The on-disk store holds the samples of a single area, so they survive a crash and can be scanned or memory-mapped later
+        if store is not None and name is None:
+            store.append(sample)
+
+        # The grid indexes the stations of a single area by uid, and reduces every sample to a heatmap of mean AQI per cell
+        if grid is not None and name is None:
+            grid.add_sample(sample, weight)
+
+    if sink is not None:
+        sink(parsed)
+
+def minutes(period):
+    # Minutes to sample, counting up forever when there is no period
+    return range(period) if period is not None else itertools.count()
+
+def start_threads(lat1, lng1, lat2, lng2, period, rate, context=None, client=None):
+    # context is the Context of the run (see run_sampling), of which a caller may give only some parts, or none
+    if context is None:
+        context = Context()
+
+    # Every processed sample is fed into the aggregator as it arrives, so memory stays bounded regardless of the period
+    if context.aggregator is None:
+        context = context._replace(aggregator=stations.StationAggregator())
+
+    # Connection pool is sized to the number of workers so that every concurrent request can keep its connection alive
+    if client is None:
+        client = http.default_client()
+
+    # Deadlines of every sample across the whole period are fixed up front, so the next minute's threads can be started without a barrier
+    if context.scheduler is None:
+        context = context._replace(scheduler=deadlines.DeadlineScheduler(rate, MINUTE))
+    scheduler, tiler, pool = context.scheduler, context.tiler, context.pool
 
     # Used to kill all threads if set. Is set by raising exceptions, and the status of the event is continually checked to know whether or not to kill all threads
-    event = Event()
+    # A caller can pass its own event as stop, and set it from another thread to stop sampling early
+    event = context.stop if context.stop is not None else Event()
 
-    # Use threading to make an API call n times per minute for m minutes (where n = rate, m = period)
+    # Use threading to make an API call n times per minute for m minutes (where n = rate, m = period), or until interrupted when period is None
+    # every_minute is called with the minute once all of its samples have been processed
+    # Tiles of a sample are fetched on their own executor, as waiting on the sample executor from inside it could deadlock
+    # With a hedger, calls (and their hedges) run on a third executor, so that a sample can give up on a call at its deadline
+    # Blocking calls that lost or outlived their sample finish in the background, so that executor is not waited for at the end
     # TODO: Handle the case where user specifies an extremely high rate for their computer (currently handled by limiting the input argument for rate)
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        for minute in range(period):
+    with contextlib.ExitStack() as stack:
+        executor = stack.enter_context(concurrent.futures.ThreadPoolExecutor(max_workers=rate))
+        tile_executor = stack.enter_context(concurrent.futures.ThreadPoolExecutor())
+        call_executor = None
+        if context.hedger is not None:
+            call_executor = concurrent.futures.ThreadPoolExecutor(max_workers=2*rate*(len(tiler.tiles()) if tiler is not None else 1))
+            stack.callback(call_executor.shutdown, wait=False, cancel_futures=True)
+
+        for minute in minutes(period):
 
             if event.is_set():
                 break
 
-            start = time.time()
-            results = [executor.submit(request_data, lat1, lng1, lat2, lng2, period, rate, minute*rate + sample, event) for sample in range(rate)]
+            # The scheduler plans the minute's samples, fewer than rate of them when adapting the rate to how much readings change
+            tiles = tiler.tiles() if tiler is not None else None
+            samples = scheduler.plan(minute)
+            results = [executor.submit(request_data, lat1, lng1, lat2, lng2, period, rate, sample, event, client, context, tiles=tiles, executor=tile_executor, call_executor=call_executor) for sample in samples]
             
             # Process all the samples collected per minute
             try:
-                for index, result in enumerate(concurrent.futures.as_completed(results)):
+                for result in concurrent.futures.as_completed(results):
 
                     if event.is_set():
                         break
                 
                     response = result.result()
-                    results[index] = normalize_response(response)
+                    if response is None:
+                        continue
+
+                    with metrics.registry.time('process'):
+                        process_response(response, context.aggregator, context.regions, tiler, context.changes, context.store, pool=pool, grid=context.grid, sink=context.sink, weight=samples.step, scheduler=scheduler)
             
             # Kill all threads if KeyboardInterrupt or API request has error
             except KeyboardInterrupt:
@@ -100,47 +402,607 @@ def start_threads(lat1, lng1, lat2, lng2, period, rate):
             except exceptions.APIInvalidKeyError:
                 event.set()
                 raise
+
+            # Commit the minute to the on-disk store, so that a resumed run carries on after it
+            if pool is not None and not event.is_set():
+                pool.collect(wait=True)
+            if context.store is not None and not event.is_set():
+                context.store.complete_minute()
+            if context.every_minute is not None and not event.is_set():
+                context.every_minute(minute)
             
-            # Store all of the processed samples collected per minute
-            results_by_minute.append(results)
+    return context.aggregator
 
-            # Only move on to next minute once a minute has happened
-            end = time.time()
-            while end-start < 60:
+async def fetch_tile_async(tile, client, cancel, limiter, give_up_at, *, keys=None, hedger=None, cache=None, raw=False):
+    deadline_clock = limiter.clock if limiter is not None else time.monotonic
 
-                if event.is_set():
-                    break
+    async def attempt():
+        key = keys.acquire() if keys is not None else None
+        with metrics.registry.in_flight(), metrics.registry.time('api_call'):
+            if raw:
+                return key, payloads.Payload(await client.get_content(build_url(*tile, key)))
+            return key, await client.get_json(build_url(*tile, key))
 
-                time.sleep(0.01)
-                end = time.time()
-            
-    return results_by_minute
+    while True:
+        async with cache.flight_async(tile, cancel, give_up_at, deadline_clock) if cache is not None else contextlib.nullcontext() as flight:
+            if flight is not None and not flight.owned:
+                if flight.response is None and not cancel.is_set():
+                    raise exceptions.APIDeadlineError('API request failed. Another process was still fetching the response when the sample\'s deadline passed.')
+                return flight.response
+            if limiter is not None and not await limiter.acquire_async(cancel, give_up_at):
+                if not cancel.is_set():
+                    raise exceptions.APIDeadlineError('API request failed. The budget had no request to spare before the sample\'s deadline.')
+                return None
 
-def main(lat1, lng1, lat2, lng2, period, rate):
-    samples = period*rate
-    print(f'Calculating average of {period*rate} PM2.5 readings over {period} minute(s) in stations between latitudes {lat1} and {lat2} and longitudes {lng1} and {lng2}.\n')
-
-    # Start fetching API data at given rate for given period, and store the processed results
-    data = start_threads(lat1, lng1, lat2, lng2, period, rate)
-    appended_data = pd.DataFrame(columns=['aqi', 'station.name'])
-
-    # Put processed results together to collect averages
-    for minute in data:
-        for sample in minute:
-            appended_data = pd.concat([appended_data, sample], ignore_index=True)
-    
-    # Get average AQI of all samples per each station, as well as how many samples there were per station, and sort on mean AQI in descending order
-    if not appended_data.empty:
-        appended_data = appended_data.groupby('station.name', as_index=False)['aqi'].agg(['mean', 'count'])
-        appended_data = appended_data.sort_values(by=['mean', 'station.name'], ascending=False)
-        appended_data = appended_data.reset_index().rename(columns={'station.name': 'Station', 'mean': 'Mean AQI', 'count': 'Number of Samples'})
-        
-        print(f'Average of {samples} PM2.5 readings over {period} minute(s) in stations between latitudes {lat1} and {lat2} and longitudes {lng1} and {lng2}:')
-        for index, row in appended_data.iterrows():
-            print('Average AQI: {aqi} ({sample_num} samples), Station {idx}: {station}'.format(idx=index+1, aqi=row['Mean AQI'], station=row['Station'], sample_num=row['Number of Samples']))
+            key, response = await attempt() if hedger is None else await hedger.call_async(attempt, give_up_at, limiter)
+            if flight is not None:
+                flight.store(response)
+
+        retry = keys is not None and keys.report(key, response)
+        if retry and keys.ready():
+            metrics.registry.count('key_retries')
+            continue
+        if limiter is None or not (retry or over_quota(response)):
+            if limiter is not None:
+                limiter.succeeded()
+            return response
+
+        delay = limiter.backoff()
+        metrics.registry.count('retries')
+        if limiter.clock() + delay > give_up_at:
+            return None
+        try:
+            await asyncio.wait_for(cancel.wait(), timeout=delay)
+            return None
+        except asyncio.TimeoutError:
+            pass
+
+async def request_data_async(lat1, lng1, lat2, lng2, period, rate, sample, cancel, client, context=None, *, tiles=None):
+    # Uses the same parts of the run's context as request_data
+    if context is None:
+        context = Context()
+    scheduler, limiter, keys, hedger, cache = context.scheduler, context.limiter, context.keys, context.hedger, context.cache
+    raw = context.pool is not None
+
+    # Wait for this sample's deadline, waking immediately if the run is cancelled
+    if scheduler is None:
+        scheduler = deadlines.DeadlineScheduler(rate, MINUTE)
+    with metrics.registry.time('schedule_wait'):
+        jitter = await scheduler.wait_async(sample, cancel)
+    if jitter is None:
+        return None
+    metrics.registry.observe('schedule_slip', jitter)
+
+    # Make an API call for every tile of the area concurrently and get API responses as JSON
+    if tiles is None:
+        tiles = [(lat1, lng1, lat2, lng2)]
+    give_up_at = scheduler.slot_end(sample, hedger.slots if hedger is not None else 1)
+    try:
+        responses = await asyncio.gather(*[fetch_tile_async(tile, client, cancel, limiter, give_up_at, keys=keys, hedger=hedger, cache=cache, raw=raw) for tile in tiles])
+    except exceptions.APIDeadlineError as e:
+        missed_sample(limiter, sample, period, rate, f'its deadline: {e}')
+        return None
+    except asyncio.TimeoutError:
+        metrics.registry.count('timeouts')
+        log(f'{describe_sample(sample, period, rate)} timed out and was skipped\n')
+        return None
+
+    if any(response is None for response in responses):
+        if not cancel.is_set():
+            missed_sample(limiter, sample, period, rate, 'while backing off from the request quota')
+        return None
+
+    log(f'{describe_sample(sample, period, rate)}, jitter: {jitter*1000:.1f} ms')
+    if context.recorder is not None:
+        context.recorder.write(sample, responses)
+    response = validated(responses, raw)
+
+    if cancel.is_set():
+        return None
+
+    return response
+
+async def start_tasks(lat1, lng1, lat2, lng2, period, rate, client, context=None):
+    # context is the Context of the run, as in start_threads
+    if context is None:
+        context = Context()
+    if context.aggregator is None:
+        context = context._replace(aggregator=stations.StationAggregator())
+    if context.scheduler is None:
+        context = context._replace(scheduler=deadlines.DeadlineScheduler(rate, MINUTE))
+    scheduler, tiler, pool = context.scheduler, context.tiler, context.pool
+
+    # Used to cancel every pending sample cooperatively, in place of the Event shared by threads
+    # A caller can pass a threading event as stop, and set it from another thread to stop sampling early
+    cancel = asyncio.Event()
+    watcher = asyncio.create_task(watch(context.stop, cancel)) if context.stop is not None else None
+
+    # Run every sample of a minute as a coroutine on one event loop, rather than one thread per in-flight request
+    for minute in minutes(period):
+        if cancel.is_set():
+            break
+
+        tiles = tiler.tiles() if tiler is not None else None
+        samples = scheduler.plan(minute)
+        tasks = [asyncio.create_task(request_data_async(lat1, lng1, lat2, lng2, period, rate, sample, cancel, client, context, tiles=tiles)) for sample in samples]
+
+        # Process all the samples collected per minute, and cancel the rest if KeyboardInterrupt or API request has error
+        try:
+            for task in asyncio.as_completed(tasks):
+                response = await task
+                if response is None:
+                    continue
+
+                with metrics.registry.time('process'):
+                    process_response(response, context.aggregator, context.regions, tiler, context.changes, context.store, pool=pool, grid=context.grid, sink=context.sink, weight=samples.step, scheduler=scheduler)
+        finally:
+            if any(not task.done() for task in tasks):
+                cancel.set()
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+        # A minute cut short by a stop is neither committed nor reported
+        if cancel.is_set():
+            break
+        if pool is not None:
+            pool.collect(wait=True)
+        if context.store is not None:
+            context.store.complete_minute()
+        if context.every_minute is not None:
+            context.every_minute(minute)
+
+    # Any watcher left running on an error is cancelled by asyncio.run along with the loop
+    if watcher is not None:
+        watcher.cancel()
+    return context.aggregator
+
+async def watch(stop, cancel, interval=0.05):
+    # Poll a stop event set from another thread, as an asyncio event can only be set from its own loop
+    while not stop.is_set():
+        await asyncio.sleep(interval)
+    cancel.set()
+
+async def sample_async(lat1, lng1, lat2, lng2, period, rate, options, context, pool_size):
+    # The async HTTP client is an optional dependency, only needed by the asyncio engine
+    from clients import asynchronous
+
+    async with asynchronous.AsyncHTTPClient(pool_size=pool_size, connect_timeout=options.connect_timeout, read_timeout=options.read_timeout) as client:
+        return await start_tasks(lat1, lng1, lat2, lng2, period, rate, client, context)
+
+def run_sampling(lat1, lng1, lat2, lng2, period, rate, options=None, context=None):
+    # Start fetching API data at given rate for given period on the chosen engine, and return the aggregated results
+    # options are the Options of the run, and context holds whatever the caller shares with it (the aggregator, tiler, regions, every_minute,
+    # recorder, grid, sink, stop event and key pool), to which the scheduler, change filter, limiter, hedger and parse pool are added here
+    # Sample weighting counts every sample of a station, while reading weighting only counts a station again once its reading is updated
+    # A simulation (a SimulatedClient from clients/simulated.py) answers every call on its virtual clock, so a run takes no real time
+    # Slow calls are only hedged with a hedge_budget, and samples only have deadlines with a hedge_budget or deadline_slots
+    # A cache (a ResponseCache from storage/cache.py) is shared with other processes calling the API for the same tiles
+    # With a min_rate, rate is the highest rate, and each minute samples between the two as often as readings have been changing
+    if options is None:
+        options = Options()
+    if context is None:
+        context = Context()
+    simulation = options.simulation
+    clock = simulation.clock.monotonic if simulation is not None else time.monotonic
+    if options.min_rate is not None:
+        scheduler = adaptive.AdaptiveScheduler(options.min_rate, rate, MINUTE, clock=clock)
+    else:
+        scheduler = deadlines.DeadlineScheduler(rate, MINUTE, clock=clock)
+    changes = readings.ChangeFilter() if options.weighting == 'reading' else None
+    limiter = limits.RateLimiter(options.budget, quota_deadline=options.quota_deadline, clock=clock)
+    hedger = None
+    if options.hedge_budget is not None or options.deadline_slots is not None:
+        hedger = hedging.Hedger(options.hedge_budget or 0.0, options.hedge_percentile, options.deadline_slots or 1, clock=clock)
+    pool_size = rate*len(context.tiler.tiles()) if context.tiler is not None else rate
+
+    # Every run spreads its requests over the pool of API keys, even when the pool only holds one
+    keys = context.keys
+    if keys is None:
+        keys = keyring.KeyPool(['simulated'], clock=clock) if simulation is not None else key_pool(options.key_strategy, options.key_quarantine)
+
+    # Responses are only parsed and aggregated on a pool of processes when asked to, as it only pays off for many stations or regions
+    parse_pool = partials.PartialPool(options.parse_workers, context.regions) if options.parse_workers else contextlib.nullcontext()
+    with parse_pool as pool:
+        context = context._replace(scheduler=scheduler, changes=changes, limiter=limiter, hedger=hedger, keys=keys, pool=pool, store=options.store, cache=options.cache)
+        if simulation is not None:
+            # Simulated runs always use the asyncio engine, on an event loop whose timers jump straight to the next deadline
+            aggregator = clocks.run(start_tasks(lat1, lng1, lat2, lng2, period, rate, simulation, context), simulation.clock)
+        elif options.engine == 'asyncio':
+            aggregator = asyncio.run(sample_async(lat1, lng1, lat2, lng2, period, rate, options, context, pool_size))
+        else:
+            with http.HTTPClient(pool_size=pool_size, connect_timeout=options.connect_timeout, read_timeout=options.read_timeout) as client:
+                aggregator = start_threads(lat1, lng1, lat2, lng2, period, rate, context, client)
+
+    count, mean, maximum = scheduler.summary()
+    log(f'Schedule jitter over {count} sample(s): mean {mean*1000:.1f} ms, max {maximum*1000:.1f} ms\n')
+    if options.min_rate is not None:
+        log(scheduler.summary_rates() + '\n')
+    if changes is not None:
+        log(f'Skipped {changes.skipped} of {changes.checked} station record(s) as unchanged readings\n')
+    if limiter.retries or limiter.missed:
+        log(f'Retried {limiter.retries} API call(s) over quota, and missed {limiter.missed} sample(s)\n')
+    if len(keys.keys) > 1:
+        log(keys.summary() + '\n')
+    if hedger is not None and hedger.budget:
+        log(hedger.summary() + '\n')
+    if options.cache is not None:
+        log(options.cache.summary() + '\n')
+
+    return aggregator
+
+def replay_lines(lines, weighting='sample', percentiles=(), accuracy=sketches.DEFAULT_ACCURACY, registry=None):
+    # Validate, parse and aggregate recorded samples as fast as they can be decoded, without printing each one
+    aggregator = stations.StationAggregator(percentiles=percentiles, accuracy=accuracy, registry=registry)
+    changes = readings.ChangeFilter() if weighting == 'reading' else None
+    for line in lines:
+        record = json.loads(line)
+        process_response(payloads.validated(record['responses']), aggregator, changes=changes, verbose=False)
+    return aggregator
+
+def replay(path, weighting='sample', workers=None, chunk_size=256, percentiles=(), accuracy=sketches.DEFAULT_ACCURACY, registry=None):
+    # Reprocess a response log instead of sampling in real time, optionally with chunks of it parsed and aggregated on a process pool
+    # Reading weighting depends on the order of every reading of a station, so it is always replayed in one process
+    lines = response_log.read_lines(path)
+    if workers is None or workers < 2 or weighting == 'reading':
+        return replay_lines(lines, weighting, percentiles, accuracy, registry)
+
+    # Only a few chunks per worker are in flight at once, so a long log is never held in memory
+    # Every chunk is aggregated with a registry of its own, whose stations are interned into this one by uid as they are merged
+    aggregator = stations.StationAggregator(percentiles=percentiles, accuracy=accuracy, registry=registry)
+    chunks = iter(lambda: list(itertools.islice(lines, chunk_size)), [])
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = [pool.submit(replay_lines, chunk, weighting, percentiles, accuracy) for chunk in itertools.islice(chunks, workers*2)]
+        while pending:
+            aggregator.merge(pending.pop(0).result())
+            for chunk in itertools.islice(chunks, 1):
+                pending.append(pool.submit(replay_lines, chunk, weighting, percentiles, accuracy))
+    return aggregator
+
+def print_averages(aggregator, samples, description, weighting='sample', statistics=()):
+    # Print average AQI of all samples per each station, as well as how many samples (or distinct readings) there were per station, sorted on mean AQI in descending order
+    # Any other statistics asked for (std, min, max or percentiles such as p95) are printed next to the number of samples
+    if len(aggregator):
+        with metrics.registry.time('aggregate'):
+            averages = aggregator.to_frame()
+
+        # Lines are built from whole columns and written at once, rather than formatted and printed row by row
+        extras = [''] * len(averages)
+        for statistic in statistics:
+            extras = [f'{extra}, {statistic} {value:.1f}' for extra, value in zip(extras, averages[statistic].tolist())]
+        rows = zip(averages['mean'].tolist(), averages['count'].tolist(), extras, averages['station.name'].tolist())
+        lines = [f'Average of {samples} PM2.5 readings over {description}:']
+        lines += [f'Average AQI: {aqi} ({count} {weighting}s{extra}), Station {index}: {station}' for index, (aqi, count, extra, station) in enumerate(rows, start=1)]
+        print('\n'.join(lines))
     else:
         print(f'All {samples} samples had no data for given latitude and longitude arguments at this current time. Calculating average could not be performed.')
 
+def print_rolling(aggregator, minute):
+    # Print each station's mean AQI over every rolling window ending at this minute, sorted on the shortest window in descending order
+    windows = '/'.join(str(window) for window in aggregator.windows)
+    if not len(aggregator):
+        print(f'No data for given latitude and longitude arguments in the last {aggregator.windows[-1]} minute(s) at minute {minute}.\n')
+        return
+
+    # Lines are built from whole columns and written at once, as in print_averages (a mean that is not a number is a window without readings)
+    frame = aggregator.to_frame()
+    columns = zip(*[frame[f'mean_{window}'].tolist() for window in aggregator.windows])
+    means = [' / '.join('-' if mean != mean else f'{mean:.1f}' for mean in row) for row in columns]
+    lines = [f'Rolling average AQI over the last {windows} minute(s) at minute {minute}:']
+    lines += [f'Average AQI: {mean}, Station {index}: {station}' for index, (mean, station) in enumerate(zip(means, frame['station.name'].tolist()), start=1)]
+    print('\n'.join(lines) + '\n')
+
+def run_daemon(lat1, lng1, lat2, lng2, rate, options=None, context=None, output=None):
+    # Sample until interrupted on one set of connections, keeping only the last few minutes of readings per station in ring buffers
+    # Rolling means over options.windows are rendered every options.emit_every minutes, and once more on the way out
+    if options is None:
+        options = Options()
+    if context is None:
+        context = Context()
+    aggregator = rolling.RollingAggregator(options.windows, registry=options.registry)
+    if output is None:
+        output = TextOutput()
+
+    def every_minute(minute):
+        if (minute + 1) % options.emit_every == 0:
+            output.rolling(aggregator, minute + 1)
+        aggregator.advance(minute + 1)
+
+    try:
+        run_sampling(lat1, lng1, lat2, lng2, None, rate, options, context._replace(aggregator=aggregator, every_minute=every_minute, sink=output.sink))
+    except KeyboardInterrupt:
+        output.rolling(aggregator, aggregator.minute)
+
+    return aggregator
+
+@contextlib.contextmanager
+def instrumented(metrics_file=None, metrics_port=None):
+    # Export per-stage timings and counters while sampling if asked to, and print a summary of them at exit
+    try:
+        with metrics.exporting(metrics.registry, metrics_file, metrics_port):
+            yield
+    finally:
+        log('\n' + metrics.registry.summary())
+
+@contextlib.contextmanager
+def registered(registry=None):
+    # The station registry of a run, written back to its file at the end of the run (even one that was interrupted) if it has one
+    if registry is None:
+        registry = station_registry.StationRegistry()
+    try:
+        yield registry
+    finally:
+        if registry.path is not None:
+            registry.save()
+
+def recording(path=None):
+    # Log the raw responses of every sample to path for replaying later, or do nothing without a path
+    if path is None:
+        return contextlib.nullcontext()
+    return response_log.ResponseLog(path)
+
+@contextlib.contextmanager
+def gridded(lat1, lng1, lat2, lng2, cell_size=None, path=None):
+    # Keep a heatmap of mean AQI per cell over the area when asked to, writing the heatmap of every sample to path as JSON lines
+    # The first line describes the grid, and the last holds the mean and number of readings of every cell over the whole period
+    if cell_size is None:
+        yield None
+        return
+
+    grid = grids.GridAggregator((lat1, lng1, lat2, lng2), cell_size)
+    if path is None:
+        yield grid
+        return
+
+    with open(path, 'w') as f:
+        f.write(json.dumps({'bounds': grid.bounds, 'cell_size': cell_size, 'rows': grid.rows, 'columns': grid.columns}) + '\n')
+        grid.on_sample = lambda number, heatmap: f.write(json.dumps({'sample': number, 'mean': grids.to_lists(heatmap)}) + '\n')
+        yield grid
+        f.write(json.dumps({'sample': None, 'mean': grids.to_lists(grid.means()), 'count': grid.counts.reshape(grid.shape).tolist()}) + '\n')
+
+def print_grid(grid, description):
+    # Print the mean AQI of every cell over the period, north to south and west to east, with '-' for cells without stations
+    south, west, north, east = grid.bounds
+    print(f'\nAverage AQI per {grid.cell_size:g} degree cell over {description}, rows from latitude {north} down to {south} and columns from longitude {west} to {east}:')
+    lines = [' '.join('     -' if pd.isna(value) else f'{value:6.1f}' for value in row) for row in grid.means()[::-1]]
+    print('\n'.join(lines))
+
+class TextOutput:
+
+    # Samples are printed by process_response itself, and only when somebody is watching
+    sink = None
+
+    def averages(self, aggregator, samples, description, weighting='sample', statistics=(), region=None):
+        if region is not None:
+            print(f'\nRegion: {region}')
+        print_averages(aggregator, samples, description, weighting, statistics)
+
+    def rolling(self, aggregator, minute):
+        print_rolling(aggregator, minute)
+
+    def grid(self, grid):
+        print_grid(grid, f'{grid.samples} sample(s)')
+
+class JSONLines:
+
+    def __init__(self, file=None):
+        # Render every sample and result as one JSON object per line, for other programs to read from stdout
+        # Stations are written column by column, like the arrays they are parsed into
+        self.file = file if file is not None else sys.stdout
+        self.samples = 0
+
+    def write(self, record):
+        self.file.write(json.dumps(record) + '\n')
+
+    def sink(self, parsed):
+        self.samples += 1
+        record = {'sample': self.samples, 'time': time.time()}
+        if len(parsed) == 1 and parsed[0][0] is None:
+            record['stations'] = columns(parsed[0][1])
+        else:
+            record['regions'] = {name: columns(sample) for name, sample in parsed}
+        self.write(record)
+
+    def averages(self, aggregator, samples, description, weighting='sample', statistics=(), region=None):
+        # One line per station with every statistic kept, in the same order as the text output
+        frame = aggregator.to_frame().rename(columns={'station.name': 'station'})
+        if region is not None:
+            frame.insert(0, 'region', region)
+        if len(frame):
+            self.file.write(frame.to_json(orient='records', lines=True).rstrip('\n') + '\n')
+
+    def rolling(self, aggregator, minute):
+        frame = aggregator.to_frame().rename(columns={'station.name': 'station'})
+        frame.insert(0, 'minute', minute)
+        if len(frame):
+            self.file.write(frame.to_json(orient='records', lines=True).rstrip('\n') + '\n')
+
+    def grid(self, grid):
+        self.write({'bounds': grid.bounds, 'cell_size': grid.cell_size, 'samples': grid.samples, 'mean': grids.to_lists(grid.means())})
+
+def columns(sample):
+    # A parsed sample as JSON columns, with null for stations without coordinates
+    return {
+        'uid': sample.uid.tolist(),
+        'name': sample.name.tolist(),
+        'aqi': sample.aqi.tolist(),
+        'lat': [None if lat != lat else lat for lat in sample.lat.tolist()],
+        'lon': [None if lng != lng else lng for lng in sample.lng.tolist()]
+    }
+
+@contextlib.contextmanager
+def rendering(output='text'):
+    # Results go to stdout as text or JSON lines, while progress and diagnostics go to stdout for text, stderr for JSON lines, and nowhere when quiet
+    if output == 'json':
+        with logging_to(sys.stderr):
+            yield JSONLines()
+    elif output == 'quiet':
+        with open(os.devnull, 'w') as devnull, logging_to(devnull):
+            yield TextOutput()
+    else:
+        yield TextOutput()
+
+def make_tiler(boxes, tile_size=None, tile_max_stations=None):
+    # Large areas are only split into tiles when asked to, otherwise each box is fetched with one API call
+    if tile_size is None and tile_max_stations is None:
+        return None
+    return tiling.Tiler(boxes, tile_size, tile_max_stations)
+
+def main(lat1, lng1, lat2, lng2, period, rate, options=None, **changes):
+    # Render the results of a run as text or JSON lines, and return the aggregator holding them
+    # Any of the Options of the run can also be given by name, as in main(..., output='quiet')
+    options = (options if options is not None else Options())._replace(**changes)
+    with rendering(options.output) as renderer:
+        return run(lat1, lng1, lat2, lng2, period, rate, options, renderer)
+
+def run(lat1, lng1, lat2, lng2, period, rate, options, output):
+    # Percentiles are estimated from a quantile sketch per station, which is only kept when one is asked for
+    # The station registry is saved at the end of the run when it was loaded from a file
+    percentiles = evaluated_statistics.percentiles(options.statistics)
+    if options.replay_path is not None:
+        log(f'Reprocessing the samples recorded in {options.replay_path}.\n')
+        with instrumented(options.metrics_file, options.metrics_port), registered(options.registry) as registry:
+            with metrics.registry.time('replay'):
+                aggregator = replay(options.replay_path, options.weighting, options.replay_workers, percentiles=percentiles, accuracy=options.accuracy, registry=registry)
+            output.averages(aggregator, aggregator.samples, f'the samples recorded in {options.replay_path}', options.weighting, options.statistics)
+        return aggregator
+
+    tiler = make_tiler([(lat1, lng1, lat2, lng2)], options.tile_size, options.tile_max_stations)
+    if options.daemon:
+        log(f'Sampling PM2.5 readings {rate} time(s) per minute until interrupted in stations between latitudes {lat1} and {lat2} and longitudes {lng1} and {lng2}, printing rolling averages every {options.emit_every} minute(s).\n')
+        with instrumented(options.metrics_file, options.metrics_port), recording(options.record) as recorder, registered(options.registry) as registry:
+            return run_daemon(lat1, lng1, lat2, lng2, rate, options._replace(registry=registry), Context(tiler=tiler, recorder=recorder), output)
+
+    samples = period*rate
+    if options.min_rate is None:
+        log(f'Calculating average of {period*rate} PM2.5 readings over {period} minute(s) in stations between latitudes {lat1} and {lat2} and longitudes {lng1} and {lng2}.\n')
+    else:
+        log(f'Calculating time-weighted average of {options.min_rate} to {rate} PM2.5 readings per minute over {period} minute(s) in stations between latitudes {lat1} and {lat2} and longitudes {lng1} and {lng2}.\n')
+
+    # A run with a store resumes after the minutes already committed to it, and its averages are computed by scanning the store
+    store = options.store
+    remaining = period
+    if store is not None and store.minutes:
+        remaining = max(0, period - store.minutes)
+        log(f'Resuming from minute {store.minutes} of {period} with {store.samples} sample(s) already in {store.path}.\n')
+
+    # The grid only covers the minutes sampled by this run, as the store does not keep where its stations are
+    with instrumented(options.metrics_file, options.metrics_port), recording(options.record) as recorder, gridded(lat1, lng1, lat2, lng2, options.grid_size, options.grid_file) as grid, registered(options.registry) as registry:
+        aggregator = stations.StationAggregator(percentiles=percentiles, accuracy=options.accuracy, registry=registry)
+        if remaining:
+            run_sampling(lat1, lng1, lat2, lng2, remaining, rate, options, Context(aggregator=aggregator, tiler=tiler, recorder=recorder, grid=grid, sink=output.sink))
+        # An adaptive run takes as many samples as the readings called for
+        if options.min_rate is not None:
+            samples = aggregator.samples
+        if store is not None:
+            with metrics.registry.time('scan'):
+                aggregator = store.aggregate(stations.StationAggregator(percentiles=percentiles, accuracy=options.accuracy, registry=registry))
+        output.averages(aggregator, samples, f'{period} minute(s) in stations between latitudes {lat1} and {lat2} and longitudes {lng1} and {lng2}', options.weighting, options.statistics)
+        if grid is not None:
+            output.grid(grid)
+
+    return aggregator
+
+def add_sampling_arguments(parser):
+    # Optional flags shared by every command line entry point
+    parser.add_argument('--api-key', nargs='+', help=f'API key(s) to use, instead of the {API_KEY_VARIABLE} environment variable or the config file. Requests are spread over every key given')
+    parser.add_argument('--key-strategy', default='round-robin', choices=keyring.STRATEGIES, help='Take the API keys in turn, or the key that has made the fewest requests')
+    parser.add_argument('--key-quarantine', default=keyring.DEFAULT_QUARANTINE, type=floats.positive_float, help='Seconds to set aside a key that is over quota, doubled every time in a row, while the other keys carry on')
+    parser.add_argument('--config', help=f'Config file holding the API key (default: the {CONFIG_VARIABLE} environment variable, or {CONFIG_PATH})')
+    parser.add_argument('--connect-timeout', default=http.DEFAULT_CONNECT_TIMEOUT, type=floats.positive_float, help='Seconds to wait for a connection to the API')
+    parser.add_argument('--read-timeout', default=http.DEFAULT_READ_TIMEOUT, type=floats.positive_float, help='Seconds to wait for the API to respond before skipping the sample')
+    parser.add_argument('--engine', default='threads', choices=['threads', 'asyncio'], help='Run samples on a thread pool or on one asyncio event loop (allows a much higher rate)')
+    parser.add_argument('--tile-size', type=floats.positive_float, help='Split the area into tiles of at most this many degrees, fetched concurrently in each sample')
+    parser.add_argument('--tile-max-stations', type=integers.positive_int, help='Quarter any tile that returned at least this many stations, for the samples after it')
+    parser.add_argument('--weighting', default='sample', choices=['sample', 'reading'], help='Count a station once per sample, or only once per updated reading (station.time)')
+    parser.add_argument('--budget', type=integers.positive_int, help='Most API calls to make per minute, across every sample and tile')
+    parser.add_argument('--metrics-file', help='Write per-stage timings and counters to this file in Prometheus text format, every 15 seconds and at exit')
+    parser.add_argument('--metrics-port', type=integers.positive_int, help='Serve per-stage timings and counters in Prometheus text format at http://127.0.0.1:PORT/metrics while sampling')
+    parser.add_argument('--parse-workers', type=integers.positive_int, help='Parse responses and aggregate them per station on this many processes, which pays off for many stations or regions')
+    parser.add_argument('--statistics', nargs='+', default=[], type=evaluated_statistics.statistic, help='Statistics to print next to each mean: std, min, max, or percentiles such as p50 and p95 (estimated from a sketch per station)')
+    parser.add_argument('--sketch-accuracy', default=sketches.DEFAULT_ACCURACY, type=floats.fraction, help='Relative accuracy of estimated percentiles, e.g. 0.01 for within 1%%')
+    parser.add_argument('--record', help='Append the raw API responses of every sample to this gzip-compressed JSON lines file, to be replayed with --replay')
+    parser.add_argument('--output', default='text', choices=['text', 'json', 'quiet'], help='Print results as text, or as JSON lines (every sample, then the averages) with progress on stderr, or only the averages')
+    parser.add_argument('--quota-deadline', default=limits.DEFAULT_QUOTA_DEADLINE, type=floats.positive_float, help='Seconds to keep backing off and retrying while the request quota is over limits, before giving up')
+    parser.add_argument('--hedge-budget', type=floats.fraction, help='Send a duplicate of any API call slower than --hedge-percentile of recent calls and use whichever answers first, for at most this fraction of extra calls (e.g. 0.05). Also gives every sample a deadline')
+    parser.add_argument('--hedge-percentile', default=hedging.DEFAULT_PERCENTILE, type=floats.fraction, help='Percentile of recent API call latencies after which a call is hedged')
+    parser.add_argument('--min-rate', type=integers.positive_int, help='Adapt the rate to how much readings change, between this many and rate samples per minute (using divisors of rate), and time-weight the averages')
+    parser.add_argument('--deadline-slots', type=integers.positive_int, help='Record a sample as missed if it has no response within this many sampling slots of its start, instead of waiting for the read timeout')
+    parser.add_argument('--cache', help='SQLite file of API responses shared with other runs on this host, so that only one of them calls the API for the same bounds in each --cache-ttl window')
+    parser.add_argument('--cache-ttl', type=floats.positive_float, help='Seconds a cached response is shared for (default: one sampling slot, 60/rate)')
+    parser.add_argument('--cache-size', default=response_cache.DEFAULT_SIZE, type=integers.positive_int, help='Most megabytes of compressed responses to keep in the cache, evicting the oldest beyond that')
+    parser.add_argument('--station-registry', help='JSON file of every station seen (uid, name, location and last update), loaded at the start of the run and saved at the end, so stations are only interned once across runs')
+    parser.add_argument('--simulate', nargs='?', const='', metavar='RESPONSES', help='Run on a virtual clock without calling the API, answering from synthetic stations or from the responses recorded in this file with --record. A period of hours takes seconds')
+    parser.add_argument('--simulate-stations', default=1000, type=integers.positive_int, help='Number of synthetic stations spread over the globe in a simulated run')
+
+def parsed_options(parser, args):
+    # The Options of a run as given on the command line, opening the store, cache, station registry and simulated client its flags name
+    # Entry points without some of the flags, such as batch.py without --daemon, leave those options at their defaults
+    values = {}
+    for field in Options._fields:
+        flag = OPTION_FLAGS.get(field, field)
+        if field not in ('store', 'simulation', 'cache', 'registry') and hasattr(args, flag):
+            values[field] = getattr(args, flag)
+    return Options(**values, store=open_store(parser, args), simulation=resolve_simulation(parser, args), cache=open_cache(parser, args), registry=open_registry(parser, args))
+
+def open_store(parser, args):
+    # The on-disk store of the area and rate sampled, or None without --store
+    if getattr(args, 'store', None) is None:
+        return None
+    try:
+        return records.SampleStore(args.store, (args.lat1, args.lng1, args.lat2, args.lng2), args.rate)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+
+def open_cache(parser, args):
+    # The response cache shared with other runs, or None to always call the API
+    if args.cache is None:
+        return None
+    try:
+        return response_cache.ResponseCache(args.cache, args.cache_ttl or MINUTE/args.rate, args.cache_size)
+    except (OSError, sqlite3.Error) as e:
+        parser.error(f'argument --cache: {e}')
+
+def open_registry(parser, args):
+    # The station registry kept in a file across runs, or None for one that only lasts the run
+    if args.station_registry is None:
+        return None
+    try:
+        return station_registry.StationRegistry(args.station_registry)
+    except (OSError, ValueError) as e:
+        parser.error(f'argument --station-registry: {e}')
+
+def resolve_simulation(parser, args):
+    # The simulated client answering every call of a simulated run, or None to call the API
+    if args.simulate is None:
+        return None
+    if args.simulate and not os.path.exists(args.simulate):
+        parser.error(f'argument --simulate: no such file {args.simulate}')
+    return simulated.from_path(args.simulate or None, args.simulate_stations)
+
+def resolve_api_key(parser, args):
+    # Resolve the API key up front, so that a missing or malformed config is reported before any sampling starts
+    global API_KEY
+    try:
+        API_KEY = ','.join(args.api_key) if args.api_key else load_api_key(args.config)
+    except (OSError, ConfigError) as e:
+        parser.error(f'could not read the API key: {e}')
+
+def check_rate(parser, args):
+    # The ceiling on rate depends on the engine, as threads cost far more per in-flight request than coroutines
+    try:
+        if args.engine == 'asyncio' or args.simulate is not None:
+            integers.async_positive_int(args.rate)
+        else:
+            integers.reasonable_positive_int(args.rate)
+    except ArgumentTypeError as e:
+        parser.error(f'argument rate: {e}')
+    if args.min_rate is not None:
+        try:
+            adaptive.check_rates(args.min_rate, args.rate)
+        except ValueError as e:
+            parser.error(f'argument --min-rate: {e}')
+
 if __name__ == '__main__':
 
     # Handle command line input arguments from user
@@ -150,7 +1012,29 @@ if __name__ == '__main__':
     parser.add_argument('lat2', type=float, help='Latitude bound 2')
     parser.add_argument('lng2', type=float, help='Longitude bound 2')
     parser.add_argument('period', nargs='?', default=5, type=integers.positive_int, help='Sampling period in minutes')
-    parser.add_argument('rate', nargs='?', default=1, type=integers.reasonable_positive_int, help='Sampling rate in samples per minute')
+    parser.add_argument('rate', nargs='?', default=1, type=integers.positive_int, help='Sampling rate in samples per minute')
+    add_sampling_arguments(parser)
+    parser.add_argument('--daemon', action='store_true', help='Sample until interrupted, ignoring period, and print rolling averages instead of one average at the end')
+    parser.add_argument('--emit-every', default=5, type=integers.positive_int, help='Minutes between rolling averages in daemon mode')
+    parser.add_argument('--windows', nargs='+', default=list(rolling.DEFAULT_WINDOWS), type=integers.positive_int, help='Lengths in minutes of the rolling windows averaged over in daemon mode')
+    parser.add_argument('--replay', help='Reprocess the responses recorded in this file with --record as fast as possible, instead of sampling the API')
+    parser.add_argument('--replay-workers', type=integers.positive_int, help='Parse and aggregate replayed responses on this many processes')
+    parser.add_argument('--store', help='Directory to append every sample to, and to resume from if it already holds samples of the same area and rate')
+    parser.add_argument('--grid-size', type=floats.positive_float, help='Also average AQI over a grid of cells of this many degrees, printed as a heatmap at the end')
+    parser.add_argument('--grid-file', help='Write the heatmap of every sample, and of the whole period, to this JSON lines file (needs --grid-size)')
     args = parser.parse_args()
+    check_rate(parser, args)
+    if args.grid_file is not None and args.grid_size is None:
+        parser.error('argument --grid-file: needs --grid-size')
+    if args.grid_size is not None and (args.daemon or args.replay is not None):
+        parser.error('argument --grid-size: not allowed with --daemon or --replay')
+    if args.simulate is not None and (args.daemon or args.replay is not None):
+        parser.error('argument --simulate: not allowed with --daemon or --replay')
+    if args.min_rate is not None and (args.daemon or args.store is not None or args.replay is not None):
+        parser.error('argument --min-rate: not allowed with --daemon, --store or --replay')
+    if args.cache is not None and args.simulate is not None:
+        parser.error('argument --cache: not allowed with --simulate')
+    if args.replay is None and args.simulate is None:
+        resolve_api_key(parser, args)
 
-    main(args.lat1, args.lng1, args.lat2, args.lng2, args.period, args.rate)
\ No newline at end of file
+    main(args.lat1, args.lng1, args.lat2, args.lng2, args.period, args.rate, parsed_options(parser, args))
\ No newline at end of file
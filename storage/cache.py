@@ -0,0 +1,207 @@
+import asyncio
+import contextlib
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from instrumentation import metrics
+from loaders import lazy
+from parsers import payloads
+
+tiles = lazy.load('regions.tiles')
+
+# Seconds a process may hold a request in flight before the others stop waiting for it and fetch it themselves
+DEFAULT_LEASE = 30
+
+# Most megabytes of compressed responses kept, after which the oldest are evicted
+DEFAULT_SIZE = 64
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS responses (bounds TEXT, bucket REAL, expires REAL, created REAL, size INTEGER, payload BLOB, PRIMARY KEY (bounds, bucket));
+CREATE TABLE IF NOT EXISTS flights (bounds TEXT, bucket REAL, started REAL, PRIMARY KEY (bounds, bucket));
+CREATE INDEX IF NOT EXISTS responses_created ON responses (created);
+'''
+
+class Flight:
+
+    def __init__(self, bounds, bucket, response=None):
+        # Either a cached response, or the right (and duty) to fetch one and store it for everyone else
+        self.bounds = bounds
+        self.bucket = bucket
+        self.response = response
+        self.owned = response is None
+
+    def store(self, response):
+        # Only good responses are shared, so an error such as "Over quota" is fetched again by whoever asks next
+        if response.get('status') == 'ok':
+            self.response = response
+
+class ResponseCache:
+
+    def __init__(self, path, ttl, size=DEFAULT_SIZE, lease=DEFAULT_LEASE, poll=0.02, clock=time.time):
+        # Responses shared by every process on the host through one SQLite file, keyed by the bounds of the call and a bucket of ttl seconds
+        # Processes sampling the same bounds with the same ttl within a bucket make one API call between them: the first to ask fetches it,
+        # while the others wait for it (polling every poll seconds) and read it from the file
+        # Expired buckets are evicted as responses are stored, as are the oldest responses once the file holds more than size megabytes of them
+        self.path = path
+        self.ttl = ttl
+        self.size = size*1024*1024
+        self.lease = lease
+        self.poll = poll
+        self.clock = clock
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.connections = []
+        self.hits = 0
+        self.misses = 0
+        self.connection().executescript(SCHEMA)
+
+    def connection(self):
+        # Each thread uses a connection of its own (they are only closed from another thread), in WAL mode so that readers never block the writer
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=self.lease, isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self.local.connection = connection
+            with self.lock:
+                self.connections.append(connection)
+        return connection
+
+    def key(self, bounds):
+        south, west, north, east = tiles.normalize(*bounds)
+        return f'{south:.6f},{west:.6f},{north:.6f},{east:.6f}'
+
+    def claim(self, bounds):
+        # Return a Flight holding the cached response or owned by this caller, or None while another caller has the request in flight
+        key = self.key(bounds)
+        now = self.clock()
+        bucket = now//self.ttl*self.ttl
+        connection = self.connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute('SELECT payload FROM responses WHERE bounds = ? AND bucket = ?', (key, bucket)).fetchone()
+            if row is not None:
+                return Flight(key, bucket, json.loads(zlib.decompress(row[0])))
+            row = connection.execute('SELECT started FROM flights WHERE bounds = ? AND bucket = ?', (key, bucket)).fetchone()
+            if row is not None and now - row[0] < self.lease:
+                return None
+            connection.execute('INSERT OR REPLACE INTO flights VALUES (?, ?, ?)', (key, bucket, now))
+            return Flight(key, bucket)
+        finally:
+            connection.execute('COMMIT')
+
+    def release(self, flight):
+        # Store the owner's response, if it got a good one, and let the callers waiting on it go
+        connection = self.connection()
+        now = self.clock()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            if flight.response is not None:
+                payload = zlib.compress(payloads.encode(flight.response))
+                connection.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)', (flight.bounds, flight.bucket, flight.bucket + self.ttl, now, len(payload), payload))
+            connection.execute('DELETE FROM flights WHERE bounds = ? AND bucket = ?', (flight.bounds, flight.bucket))
+            self.evict(connection, now)
+        finally:
+            connection.execute('COMMIT')
+
+    def evict(self, connection, now):
+        connection.execute('DELETE FROM responses WHERE expires <= ?', (now,))
+        connection.execute('DELETE FROM flights WHERE started <= ?', (now - self.lease,))
+        total = connection.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        if total <= self.size:
+            return
+        evicted = []
+        for rowid, size in connection.execute('SELECT rowid, size FROM responses ORDER BY created'):
+            if total <= self.size:
+                break
+            evicted.append((rowid,))
+            total -= size
+        connection.executemany('DELETE FROM responses WHERE rowid = ?', evicted)
+
+    def count(self, flight):
+        with self.lock:
+            if flight.owned:
+                self.misses += 1
+            else:
+                self.hits += 1
+        metrics.registry.count('cache_misses' if flight.owned else 'cache_hits')
+        return flight
+
+    def pause(self, give_up_at, clock):
+        # Seconds to wait before asking again, or None once the sample's slot has ended
+        if give_up_at is None:
+            return self.poll
+        remaining = give_up_at - clock()
+        return min(self.poll, remaining) if remaining > 0 else None
+
+    def abandoned(self, bounds):
+        # A flight given up on while another caller still had the request in flight, with no response for the caller to use
+        flight = Flight(self.key(bounds), None)
+        flight.owned = False
+        return flight
+
+    @contextlib.contextmanager
+    def flight(self, bounds, event=None, give_up_at=None, clock=time.monotonic):
+        # Wait until the response for the bounds is cached or this caller may fetch it, and release the flight once the block ends
+        # Whoever owns the flight calls store() with the response it got, for everyone else waiting on it to read
+        # Waiting stops as soon as the event to kill all threads is set or give_up_at (on clock) passes, with a flight holding no response
+        while True:
+            flight = self.claim(bounds)
+            if flight is not None:
+                flight = self.count(flight)
+                break
+            wait = self.pause(give_up_at, clock)
+            if wait is not None and event is None:
+                time.sleep(wait)
+                continue
+            if wait is None or event.wait(wait):
+                flight = self.abandoned(bounds)
+                break
+        try:
+            yield flight
+        finally:
+            if flight.owned:
+                self.release(flight)
+
+    @contextlib.asynccontextmanager
+    async def flight_async(self, bounds, cancel=None, give_up_at=None, clock=time.monotonic):
+        # As flight, without blocking the event loop while another caller has the request in flight, and stopping once the run is cancelled
+        while True:
+            flight = self.claim(bounds)
+            if flight is not None:
+                flight = self.count(flight)
+                break
+            wait = self.pause(give_up_at, clock)
+            if wait is not None and cancel is None:
+                await asyncio.sleep(wait)
+                continue
+            if wait is not None:
+                try:
+                    await asyncio.wait_for(cancel.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    continue
+            flight = self.abandoned(bounds)
+            break
+        try:
+            yield flight
+        finally:
+            if flight.owned:
+                self.release(flight)
+
+    def close(self):
+        with self.lock:
+            for connection in self.connections:
+                connection.close()
+            self.connections.clear()
+
+    def summary(self):
+        with self.lock:
+            return f'Response cache {self.path}: {self.hits} hit(s) and {self.misses} miss(es)'
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,129 @@
+import json
+import os
+import time
+import numpy as np
+from aggregators import stations
+
+# One record per station reading, packed so the records file can be memory-mapped by anything that reads NumPy dtypes
+RECORD = np.dtype([('time', '<f8'), ('uid', '<i8'), ('sample', '<u4'), ('station', '<u4'), ('aqi', '<f4')])
+
+# Records are scanned this many at a time when aggregating, so memory stays bounded however large the store grows
+CHUNK = 1 << 20
+
+class SampleStore:
+
+    def __init__(self, path, bounds, rate):
+        # A directory holding an append-only file of packed records, the station names they refer to (one JSON line each),
+        # and meta.json, which commits how many samples, minutes and records belong to finished minutes
+        # Anything written after the last commit (a minute cut short by a crash) is truncated away, so a resumed run redoes that minute
+        self.path = path
+        self.bounds = [float(bound) for bound in bounds]
+        self.rate = rate
+        os.makedirs(path, exist_ok=True)
+
+        self.meta_path = os.path.join(path, 'meta.json')
+        self.records_path = os.path.join(path, 'records.bin')
+        self.stations_path = os.path.join(path, 'stations.jsonl')
+
+        meta = {'bounds': self.bounds, 'rate': rate, 'minutes': 0, 'samples': 0, 'records': 0, 'stations': 0}
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path) as f:
+                meta = json.load(f)
+            if meta['bounds'] != self.bounds or meta['rate'] != rate:
+                raise ValueError(f'{path} holds samples of latitudes {meta["bounds"][0]} to {meta["bounds"][2]} and longitudes {meta["bounds"][1]} to {meta["bounds"][3]} at a rate of {meta["rate"]}, and cannot be resumed with other arguments')
+
+        self.minutes = meta['minutes']
+        self.samples = meta['samples']
+        self.records = meta['records']
+        self.names, self.uids = self._load_stations(meta['stations'])
+        self.index = {uid: index for index, uid in enumerate(self.uids)}
+
+        with open(self.records_path, 'ab') as f:
+            f.truncate(self.records*RECORD.itemsize)
+        self.records_file = open(self.records_path, 'ab')
+        self.stations_file = open(self.stations_path, 'a')
+
+    def _load_stations(self, count):
+        names, uids = [], []
+        if os.path.exists(self.stations_path):
+            with open(self.stations_path) as f:
+                for line in f:
+                    if len(names) == count:
+                        break
+                    uid, name = json.loads(line)
+                    uids.append(uid)
+                    names.append(name)
+        with open(self.stations_path, 'a') as f:
+            f.truncate(sum(len(json.dumps([uid, name]).encode()) + 1 for uid, name in zip(uids, names)))
+        return names, uids
+
+    def append(self, sample, timestamp=None):
+        # Append one parsed sample (see parsers/columnar.py). New stations are written before the records that refer to them
+        # Stations are told apart by uid, so two stations with the same name get their own entries
+        if timestamp is None:
+            timestamp = time.time()
+
+        indices = np.empty(len(sample.aqi), dtype=np.uint32)
+        for position, (uid, name) in enumerate(zip(sample.uid.tolist(), sample.name)):
+            index = self.index.get(uid)
+            if index is None:
+                index = self.index[uid] = len(self.names)
+                self.names.append(name)
+                self.uids.append(int(uid))
+                self.stations_file.write(json.dumps([int(uid), name]) + '\n')
+            indices[position] = index
+
+        records = np.empty(len(sample.aqi), dtype=RECORD)
+        records['time'] = timestamp
+        records['uid'] = sample.uid
+        records['sample'] = self.samples
+        records['station'] = indices
+        records['aqi'] = sample.aqi
+
+        self.stations_file.flush()
+        self.records_file.write(records.tobytes())
+        self.samples += 1
+        self.records += len(records)
+
+    def complete_minute(self):
+        # Make everything appended so far durable, then commit it by atomically replacing meta.json
+        self.stations_file.flush()
+        os.fsync(self.stations_file.fileno())
+        self.records_file.flush()
+        os.fsync(self.records_file.fileno())
+
+        self.minutes += 1
+        meta = {'bounds': self.bounds, 'rate': self.rate, 'minutes': self.minutes, 'samples': self.samples, 'records': self.records, 'stations': len(self.names)}
+        with open(f'{self.meta_path}.tmp', 'w') as f:
+            json.dump(meta, f)
+        os.replace(f'{self.meta_path}.tmp', self.meta_path)
+
+    def read(self):
+        # Memory-map every record appended so far, read-only, for scanning without loading the store into memory
+        if not self.records:
+            return np.empty(0, dtype=RECORD)
+        self.records_file.flush()
+        return np.memmap(self.records_path, dtype=RECORD, mode='r', shape=(self.records,))
+
+    def aggregate(self, aggregator=None):
+        # Compute per-station statistics by scanning the records in chunks, rather than keeping samples in memory
+        if aggregator is None:
+            aggregator = stations.StationAggregator()
+        # Stations are interned into the aggregator's registry once, and every chunk of records only carries their ids
+        ids = aggregator.registry.intern(np.array(self.uids, dtype=np.int64), np.array(self.names, dtype=object))
+        records = self.read()
+        for start in range(0, len(records), CHUNK):
+            chunk = records[start:start + CHUNK]
+            aggregator.update(ids[chunk['station']], chunk['aqi'])
+        aggregator.samples += self.samples
+        return aggregator
+
+    def close(self):
+        self.records_file.close()
+        self.stations_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,128 @@
+import json
+import os
+import numpy as np
+
+def objects(values):
+    # A one-dimensional object array, whatever the values look like to numpy
+    array = np.empty(len(values), dtype=object)
+    array[:] = list(values)
+    return array
+
+class StationRegistry:
+
+    def __init__(self, path=None):
+        # Every station seen, interned once by uid into a row id, with its name, location and last station.time held in arrays
+        # Aggregators are indexed by these ids, so samples only carry integer ids and AQI, and names are only looked up when rendering
+        # With a path, stations seen by earlier runs are loaded from it and save() writes the registry back, so ids stay the same across runs
+        self.path = path
+        self.uid = np.empty(0, dtype=np.int64)
+        self.names = np.empty(0, dtype=object)
+        self.lat = np.empty(0)
+        self.lng = np.empty(0)
+        self.updated = np.empty(0, dtype=object)
+
+        # Stations known only by their name (such as rows of a DataFrame) are marked as named, have no uid, and are never saved
+        # (uids can be negative, so no uid value is set aside to mark them)
+        self.named = np.empty(0, dtype=bool)
+        self.by_name = {}
+
+        # Ids of the stations with a uid, ordered by uid, searched for a whole sample at a time
+        self.sorted = np.empty(0, dtype=np.int64)
+        self.order = np.empty(0, dtype=np.intp)
+
+        if path is not None and os.path.exists(path):
+            self.load(path)
+
+    def __len__(self):
+        return len(self.uid)
+
+    def lookup(self, uid):
+        # Id of every uid, or -1 for uids not in the registry
+        uid = np.asarray(uid, dtype=np.int64)
+        if not len(self.sorted):
+            return np.full(len(uid), -1, dtype=np.intp)
+        positions = np.minimum(np.searchsorted(self.sorted, uid), len(self.sorted) - 1)
+        return np.where(self.sorted[positions] == uid, self.order[positions], -1)
+
+    def _append(self, uid, names, lat, lng, updated, named=False):
+        start = len(self.uid)
+        self.uid = np.concatenate([self.uid, np.asarray(uid, dtype=np.int64)])
+        self.names = np.concatenate([self.names, objects(names)])
+        self.lat = np.concatenate([self.lat, np.asarray(lat, dtype=float)])
+        self.lng = np.concatenate([self.lng, np.asarray(lng, dtype=float)])
+        self.updated = np.concatenate([self.updated, objects(updated)])
+        self.named = np.concatenate([self.named, np.full(len(uid), named)])
+        keyed = np.flatnonzero(~self.named)
+        self.order = keyed[np.argsort(self.uid[keyed], kind='stable')]
+        self.sorted = self.uid[self.order]
+        return np.arange(start, len(self.uid))
+
+    def intern(self, uid, names, lat=None, lng=None, updated=None):
+        # Ids of a sample's stations (see parsers/columnar.py), adding the stations seen for the first time in one step
+        # Names and locations are kept from the first sighting, while the last update is refreshed from every sample
+        uid = np.asarray(uid, dtype=np.int64)
+        ids = self.lookup(uid)
+        new = np.flatnonzero(ids < 0)
+        if len(new):
+            # A station can appear twice in one sample (as where tiles overlap), and is still only added once
+            _, first = np.unique(uid[new], return_index=True)
+            positions = np.sort(new[first])
+            missing = np.full(len(positions), np.nan)
+            self._append(uid[positions], [names[position] for position in positions],
+                         missing if lat is None else np.asarray(lat, dtype=float)[positions],
+                         missing if lng is None else np.asarray(lng, dtype=float)[positions],
+                         [None]*len(positions) if updated is None else [updated[position] for position in positions])
+            ids = self.lookup(uid)
+        if updated is not None and len(ids):
+            updated = objects(updated)
+            known = np.not_equal(updated, None)
+            self.updated[ids[known]] = updated[known]
+        return ids
+
+    def intern_names(self, names):
+        # Ids of stations known only by name, for samples without uids
+        fresh = []
+        for name in names:
+            if name not in self.by_name:
+                self.by_name[name] = None
+                fresh.append(name)
+        if fresh:
+            missing = np.full(len(fresh), np.nan)
+            for name, index in zip(fresh, self._append(np.zeros(len(fresh)), fresh, missing, missing, [None]*len(fresh), named=True)):
+                self.by_name[name] = index
+        return np.fromiter((self.by_name[name] for name in names), dtype=np.intp, count=len(names))
+
+    def adopt(self, other, rows):
+        # Ids in this registry of the given rows of another one, such as that of a partial built on another process
+        rows = np.asarray(rows, dtype=np.intp)
+        ids = np.empty(len(rows), dtype=np.intp)
+        named = other.named[rows]
+        if named.any():
+            ids[named] = self.intern_names(other.names[rows[named]].tolist())
+        if not named.all():
+            known = rows[~named]
+            ids[~named] = self.intern(other.uid[known], other.names[known], other.lat[known], other.lng[known], other.updated[known])
+        return ids
+
+    def load(self, path):
+        with open(path) as f:
+            stations = json.load(f)
+        try:
+            self._append(stations['uid'], stations['name'], stations['lat'], stations['lng'], stations['updated'])
+        except (KeyError, TypeError) as e:
+            raise ValueError(f'{path} is not a station registry') from e
+
+    def save(self, path=None):
+        # Write every station with a uid, replacing the file in one step so that a crash never leaves half a registry behind
+        path = path if path is not None else self.path
+        keep = ~self.named
+        stations = {
+            'uid': self.uid[keep].tolist(),
+            'name': self.names[keep].tolist(),
+            'lat': [None if lat != lat else lat for lat in self.lat[keep].tolist()],
+            'lng': [None if lng != lng else lng for lng in self.lng[keep].tolist()],
+            'updated': self.updated[keep].tolist()
+        }
+        with open(f'{path}.tmp', 'w') as f:
+            json.dump(stations, f)
+        os.replace(f'{path}.tmp', path)
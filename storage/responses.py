@@ -0,0 +1,51 @@
+import gzip
+import json
+import threading
+import time
+import zlib
+from parsers import payloads
+
+class ResponseLog:
+
+    def __init__(self, path):
+        # Raw API responses of every sample, one JSON line each, appended to a gzip file that a later run can replay
+        # Appending to an existing log adds another gzip member, which readers see as one continuous stream
+        self.path = path
+        self.file = gzip.open(path, 'at', encoding='utf-8')
+        self.lock = threading.Lock()
+
+    def write(self, sample, responses, timestamp=None):
+        # Every tile's response of one sample, flushed so that a crash loses at most the sample being written
+        # Responses still undecoded (see parsers/payloads.py) are written as they were received
+        if timestamp is None:
+            timestamp = time.time()
+        bodies = b','.join(payloads.encode(response) for response in responses).decode()
+        line = f'{{"time":{json.dumps(timestamp)},"sample":{json.dumps(sample)},"responses":[{bodies}]}}'
+        with self.lock:
+            self.file.write(line + '\n')
+            self.file.flush()
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+def read_lines(path):
+    # Yield the raw JSON line of every complete record, stopping quietly at a tail cut short by a crash
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        try:
+            for line in f:
+                if line.endswith('\n'):
+                    yield line
+        except (EOFError, zlib.error, gzip.BadGzipFile):
+            return
+
+def read(path):
+    # Yield every complete record as a dict with 'time', 'sample' and 'responses'
+    for line in read_lines(path):
+        yield json.loads(line)
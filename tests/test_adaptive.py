@@ -0,0 +1,71 @@
+import unittest
+from schedulers import adaptive
+
+def response(readings, time='2024-01-01T10:00:00+00:00'):
+    return {'status': 'ok', 'data': [{'uid': uid, 'aqi': aqi, 'station': {'name': f'Station {uid}', 'time': time}} for uid, aqi in enumerate(readings)]}
+
+class TestAdaptive(unittest.TestCase):
+
+    def test_ladder(self):
+        self.assertEqual(adaptive.ladder(1, 12), [1, 2, 3, 4, 6, 12])
+        self.assertEqual(adaptive.ladder(5, 12), [6, 12])
+        self.assertEqual(adaptive.ladder(7, 7), [7])
+
+    def test_aqi(self):
+        self.assertEqual(adaptive.aqi('42'), 42.0)
+        self.assertEqual(adaptive.aqi(17), 17.0)
+        self.assertIsNone(adaptive.aqi('-'))
+        self.assertIsNone(adaptive.aqi(None))
+
+    def test_plan(self):
+        # Runs start at the lowest rate, on every (max_rate/rate)th slot of the highest rate's schedule
+        scheduler = adaptive.AdaptiveScheduler(2, 12, minute=60, start=0.0)
+        samples = scheduler.plan(0)
+        self.assertEqual(list(samples), [0, 6])
+        self.assertEqual(samples.step, 6)
+        self.assertEqual(scheduler.deadline(6), 30.0)
+        self.assertEqual(scheduler.slot_end(6), 60.0)
+        self.assertEqual(scheduler.slot_end(6, 2), 90.0)
+
+    def test_raise_and_lower(self):
+        scheduler = adaptive.AdaptiveScheduler(1, 8, minute=60, start=0.0)
+        self.assertEqual(len(scheduler.plan(0)), 1)
+
+        # Changing readings double the rate up to the highest, one minute at a time
+        for minute, expected in enumerate([2, 4, 8, 8], start=1):
+            scheduler.observe(response([10, 20, 30]))
+            scheduler.observe(response([10, 25, 30]))
+            self.assertEqual(len(scheduler.plan(minute)), expected)
+
+        # Readings that hold still halve it down to the lowest
+        for minute, expected in enumerate([4, 2, 1, 1], start=5):
+            scheduler.observe(response([10, 25, 30]))
+            scheduler.observe(response([10, 25, 30]))
+            self.assertEqual(len(scheduler.plan(minute)), expected)
+
+        # A minute without any station seen twice keeps the rate
+        self.assertEqual(len(scheduler.plan(9)), 1)
+        self.assertEqual(scheduler.minutes, {1: 4, 2: 2, 4: 2, 8: 2})
+        self.assertIn('between 1 and 8 per minute', scheduler.summary_rates())
+
+    def test_observe(self):
+        scheduler = adaptive.AdaptiveScheduler(1, 4, delta=5)
+        scheduler.observe(response(['10', '20', '-', '40']))
+        scheduler.observe({'status': 'error', 'data': 'Over quota'})
+        self.assertEqual(scheduler.checked, 0)
+
+        # Small moves in AQI are not changes, while a new station.time or a reading appearing are
+        scheduler.observe(response(['12', '20', '30', '40']))
+        self.assertEqual((scheduler.checked, scheduler.changed), (4, 1))
+        scheduler.observe(response(['12', '20', '30', '40'], '2024-01-01T11:00:00+00:00'))
+        self.assertEqual((scheduler.checked, scheduler.changed), (8, 5))
+
+    def test_bounds(self):
+        self.assertEqual(adaptive.check_rates(3, 12), [3, 4, 6, 12])
+        # Rates above the highest, that do not divide it or that leave nothing to adapt between are rejected rather than changed
+        for min_rate, max_rate in [(5, 4), (3, 8), (2, 7), (7, 7)]:
+            with self.assertRaises(ValueError):
+                adaptive.AdaptiveScheduler(min_rate, max_rate)
+
+if __name__ == '__main__':
+    unittest.main()
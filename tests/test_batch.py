@@ -0,0 +1,56 @@
+import unittest
+import os
+import tempfile
+from regions import batch
+
+class TestBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.regions = [
+            ('Vancouver', 49.1, -123.3, 49.4, -122.9),
+            ('North Shore', 49.3, -123.3, 49.5, -123.0),
+            ('Whistler', 50.0, -123.0, 50.2, -122.9)
+        ]
+        self.response = {
+            "status": "ok",
+            "data": [
+                {"lat": 49.3017, "lon": -123.0203, "uid": 4227, "aqi": "20", "station": {"name": "North Vancouver Second Narrows"}},
+                {"lat": 49.1864, "lon": -123.1522, "uid": 10133, "aqi": "35", "station": {"name": "Vancouver International Airport #2"}},
+                {"lat": 50.144285, "lon": -122.960402, "uid": 4245, "aqi": "13", "station": {"name": "Whistler Meadow Park"}},
+                {"lat": 49.70516, "lon": -123.15133, "uid": 8838, "aqi": "21", "station": {"name": "Squamish Elementary"}}
+            ]
+        }
+
+    def write(self, text):
+        f = tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False)
+        f.write(text)
+        f.close()
+        self.addCleanup(os.remove, f.name)
+        return f.name
+
+    def test_load_regions(self):
+        path = self.write('# name,lat1,lng1,lat2,lng2\nVancouver,49.1,-123.3,49.4,-122.9\n\nWhistler, 50.2,-122.9,50.0,-123.0\n')
+        self.assertEqual(batch.load_regions(path), [('Vancouver', 49.1, -123.3, 49.4, -122.9), ('Whistler', 50.2, -122.9, 50.0, -123.0)])
+
+        self.assertRaises(ValueError, batch.load_regions, self.write('Vancouver,49.1,-123.3,49.4\n'))
+        self.assertRaises(ValueError, batch.load_regions, self.write('Vancouver,49.1,-123.3,49.4,east\n'))
+        self.assertRaises(ValueError, batch.load_regions, self.write('A,0,0,1,1\nA,1,1,2,2\n'))
+        self.assertRaises(ValueError, batch.load_regions, self.write('# nothing\n'))
+
+    def test_RegionBatch(self):
+        regions = batch.RegionBatch(self.regions)
+
+        self.assertEqual(regions.bounds, (49.1, -123.3, 50.2, -122.9))
+        self.assertEqual(len(regions.tiler.tiles()), 3)
+        self.assertEqual(set(regions.aggregators), {'Vancouver', 'North Shore', 'Whistler'})
+
+        split = {name: [station['uid'] for station in response['data']] for name, response in regions.split(self.response)}
+        self.assertEqual(split['Vancouver'], [4227, 10133])
+        self.assertEqual(split['North Shore'], [4227])
+        self.assertEqual(split['Whistler'], [4245])
+
+        split = regions.split({'status': 'ok', 'data': []})
+        self.assertEqual([len(response['data']) for _, response in split], [0, 0, 0])
+
+if __name__ == '__main__':
+    unittest.main()
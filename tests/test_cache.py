@@ -0,0 +1,168 @@
+import unittest
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+import zlib
+from storage import cache
+
+class TestCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'responses.sqlite')
+        self.now = 100.0
+        self.response = {'status': 'ok', 'data': [{'uid': 1, 'aqi': '20', 'station': {'name': 'North Delta'}}]}
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def cache(self, ttl=10, **options):
+        return cache.ResponseCache(self.path, ttl, clock=lambda: self.now, **options)
+
+    def test_flight(self):
+        with self.cache() as first, self.cache() as second:
+            # The first caller owns the flight and fetches the response, which the other reads within the same bucket
+            with first.flight((50, -123, 49, -122)) as flight:
+                self.assertTrue(flight.owned)
+                self.assertIsNone(second.claim((49, -123, 50, -122)))
+                flight.store(self.response)
+
+            with second.flight((49, -123, 50, -122)) as flight:
+                self.assertFalse(flight.owned)
+                self.assertEqual(flight.response, self.response)
+
+            # Another bucket or other bounds are fetched again
+            self.now = 110.0
+            with second.flight((49, -123, 50, -122)) as flight:
+                self.assertTrue(flight.owned)
+            with second.flight((49, -123, 51, -122)) as flight:
+                self.assertTrue(flight.owned)
+
+            self.assertEqual((first.hits, first.misses), (0, 1))
+            self.assertEqual((second.hits, second.misses), (1, 2))
+            self.assertIn('1 hit(s) and 2 miss(es)', second.summary())
+
+    def test_flight_error(self):
+        # Errors are not shared, so the next caller fetches again once the owner is done
+        with self.cache() as responses:
+            with responses.flight((49, -123, 50, -122)) as flight:
+                flight.store({'status': 'error', 'data': 'Over quota'})
+            with responses.flight((49, -123, 50, -122)) as flight:
+                self.assertTrue(flight.owned)
+
+            # So is a flight whose owner failed
+            with self.assertRaises(ValueError):
+                with responses.flight((0, 0, 1, 1)):
+                    raise ValueError
+            with responses.flight((0, 0, 1, 1)) as flight:
+                self.assertTrue(flight.owned)
+
+    def test_lease(self):
+        # A caller that has held a flight for longer than the lease is assumed gone, and another takes it over
+        with self.cache(lease=5) as first, self.cache(lease=5) as second:
+            self.assertTrue(first.claim((0, 0, 1, 1)).owned)
+            self.assertIsNone(second.claim((0, 0, 1, 1)))
+            self.now += 6
+            self.assertTrue(second.claim((0, 0, 1, 1)).owned)
+
+    def test_evict(self):
+        with self.cache(ttl=10) as responses:
+            for lat in range(3):
+                with responses.flight((lat, 0, lat + 1, 1)) as flight:
+                    flight.store(self.response)
+            count = responses.connection().execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+            self.assertEqual(count, 3)
+
+            # Expired buckets are dropped as soon as anything else is stored
+            self.now = 110.0
+            with responses.flight((5, 0, 6, 1)) as flight:
+                flight.store(self.response)
+            count = responses.connection().execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+            self.assertEqual(count, 1)
+
+        # Beyond the size limit, the oldest responses are dropped
+        with self.cache(ttl=1000) as responses:
+            responses.size = len(zlib.compress(json.dumps(self.response, separators=(',', ':')).encode()))
+            for lat in range(3):
+                self.now += 1
+                with responses.flight((lat, 0, lat + 1, 1)) as flight:
+                    flight.store(self.response)
+            rows = responses.connection().execute('SELECT bounds FROM responses').fetchall()
+            self.assertEqual(rows, [('2.000000,0.000000,3.000000,1.000000',)])
+
+    def test_single_flight(self):
+        # Of many concurrent callers (each with a connection of its own, as separate processes would have), only one fetches
+        calls = []
+        results = []
+
+        def sample():
+            with cache.ResponseCache(self.path, 60, poll=0.005) as responses:
+                with responses.flight((49, -123, 50, -122)) as flight:
+                    if flight.owned:
+                        calls.append(1)
+                        time.sleep(0.1)
+                        flight.store(self.response)
+                    results.append(flight.response)
+
+        threads = [threading.Thread(target=sample) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [self.response]*8)
+
+    def test_flight_async(self):
+        with self.cache() as first:
+            async def main():
+                async def owner():
+                    async with first.flight_async((0, 0, 1, 1)) as flight:
+                        await asyncio.sleep(0.05)
+                        flight.store(self.response)
+                        return flight.owned
+
+                async def reader():
+                    await asyncio.sleep(0.01)
+                    async with first.flight_async((0, 0, 1, 1)) as flight:
+                        return flight.owned, flight.response
+
+                return await asyncio.gather(owner(), reader())
+
+            self.assertEqual(asyncio.run(main()), [True, (False, self.response)])
+
+    def test_flight_stopped(self):
+        # Waiting on another caller's flight ends as soon as the threads are killed or the sample's slot ends, with no response
+        with self.cache() as first, self.cache(lease=30) as second:
+            self.assertTrue(first.claim((0, 0, 1, 1)).owned)
+
+            event = threading.Event()
+            threading.Timer(0.05, event.set).start()
+            start = time.monotonic()
+            with second.flight((0, 0, 1, 1), event) as flight:
+                self.assertFalse(flight.owned)
+                self.assertIsNone(flight.response)
+            self.assertLess(time.monotonic() - start, 1)
+
+            with second.flight((0, 0, 1, 1), threading.Event(), time.monotonic() + 0.05) as flight:
+                self.assertFalse(flight.owned)
+                self.assertIsNone(flight.response)
+            self.assertLess(time.monotonic() - start, 1)
+            self.assertEqual((second.hits, second.misses), (0, 0))
+
+            async def main():
+                cancel = asyncio.Event()
+                asyncio.get_running_loop().call_later(0.05, cancel.set)
+                async with second.flight_async((0, 0, 1, 1), cancel) as flight:
+                    cancelled = flight.owned, flight.response
+                async with second.flight_async((0, 0, 1, 1), asyncio.Event(), time.monotonic() + 0.05) as flight:
+                    return [cancelled, (flight.owned, flight.response)]
+
+            self.assertEqual(asyncio.run(main()), [(False, None), (False, None)])
+            self.assertLess(time.monotonic() - start, 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import unittest
+import asyncio
+import threading
+import time
+from schedulers import clocks, deadlines
+
+class TestClocks(unittest.TestCase):
+
+    def test_VirtualClock(self):
+        clock = clocks.VirtualClock(start=5.0, epoch=1000.0)
+        self.assertEqual(clock.monotonic(), 5.0)
+        self.assertEqual(clock.time(), 1005.0)
+
+        clock.advance(2.5)
+        clock.advance(-1)
+        self.assertEqual(clock.monotonic(), 7.5)
+        self.assertEqual(clock.time(), 1007.5)
+
+    def test_run_order(self):
+        # Sleeps of hours take no real time, and wake in the order of their deadlines
+        clock = clocks.VirtualClock()
+        woken = []
+
+        async def sleeper(name, seconds):
+            await asyncio.sleep(seconds)
+            woken.append((name, clock.monotonic()))
+
+        async def main():
+            await asyncio.gather(sleeper('c', 3*3600), sleeper('a', 60), sleeper('b', 3600))
+            return 'done'
+
+        start = time.monotonic()
+        self.assertEqual(clocks.run(main(), clock), 'done')
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual(woken, [('a', 60), ('b', 3600), ('c', 3*3600)])
+
+    def test_run_cancelled(self):
+        # Cancelling a task wakes it straight away, without moving the clock on to its deadline
+        clock = clocks.VirtualClock()
+
+        async def main():
+            cancel = asyncio.Event()
+            task = asyncio.create_task(asyncio.wait_for(cancel.wait(), timeout=3600))
+            await asyncio.sleep(10)
+            cancel.set()
+            await task
+            return clock.monotonic()
+
+        self.assertEqual(clocks.run(main(), clock), 10)
+
+        # Tasks left running are cancelled once the coroutine returns
+        cancelled = []
+
+        async def forever():
+            try:
+                await asyncio.sleep(10**9)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        async def leave_running():
+            asyncio.create_task(forever())
+            await asyncio.sleep(1)
+
+        clocks.run(leave_running(), clock)
+        self.assertEqual(cancelled, [True])
+
+    def test_run_thread(self):
+        # A callback from another thread still wakes a loop with no timer pending
+        clock = clocks.VirtualClock()
+
+        async def main():
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            threading.Timer(0.05, loop.call_soon_threadsafe, [future.set_result, 'woken']).start()
+            return await future
+
+        self.assertEqual(clocks.run(main(), clock), 'woken')
+
+    def test_DeadlineScheduler(self):
+        # A scheduler on the virtual clock fires every sample on its deadline with no jitter
+        clock = clocks.VirtualClock()
+        scheduler = deadlines.DeadlineScheduler(60, minute=60, clock=clock.monotonic)
+
+        async def main():
+            cancel = asyncio.Event()
+            return [await scheduler.wait_async(sample, cancel) for sample in range(120)]
+
+        self.assertEqual(clocks.run(main(), clock), [0.0]*120)
+        self.assertEqual(clock.monotonic(), 119)
+        self.assertEqual(scheduler.summary(), (120, 0.0, 0.0))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import unittest
+import numpy as np
+from parsers import columnar
+
+class TestColumnar(unittest.TestCase):
+
+    def setUp(self):
+        self.response = {
+            "status": "ok",
+            "data": [
+                {"lat": 49.3017, "lon": -123.0203, "uid": 4227, "aqi": "20", "station": {"name": "North Vancouver Second Narrows"}},
+                {"lat": 49.725586, "lon": -123.142586, "uid": -344797, "aqi": "-", "station": {"name": "AQSU-VCH-Brennan Park Recreation Centre pool outside"}},
+                {"lat": 49.1864, "lon": -123.1522, "uid": 10133, "aqi": "35", "station": {"name": "Vancouver International Airport #2"}},
+                {"lat": 49.1583, "lon": -122.9017, "uid": 4226, "aqi": 20, "station": {"name": "North Delta"}}
+            ]
+        }
+
+    def test_parse(self):
+        sample = columnar.parse(self.response)
+
+        self.assertEqual(sample.uid.dtype, np.int64)
+        self.assertEqual(sample.aqi.dtype, np.float64)
+        self.assertEqual(list(sample.uid), [4227, 10133, 4226])
+        self.assertEqual(list(sample.aqi), [20.0, 35.0, 20.0])
+        self.assertEqual(list(sample.name), ['North Vancouver Second Narrows', 'Vancouver International Airport #2', 'North Delta'])
+        self.assertEqual(list(sample.lat), [49.3017, 49.1864, 49.1583])
+        self.assertEqual(list(sample.lng), [-123.0203, -123.1522, -122.9017])
+
+    def test_parse_empty(self):
+        for response in [{'status': 'ok', 'data': []}, {'status': 'error', 'data': 'Unknown error'}, {'status': 'ok', 'data': [self.response['data'][1]]}]:
+            sample = columnar.parse(response)
+            for column in sample:
+                self.assertEqual(len(column), 0)
+
+    def test_readings(self):
+        # Every station is kept, with NaN for a missing reading
+        readings = columnar.readings(self.response)
+        self.assertEqual(len(readings.uid), len(self.response['data']))
+        self.assertEqual(list(readings.uid), [station['uid'] for station in self.response['data']])
+        self.assertEqual(int(np.isnan(readings.aqi).sum()), 1)
+
+        updated = columnar.select(readings, ~np.isnan(readings.aqi))
+        self.assertEqual(list(updated.uid), [4227, 10133, 4226])
+        self.assertEqual(list(updated.lat), [49.3017, 49.1864, 49.1583])
+
+    def test_ranked(self):
+        sample = columnar.parse(self.response)
+        self.assertEqual([sample.name[position] for position in columnar.ranked(sample)], ['Vancouver International Airport #2', 'North Vancouver Second Narrows', 'North Delta'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+import asyncio
+import threading
+import time
+from schedulers import deadlines
+
+class TestDeadlines(unittest.TestCase):
+
+    def test_deadline(self):
+        scheduler = deadlines.DeadlineScheduler(4, minute=60, start=100.0)
+        self.assertEqual(scheduler.deadline(0), 100.0)
+        self.assertEqual(scheduler.deadline(1), 115.0)
+        self.assertEqual(scheduler.deadline(4), 160.0)
+        self.assertEqual(scheduler.deadline(9), 235.0)
+
+        scheduler = deadlines.DeadlineScheduler(7, minute=60, start=0.0)
+        self.assertAlmostEqual(scheduler.deadline(7*100), 6000.0)
+
+    def test_plan(self):
+        scheduler = deadlines.DeadlineScheduler(4, minute=60, start=100.0)
+        self.assertEqual(list(scheduler.plan(2)), [8, 9, 10, 11])
+        self.assertEqual(scheduler.plan(2).step, 1)
+        self.assertEqual(scheduler.slot_end(9), 250.0)
+        self.assertEqual(scheduler.slot_end(9, 2), 265.0)
+
+    def test_wait(self):
+        scheduler = deadlines.DeadlineScheduler(10, minute=0.5)
+        event = threading.Event()
+
+        for sample in range(3):
+            jitter = scheduler.wait(sample, event)
+            self.assertGreaterEqual(jitter, 0)
+            self.assertLess(jitter, 0.05)
+            self.assertGreaterEqual(time.monotonic(), scheduler.deadline(sample))
+
+        count, mean, maximum = scheduler.summary()
+        self.assertEqual(count, 3)
+        self.assertGreaterEqual(maximum, mean)
+
+    def test_wait_cancelled(self):
+        scheduler = deadlines.DeadlineScheduler(1, minute=60)
+        event = threading.Event()
+        threading.Timer(0.05, event.set).start()
+
+        start = time.monotonic()
+        self.assertIsNone(scheduler.wait(1, event))
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual(scheduler.summary()[0], 0)
+
+    def test_wait_async(self):
+        async def run():
+            scheduler = deadlines.DeadlineScheduler(10, minute=0.5)
+            cancel = asyncio.Event()
+
+            jitter = await scheduler.wait_async(1, cancel)
+            self.assertGreaterEqual(jitter, 0)
+
+            asyncio.get_running_loop().call_later(0.05, cancel.set)
+            start = time.monotonic()
+            self.assertIsNone(await scheduler.wait_async(600, cancel))
+            self.assertLess(time.monotonic() - start, 1)
+
+        asyncio.run(run())
+
+if __name__ == '__main__':
+    unittest.main()
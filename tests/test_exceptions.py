@@ -33,5 +33,11 @@ class TestExceptions(unittest.TestCase):
         with self.assertRaises(exceptions.APIInvalidKeyError):
             raise exceptions.APIInvalidKeyError
 
+    def test_APIDeadlineError(self):
+        self.assertEqual(str(exceptions.APIDeadlineError('test')), 'test')
+
+        with self.assertRaises(exceptions.APIDeadlineError):
+            raise exceptions.APIDeadlineError()
+
 if __name__ == 'main':
     unittest.main()
\ No newline at end of file
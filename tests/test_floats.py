@@ -0,0 +1,23 @@
+import unittest
+from evaluators import floats
+
+class TestFloats(unittest.TestCase):
+
+    def test_positive_float(self):
+        self.assertEqual(floats.positive_float(4.1), 4.1)
+        self.assertEqual(floats.positive_float(1), 1.0)
+        self.assertEqual(floats.positive_float('0.5'), 0.5)
+        self.assertRaises(ValueError, floats.positive_float, -3)
+        self.assertRaises(ValueError, floats.positive_float, 0)
+        self.assertRaises(ValueError, floats.positive_float, '-2.5')
+        self.assertRaises(ValueError, floats.positive_float, 'nan')
+        self.assertRaises(ValueError, floats.positive_float, 'abc')
+
+    def test_fraction(self):
+        self.assertEqual(floats.fraction('0.01'), 0.01)
+        self.assertRaises(ValueError, floats.fraction, 0)
+        self.assertRaises(ValueError, floats.fraction, 1)
+        self.assertRaises(ValueError, floats.fraction, 'abc')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+import numpy as np
+from aggregators import grids
+from parsers import columnar
+
+class TestGrids(unittest.TestCase):
+
+    def setUp(self):
+        self.responses = [
+            {'status': 'ok', 'data': [
+                {'lat': 49.05, 'lon': -123.45, 'uid': 1, 'aqi': '20', 'station': {'name': 'South West'}},
+                {'lat': 49.08, 'lon': -123.41, 'uid': 2, 'aqi': '30', 'station': {'name': 'South West Too'}},
+                {'lat': 49.2, 'lon': -123.0, 'uid': 3, 'aqi': '40', 'station': {'name': 'North East'}},
+                {'lat': 51.0, 'lon': -123.0, 'uid': 4, 'aqi': '99', 'station': {'name': 'Outside'}}
+            ]},
+            {'status': 'ok', 'data': [
+                {'lat': 49.05, 'lon': -123.45, 'uid': 1, 'aqi': '24', 'station': {'name': 'South West'}},
+                {'lat': 49.2, 'lon': -123.0, 'uid': 3, 'aqi': '-', 'station': {'name': 'North East'}}
+            ]}
+        ]
+
+    def test_locate(self):
+        grid = grids.GridAggregator((49.2, -123.0, 49.0, -123.5), 0.1)
+        self.assertEqual(grid.shape, (2, 5))
+        self.assertEqual(list(grid.locate([49.0, 49.15, 49.2, 48.9, np.nan], [-123.5, -123.25, -123.0, -123.2, -123.2])), [0, 7, 9, -1, -1])
+
+    def test_GridAggregator(self):
+        heatmaps = []
+        grid = grids.GridAggregator((49.0, -123.5, 49.2, -123.0), 0.1, capacity=1, on_sample=lambda number, heatmap: heatmaps.append(number))
+        first = grid.add_sample(columnar.parse(self.responses[0]))
+        second = grid.add_sample(columnar.parse(self.responses[1]))
+
+        self.assertEqual(heatmaps, [1, 2])
+        self.assertEqual(first[0, 0], 25.0)
+        self.assertEqual(first[1, 4], 40.0)
+        self.assertEqual(np.isnan(first).sum(), 8)
+        self.assertEqual(second[0, 0], 24.0)
+        self.assertTrue(np.isnan(second[1, 4]))
+
+        means = grid.means()
+        self.assertAlmostEqual(means[0, 0], 74/3)
+        self.assertEqual(means[1, 4], 40.0)
+        self.assertEqual(grid.counts.sum(), 4)
+        self.assertEqual(len(grid.index), 4)
+        self.assertEqual(grids.to_lists(first)[0][:2], [25.0, None])
+
+    def test_GridAggregator_weights(self):
+        # A sample standing for three slots counts three times towards the means of its cells, but its readings are counted once
+        grid = grids.GridAggregator((49.0, -123.5, 49.2, -123.0), 0.1)
+        grid.add_sample(columnar.parse(self.responses[0]), 3)
+        second = grid.add_sample(columnar.parse(self.responses[1]))
+
+        self.assertEqual(second[0, 0], 24.0)
+        self.assertAlmostEqual(grid.means()[0, 0], (3*20 + 3*30 + 24)/7)
+        self.assertEqual(grid.counts.sum(), 4)
+
+        merged = grids.GridAggregator((49.0, -123.5, 49.2, -123.0), 0.1)
+        for response, weight in zip(self.responses, [3, 1]):
+            partial = grids.GridAggregator((49.0, -123.5, 49.2, -123.0), 0.1)
+            partial.add_sample(columnar.parse(response), weight)
+            merged.merge(partial)
+        np.testing.assert_array_equal(merged.means(), grid.means())
+
+    def test_GridAggregator_merge(self):
+        whole = grids.GridAggregator((49.0, -123.5, 49.2, -123.0), 0.1)
+        merged = grids.GridAggregator((49.0, -123.5, 49.2, -123.0), 0.1)
+        for response in self.responses:
+            whole.add_sample(columnar.parse(response))
+            partial = grids.GridAggregator((49.0, -123.5, 49.2, -123.0), 0.1)
+            partial.add_sample(columnar.parse(response))
+            merged.merge(partial)
+
+        self.assertEqual(merged.samples, 2)
+        np.testing.assert_array_equal(merged.counts, whole.counts)
+        np.testing.assert_array_equal(merged.means(), whole.means())
+        with self.assertRaises(ValueError):
+            merged.merge(grids.GridAggregator((49.0, -123.5, 49.2, -123.0), 0.05))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import unittest
+import asyncio
+import concurrent.futures
+import time
+from clients import hedging, limits
+from exceptions.api import exceptions
+from schedulers import clocks
+
+class TestHedging(unittest.TestCase):
+
+    def setUp(self):
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=4)
+
+    def tearDown(self):
+        self.executor.shutdown(wait=True)
+
+    def warmed(self, hedger, latency=0.01, count=20):
+        for _ in range(count):
+            hedger.observe(latency)
+        with hedger.lock:
+            hedger.calls += count
+        return hedger
+
+    def test_delay(self):
+        hedger = hedging.Hedger(budget=0.1, percentile=0.9, warmup=10)
+        self.assertIsNone(hedger.delay())
+        for latency in range(1, 11):
+            hedger.observe(latency/100)
+        self.assertEqual(hedger.delay(), 0.09)
+
+        # Without a budget nothing is ever hedged
+        self.assertIsNone(self.warmed(hedging.Hedger(budget=0.0)).delay())
+
+    def test_allow(self):
+        # At most budget extra calls per call, and only with a token to spare
+        hedger = self.warmed(hedging.Hedger(budget=0.1))
+        self.assertTrue(hedger.allow())
+        self.assertTrue(hedger.allow())
+        self.assertFalse(hedger.allow())
+
+        limiter = limits.RateLimiter(budget=60, burst=1)
+        limiter.try_acquire()
+        self.assertFalse(self.warmed(hedging.Hedger(budget=0.1)).allow(limiter))
+
+    def test_call_hedged(self):
+        # A call slower than usual gets a duplicate, which answers first
+        hedger = self.warmed(hedging.Hedger(budget=0.5))
+        latencies = iter([1.0, 0.0])
+
+        def attempt():
+            time.sleep(next(latencies))
+            return 'answer'
+
+        start = time.monotonic()
+        self.assertEqual(hedger.call(attempt, self.executor), 'answer')
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertEqual((hedger.hedges, hedger.wins), (1, 1))
+
+    def test_call_fast(self):
+        hedger = self.warmed(hedging.Hedger(budget=0.5), latency=1.0)
+        self.assertEqual(hedger.call(lambda: 'answer', self.executor), 'answer')
+        self.assertEqual(hedger.hedges, 0)
+
+    def test_call_failed(self):
+        # An attempt that fails is waited out by its hedge, and a call fails once every attempt has
+        hedger = self.warmed(hedging.Hedger(budget=0.5))
+        outcomes = iter([(0.2, ValueError('first')), (0.3, None)])
+
+        def attempt():
+            latency, error = next(outcomes)
+            time.sleep(latency)
+            if error is not None:
+                raise error
+            return 'second'
+
+        self.assertEqual(hedger.call(attempt, self.executor), 'second')
+
+        def fail():
+            raise ValueError('failed')
+
+        with self.assertRaises(ValueError):
+            hedging.Hedger().call(fail, self.executor)
+
+    def test_call_deadline(self):
+        hedger = hedging.Hedger()
+        start = time.monotonic()
+        with self.assertRaises(exceptions.APIDeadlineError):
+            hedger.call(lambda: time.sleep(1), self.executor, give_up_at=start + 0.1)
+        self.assertLess(time.monotonic() - start, 0.5)
+
+    def test_call_async(self):
+        # On the virtual clock: the slow call is hedged after the 95th percentile and cancelled once its hedge answers
+        clock = clocks.VirtualClock()
+        hedger = self.warmed(hedging.Hedger(budget=0.5, clock=clock.monotonic), latency=2.0)
+        latencies = iter([60.0, 1.0])
+        cancelled = []
+
+        async def attempt():
+            try:
+                await asyncio.sleep(next(latencies))
+            except asyncio.CancelledError:
+                cancelled.append(clock.monotonic())
+                raise
+            return 'answer'
+
+        self.assertEqual(clocks.run(hedger.call_async(attempt), clock), 'answer')
+        self.assertEqual(clock.monotonic(), 3.0)
+        self.assertEqual(cancelled, [3.0])
+        self.assertEqual((hedger.hedges, hedger.wins), (1, 1))
+
+        # Without a hedge, nothing arrives before the deadline
+        async def slow():
+            await asyncio.sleep(60)
+
+        with self.assertRaises(exceptions.APIDeadlineError):
+            clocks.run(hedging.Hedger(clock=clock.monotonic).call_async(slow, give_up_at=clock.monotonic() + 10), clock)
+        self.assertEqual(clock.monotonic(), 13.0)
+
+if __name__ == '__main__':
+    unittest.main()
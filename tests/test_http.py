@@ -0,0 +1,39 @@
+import unittest
+from unittest.mock import patch
+import threading
+from clients import http
+
+class TestHTTP(unittest.TestCase):
+
+    def test_HTTPClient(self):
+        with http.HTTPClient(pool_size=4, connect_timeout=2, read_timeout=3) as client:
+            self.assertEqual(client.timeout, (2, 3))
+            self.assertEqual(client.adapter._pool_maxsize, 4)
+
+            session = client.session()
+            self.assertIs(client.session(), session)
+            self.assertIs(session.get_adapter('https://api.waqi.info'), client.adapter)
+            self.assertEqual(session.headers['Connection'], 'keep-alive')
+            self.assertIn('gzip', session.headers['Accept-Encoding'])
+
+            sessions = []
+            thread = threading.Thread(target=lambda: sessions.append(client.session()))
+            thread.start()
+            thread.join()
+            self.assertIsNot(sessions[0], session)
+            self.assertIs(sessions[0].get_adapter('https://api.waqi.info'), client.adapter)
+            self.assertEqual(len(client.sessions), 2)
+
+        self.assertEqual(len(client.sessions), 0)
+
+    def test_HTTPClient_get(self):
+        with http.HTTPClient(connect_timeout=1, read_timeout=2) as client:
+            with patch('requests.Session.get') as mock_get:
+                client.get('https://api.waqi.info/')
+                mock_get.assert_called_with('https://api.waqi.info/', timeout=(1, 2))
+
+    def test_default_client(self):
+        self.assertIs(http.default_client(), http.default_client())
+
+if __name__ == '__main__':
+    unittest.main()
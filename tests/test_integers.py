@@ -34,5 +34,14 @@ class TestIntegers(unittest.TestCase):
         self.assertRaises(ValueError, integers.reasonable_positive_int, '-7')
         self.assertRaises(ValueError, integers.reasonable_positive_int, '-2.5')
 
+    def test_async_positive_int(self):
+        self.assertEqual(integers.async_positive_int(self.ceiling + 1), self.ceiling + 1)
+        self.assertEqual(integers.async_positive_int(integers.ASYNC_RATE_CEILING), integers.ASYNC_RATE_CEILING)
+        self.assertEqual(integers.async_positive_int(str(integers.ASYNC_RATE_CEILING)), integers.ASYNC_RATE_CEILING)
+        self.assertRaises(ArgumentTypeError, integers.async_positive_int, integers.ASYNC_RATE_CEILING + 1)
+        self.assertRaises(ValueError, integers.async_positive_int, -3)
+        self.assertRaises(ValueError, integers.async_positive_int, 0)
+        self.assertRaises(ValueError, integers.async_positive_int, '8.5')
+
 if __name__ == 'main':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,64 @@
+import unittest
+from unittest.mock import Mock
+from clients import keyring
+from exceptions.api import exceptions
+
+class TestKeyring(unittest.TestCase):
+
+    def setUp(self):
+        self.ok = {'status': 'ok', 'data': []}
+        self.over_quota = {'status': 'error', 'data': 'Over quota'}
+        self.invalid = {'status': 'error', 'data': 'Invalid key'}
+
+    def test_split(self):
+        self.assertEqual(keyring.split('first, second\nthird  fourth'), ['first', 'second', 'third', 'fourth'])
+        self.assertEqual(keyring.split('only'), ['only'])
+        self.assertEqual(keyring.mask('abcdefgh'), '...efgh')
+
+    def test_KeyPool_round_robin(self):
+        keys = keyring.KeyPool(['a', 'b', 'c', 'a'])
+        self.assertEqual([keys.acquire() for _ in range(4)], ['a', 'b', 'c', 'a'])
+        self.assertEqual(keys.requests, {'a': 2, 'b': 1, 'c': 1})
+
+        # A quarantined key is skipped until its quarantine ends
+        self.assertTrue(keys.report('b', self.over_quota))
+        self.assertEqual([keys.acquire() for _ in range(3)], ['c', 'a', 'c'])
+
+    def test_KeyPool_least_used(self):
+        keys = keyring.KeyPool(['a', 'b'], 'least-used')
+        keys.requests['a'] = 5
+        self.assertEqual([keys.acquire() for _ in range(3)], ['b', 'b', 'b'])
+        self.assertRaises(ValueError, keyring.KeyPool, ['a'], 'random')
+        self.assertRaises(ValueError, keyring.KeyPool, [])
+
+    def test_KeyPool_quarantine(self):
+        clock = Mock(return_value=100.0)
+        keys = keyring.KeyPool(['a', 'b'], quarantine=10, clock=clock)
+        self.assertTrue(keys.report('a', self.over_quota))
+        self.assertEqual(keys.until['a'], 110.0)
+        self.assertTrue(keys.ready())
+
+        # Every key over quota: the one whose quarantine ends first is still handed out, for the caller to back off on
+        self.assertTrue(keys.report('b', self.over_quota))
+        self.assertFalse(keys.ready())
+        self.assertEqual(keys.acquire(), 'a')
+
+        # Quarantines double while a key stays over quota, and a good response ends the run of them
+        clock.return_value = 111.0
+        self.assertTrue(keys.report('a', self.over_quota))
+        self.assertEqual(keys.until['a'], 131.0)
+        self.assertFalse(keys.report('a', self.ok))
+        self.assertEqual(keys.strikes['a'], 0)
+        self.assertEqual(keys.over_quota, {'a': 2, 'b': 1})
+
+    def test_KeyPool_invalid(self):
+        keys = keyring.KeyPool(['a', 'b'])
+        self.assertTrue(keys.report('a', self.invalid))
+        self.assertEqual([keys.acquire() for _ in range(2)], ['b', 'b'])
+        self.assertFalse(keys.report('b', self.invalid))
+        with self.assertRaises(exceptions.APIInvalidKeyError):
+            keys.acquire()
+        self.assertIn('...: 0 request(s), over quota 0 time(s), not valid', keys.summary())
+
+if __name__ == '__main__':
+    unittest.main()
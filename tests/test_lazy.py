@@ -0,0 +1,55 @@
+import unittest
+import os
+import sys
+import tempfile
+import types
+from threading import Thread
+from loaders import lazy
+
+class TestLazy(unittest.TestCase):
+
+    def test_load(self):
+        sys.modules.pop('wave', None)
+        module = lazy.load('wave')
+        self.assertIs(sys.modules['wave'], module)
+        self.assertIsNot(type(module), types.ModuleType)
+
+        # The module only runs once one of its attributes is used
+        self.assertTrue(callable(module.open))
+        self.assertIs(type(module), types.ModuleType)
+        self.assertIs(lazy.load('wave'), module)
+
+    def test_load_submodule(self):
+        sys.modules.pop('xml.dom.minidom', None)
+        module = lazy.load('xml.dom.minidom')
+        from xml.dom import minidom
+        self.assertIs(minidom, module)
+        self.assertEqual(module.parseString('<a/>').documentElement.tagName, 'a')
+
+    def test_load_threads(self):
+        # Threads using a module at once all wait for it to be loaded, and it only runs once
+        with tempfile.TemporaryDirectory() as directory:
+            with open(os.path.join(directory, 'slow_to_load.py'), 'w') as f:
+                f.write('import time\nruns = getattr(time, "slow_to_load_runs", 0) + 1\ntime.slow_to_load_runs = runs\ntime.sleep(0.2)\nvalue = 42\n')
+            sys.path.insert(0, directory)
+            try:
+                module = lazy.load('slow_to_load')
+                values = []
+                threads = [Thread(target=lambda: values.append(module.value)) for _ in range(8)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+            finally:
+                sys.path.remove(directory)
+                sys.modules.pop('slow_to_load', None)
+
+        self.assertEqual(values, [42]*8)
+        self.assertEqual(module.runs, 1)
+
+    def test_load_missing(self):
+        with self.assertRaises(ModuleNotFoundError):
+            lazy.load('no_such_module_anywhere')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import unittest
+import asyncio
+import threading
+import time
+from clients import limits
+from exceptions.api import exceptions
+
+class TestLimits(unittest.TestCase):
+
+    def test_RateLimiter_budget(self):
+        limiter = limits.RateLimiter(budget=1200, burst=2)
+        event = threading.Event()
+
+        start = time.monotonic()
+        for _ in range(6):
+            self.assertTrue(limiter.acquire(event))
+        self.assertGreaterEqual(time.monotonic() - start, 0.18)
+
+    def test_RateLimiter_unlimited(self):
+        limiter = limits.RateLimiter()
+        event = threading.Event()
+
+        start = time.monotonic()
+        for _ in range(1000):
+            self.assertTrue(limiter.acquire(event))
+        self.assertLess(time.monotonic() - start, 0.5)
+
+        event.set()
+        self.assertFalse(limiter.acquire(event))
+
+    def test_RateLimiter_try_acquire(self):
+        # Optional requests never wait for a token, and leave the bucket alone when there is none
+        now = [0.0]
+        limiter = limits.RateLimiter(budget=60, burst=2, clock=lambda: now[0])
+        self.assertTrue(limiter.try_acquire())
+        self.assertTrue(limiter.try_acquire())
+        self.assertFalse(limiter.try_acquire())
+        now[0] = 1.0
+        self.assertTrue(limiter.try_acquire())
+        self.assertFalse(limiter.try_acquire())
+        self.assertTrue(limits.RateLimiter().try_acquire())
+
+    def test_RateLimiter_give_up(self):
+        # A token that would only come after give_up_at is left in the bucket, so giving up runs up no debt
+        now = [0.0]
+        limiter = limits.RateLimiter(budget=60, burst=1, clock=lambda: now[0])
+        self.assertEqual(limiter.reserve(0.5), 0)
+        self.assertIsNone(limiter.reserve(0.5))
+        self.assertEqual(limiter.reserve(1.5), 1)
+        self.assertIsNone(limiter.reserve(1.5))
+        self.assertFalse(limiter.acquire(threading.Event(), 1.5))
+        now[0] = 2.0
+        self.assertEqual(limiter.reserve(2.0), 0)
+
+    def test_RateLimiter_cancelled(self):
+        limiter = limits.RateLimiter(budget=1, burst=1)
+        event = threading.Event()
+        self.assertTrue(limiter.acquire(event))
+
+        threading.Timer(0.05, event.set).start()
+        start = time.monotonic()
+        self.assertFalse(limiter.acquire(event))
+        self.assertLess(time.monotonic() - start, 1)
+
+    def test_RateLimiter_acquire_async(self):
+        async def run():
+            limiter = limits.RateLimiter(budget=1200, burst=1)
+            cancel = asyncio.Event()
+
+            start = time.monotonic()
+            for _ in range(3):
+                self.assertTrue(await limiter.acquire_async(cancel))
+            self.assertGreaterEqual(time.monotonic() - start, 0.08)
+
+            cancel.set()
+            self.assertFalse(await limiter.acquire_async(cancel))
+
+        asyncio.run(run())
+
+    def test_RateLimiter_backoff(self):
+        limiter = limits.RateLimiter(quota_deadline=0.1, backoff_base=1, backoff_cap=4)
+
+        for attempt in range(4):
+            self.assertTrue(0 <= limiter.backoff() <= min(4, 2**attempt))
+        self.assertEqual(limiter.retries, 4)
+
+        limiter.succeeded()
+        self.assertIsNone(limiter.quota_since)
+        limiter.backoff()
+
+        time.sleep(0.1)
+        with self.assertRaises(exceptions.APIRequestQuotaError):
+            limiter.backoff()
+
+    def test_RateLimiter_record_missed(self):
+        limiter = limits.RateLimiter()
+        limiter.record_missed()
+        limiter.record_missed()
+        self.assertEqual(limiter.missed, 2)
+
+if __name__ == '__main__':
+    unittest.main()
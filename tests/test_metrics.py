@@ -0,0 +1,62 @@
+import unittest
+import os
+import tempfile
+import requests
+from instrumentation import metrics
+
+class TestMetrics(unittest.TestCase):
+
+    def test_Histogram(self):
+        histogram = metrics.Histogram(buckets=(1, 2, 4))
+        for value in [0.5, 1.5, 1.5, 3, 10]:
+            histogram.observe(value)
+
+        self.assertEqual(histogram.counts, [1, 2, 1, 1])
+        self.assertEqual(histogram.count, 5)
+        self.assertAlmostEqual(histogram.sum, 16.5)
+        self.assertAlmostEqual(histogram.quantile(0.5), 1.75)
+        self.assertEqual(metrics.Histogram().quantile(0.5), 0.0)
+
+    def test_Metrics_render(self):
+        registry = metrics.Metrics()
+        registry.observe('api_call', 0.2)
+        registry.count('retries')
+        registry.count('retries', 2)
+        with registry.in_flight():
+            self.assertEqual(registry.gauges['requests_in_flight'], 1)
+        with registry.time('process'):
+            pass
+
+        text = registry.render()
+        self.assertIn('pm25_stage_seconds_bucket{stage="api_call",le="0.25"} 1', text)
+        self.assertIn('pm25_stage_seconds_bucket{stage="api_call",le="0.1"} 0', text)
+        self.assertIn('pm25_stage_seconds_count{stage="process"} 1', text)
+        self.assertIn('pm25_retries_total 3', text)
+        self.assertIn('pm25_requests_in_flight 0', text)
+        self.assertIn('retries 3', registry.summary())
+
+        registry.reset()
+        self.assertNotIn('retries', registry.render())
+
+    def test_exporting(self):
+        registry = metrics.Metrics()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'metrics.prom')
+            with metrics.exporting(registry, path, port=0, interval=60):
+                registry.count('timeouts')
+            with open(path) as f:
+                self.assertIn('pm25_timeouts_total 1', f.read())
+            self.assertFalse(os.path.exists(f'{path}.tmp'))
+
+    def test_Metrics_serve(self):
+        registry = metrics.Metrics()
+        registry.count('missed_samples')
+        with registry.serve(0) as server:
+            host, port = server.server_address[:2]
+            response = requests.get(f'http://{host}:{port}/metrics', timeout=5)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('pm25_missed_samples_total 1', response.text)
+            self.assertEqual(requests.get(f'http://{host}:{port}/other', timeout=5).status_code, 404)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+import numpy as np
+from aggregators import grids, partials, rolling, stations
+from regions import batch
+
+class TestPartials(unittest.TestCase):
+
+    def setUp(self):
+        self.responses = [
+            {'status': 'ok', 'data': [
+                {'lat': 49.1, 'lon': -123.0, 'uid': 1, 'aqi': '20', 'station': {'name': 'North Delta'}},
+                {'lat': 49.2, 'lon': -122.9, 'uid': 2, 'aqi': '26', 'station': {'name': 'Burnaby South'}},
+                {'lat': 50.1, 'lon': -122.9, 'uid': 3, 'aqi': '-', 'station': {'name': 'Whistler Meadow Park'}}
+            ]},
+            {'status': 'ok', 'data': [
+                {'lat': 49.1, 'lon': -123.0, 'uid': 1, 'aqi': '24', 'station': {'name': 'North Delta'}},
+                {'lat': 50.1, 'lon': -122.9, 'uid': 3, 'aqi': '13', 'station': {'name': 'Whistler Meadow Park'}}
+            ]}
+        ]
+
+    def test_PartialPool(self):
+        aggregator = stations.StationAggregator()
+        with partials.PartialPool(2) as pool:
+            for response in self.responses:
+                pool.submit([response], aggregator)
+
+        frame = aggregator.to_frame().set_index('station.name')
+        self.assertEqual(aggregator.samples, 2)
+        self.assertAlmostEqual(frame.loc['North Delta', 'mean'], 22.0)
+        self.assertAlmostEqual(frame.loc['North Delta', 'std'], np.std([20.0, 24.0], ddof=1))
+        self.assertEqual(frame.loc['Whistler Meadow Park', 'count'], 1)
+
+    def test_PartialPool_regions(self):
+        regions = batch.RegionBatch([('South', 49.0, -123.5, 49.5, -122.5), ('North', 49.5, -123.5, 50.5, -122.5)])
+        with partials.PartialPool(2, regions) as pool:
+            for response in self.responses:
+                pool.submit([response], None, regions)
+            pool.collect(wait=True)
+            self.assertFalse(pool.pending)
+
+        self.assertEqual(regions.aggregators['South'].samples, 2)
+        self.assertEqual(sorted(regions.aggregators['South'].names), ['Burnaby South', 'North Delta'])
+        self.assertEqual(regions.aggregators['North'].names, ['Whistler Meadow Park'])
+
+    def test_PartialPool_rolling(self):
+        aggregator = rolling.RollingAggregator()
+        with partials.PartialPool(1) as pool:
+            pool.submit([self.responses[0]], aggregator)
+        self.assertEqual(list(aggregator.to_frame()['mean_5']), [26.0, 20.0])
+
+    def test_PartialPool_grid(self):
+        aggregator = stations.StationAggregator()
+        grid = grids.GridAggregator((49.0, -123.5, 50.5, -122.5), 0.5)
+        with partials.PartialPool(2) as pool:
+            for response in self.responses:
+                pool.submit([response], aggregator, grid=grid)
+
+        self.assertEqual(grid.samples, 2)
+        self.assertEqual(grid.counts.sum(), 4)
+        self.assertEqual(grid.means()[0, 1], 70/3)
+        self.assertEqual(grid.means()[2, 1], 13.0)
+
+if __name__ == '__main__':
+    unittest.main()
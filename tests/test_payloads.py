@@ -0,0 +1,39 @@
+import unittest
+import json
+from exceptions.api import exceptions
+from parsers import payloads
+
+class TestPayloads(unittest.TestCase):
+
+    def setUp(self):
+        self.response = {'status': 'ok', 'data': [{'lat': 49.1, 'lon': -123.0, 'uid': 1, 'aqi': '20', 'station': {'name': 'North Delta'}}]}
+        self.stations = {'status': 'ok', 'data': [{'uid': uid, 'aqi': '20', 'station': {'name': f'Station {uid}'}} for uid in range(20)]}
+
+    def test_Payload(self):
+        # Short bodies are decoded for their status, and longer ones are taken to hold stations without decoding them
+        over_quota = payloads.Payload(b'{"status":"error","data":"Over quota"}')
+        self.assertEqual(over_quota['data'], 'Over quota')
+        with self.assertRaises(exceptions.APIRequestQuotaError):
+            payloads.check_response(over_quota)
+
+        payload = payloads.Payload(json.dumps(self.stations).encode())
+        self.assertEqual(payload.head, {'status': 'ok'})
+        self.assertEqual(payload.get('status'), 'ok')
+        self.assertEqual(payloads.decode(payload), self.stations)
+
+    def test_encode(self):
+        self.assertEqual(payloads.encode(self.response), json.dumps(self.response, separators=(',', ':')).encode())
+        self.assertEqual(payloads.encode(payloads.Payload(b'{"status": "ok",\r\n "data": []}\n')), b'{"status": "ok", "data": []}')
+
+    def test_validated(self):
+        # Tiles are decoded, checked and merged, whether they are payloads, bytes or already decoded
+        other = {'status': 'ok', 'data': [{'lat': 49.2, 'lon': -122.9, 'uid': 2, 'aqi': '26', 'station': {'name': 'Burnaby South'}}]}
+        merged = payloads.validated([payloads.Payload(json.dumps(self.response).encode()), json.dumps(other).encode(), self.response])
+        self.assertEqual([station['uid'] for station in merged['data']], [1, 2])
+        self.assertIs(payloads.validated([self.response]), self.response)
+
+        with self.assertRaises(exceptions.APIInvalidKeyError):
+            payloads.validated([self.response, b'{"status":"error","data":"Invalid key"}'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+import unittest
+from parsers import readings
+
+class TestReadings(unittest.TestCase):
+
+    def station(self, uid, time):
+        return {'uid': uid, 'aqi': '20', 'station': {'name': f'Station {uid}', 'time': time}}
+
+    def test_ChangeFilter(self):
+        changes = readings.ChangeFilter()
+
+        response, skipped = changes.filter({'status': 'ok', 'data': [self.station(1, '11:00'), self.station(2, '11:00')]})
+        self.assertEqual(skipped, 0)
+        self.assertEqual([station['uid'] for station in response['data']], [1, 2])
+
+        response, skipped = changes.filter({'status': 'ok', 'data': [self.station(1, '11:00'), self.station(2, '12:00'), self.station(3, '11:00')]})
+        self.assertEqual(skipped, 1)
+        self.assertEqual([station['uid'] for station in response['data']], [2, 3])
+
+        response, skipped = changes.filter({'status': 'ok', 'data': [self.station(1, '11:00'), self.station(2, '12:00'), self.station(3, '11:00')]})
+        self.assertEqual(skipped, 3)
+        self.assertEqual(response['data'], [])
+
+        self.assertEqual(changes.checked, 8)
+        self.assertEqual(changes.skipped, 4)
+
+    def test_ChangeFilter_untimed(self):
+        changes = readings.ChangeFilter()
+        untimed = {'status': 'ok', 'data': [{'uid': 1, 'aqi': '20', 'station': {'name': 'Station 1'}}]}
+
+        for _ in range(2):
+            response, skipped = changes.filter(untimed)
+            self.assertEqual(skipped, 0)
+            self.assertEqual(len(response['data']), 1)
+
+        error = {'status': 'error', 'data': 'Unknown error'}
+        self.assertEqual(changes.filter(error), (error, 0))
+
+if __name__ == '__main__':
+    unittest.main()
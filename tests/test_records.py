@@ -0,0 +1,66 @@
+import unittest
+import os
+import tempfile
+import numpy as np
+from parsers import columnar
+from storage import records
+
+class TestRecords(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'store')
+        self.bounds = (49.0, -123.5, 50.5, -122.5)
+        self.samples = [
+            columnar.Sample(np.array([1, 2]), np.array([20.0, 26.0]), np.array(['North Delta', 'Burnaby South'], dtype=object), np.zeros(2), np.zeros(2)),
+            columnar.Sample(np.array([1]), np.array([22.0]), np.array(['North Delta'], dtype=object), np.zeros(1), np.zeros(1)),
+            columnar.Sample(np.array([], dtype=np.int64), np.array([]), np.array([], dtype=object), np.zeros(0), np.zeros(0))
+        ]
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_SampleStore(self):
+        with records.SampleStore(self.path, self.bounds, 2) as store:
+            for sample in self.samples:
+                store.append(sample, timestamp=100.0)
+            store.complete_minute()
+
+            data = store.read()
+            self.assertEqual(len(data), 3)
+            self.assertEqual(list(data['uid']), [1, 2, 1])
+            self.assertEqual(list(data['sample']), [0, 0, 1])
+            self.assertEqual(list(data['station']), [0, 1, 0])
+
+            frame = store.aggregate().to_frame().set_index('station.name')
+            self.assertAlmostEqual(frame.loc['North Delta', 'mean'], 21.0)
+            self.assertEqual(frame.loc['Burnaby South', 'count'], 1)
+
+        with self.assertRaises(ValueError):
+            records.SampleStore(self.path, self.bounds, 3)
+
+    def test_SampleStore_resume(self):
+        with records.SampleStore(self.path, self.bounds, 2) as store:
+            store.append(self.samples[0])
+            store.complete_minute()
+
+            # A minute cut short before being committed is dropped when the store is opened again
+            store.append(self.samples[1])
+            store.append(columnar.Sample(np.array([3]), np.array([50.0]), np.array(['Richmond South'], dtype=object), np.zeros(1), np.zeros(1)))
+
+        with records.SampleStore(self.path, self.bounds, 2) as store:
+            self.assertEqual((store.minutes, store.samples, store.records), (1, 1, 2))
+            self.assertEqual(store.names, ['North Delta', 'Burnaby South'])
+            self.assertEqual(os.path.getsize(store.records_path), 2*records.RECORD.itemsize)
+
+            store.append(self.samples[1])
+            store.complete_minute()
+
+        with records.SampleStore(self.path, self.bounds, 2) as store:
+            aggregator = store.aggregate()
+            self.assertEqual(aggregator.samples, 2)
+            self.assertEqual(list(store.read()['sample']), [0, 0, 1])
+            self.assertEqual(aggregator.to_frame().set_index('station.name').loc['North Delta', 'count'], 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import unittest
+import json
+import os
+import tempfile
+import numpy as np
+from parsers import columnar
+from storage import registry
+
+class TestRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'stations.json')
+        self.sample = columnar.Sample(np.array([4227, 10133, 4226]), np.array([20.0, 35.0, 20.0]), np.array(['North Delta', 'Richmond South', 'North Delta'], dtype=object),
+                                      np.array([49.1, 49.2, 49.3]), np.array([-122.9, -123.1, -123.0]), np.array(['2024-01-01 10:00:00']*3, dtype=object))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_intern(self):
+        # Stations are interned once by uid, so two stations with the same name get ids of their own
+        stations = registry.StationRegistry()
+        ids = stations.intern(self.sample.uid, self.sample.name, self.sample.lat, self.sample.lng, self.sample.time)
+        self.assertEqual(len(stations), 3)
+        self.assertEqual(len(set(ids.tolist())), 3)
+        self.assertEqual(stations.names[ids].tolist(), ['North Delta', 'Richmond South', 'North Delta'])
+        self.assertEqual(stations.lat[ids[1]], 49.2)
+
+        # Known stations keep their ids and names, and only their last update changes
+        again = stations.intern(np.array([10133, 4227, 10133, 1]), np.array(['Renamed', 'North Delta', 'Renamed', 'New'], dtype=object), updated=np.array(['2024-01-01 11:00:00', None, '2024-01-01 11:00:00', None], dtype=object))
+        self.assertEqual(again[:3].tolist(), [ids[1], ids[0], ids[1]])
+        self.assertEqual(len(stations), 4)
+        self.assertEqual(stations.names[ids[1]], 'Richmond South')
+        self.assertEqual(stations.updated[ids[1]], '2024-01-01 11:00:00')
+        self.assertEqual(stations.updated[ids[0]], '2024-01-01 10:00:00')
+        self.assertTrue(np.isnan(stations.lat[again[3]]))
+        self.assertEqual(stations.lookup(np.array([4226, 5])).tolist(), [ids[2], -1])
+
+    def test_intern_names(self):
+        stations = registry.StationRegistry()
+        ids = stations.intern_names(['A', 'B', 'A'])
+        self.assertEqual(ids.tolist(), [0, 1, 0])
+        self.assertEqual(stations.intern_names(['B', 'C']).tolist(), [1, 2])
+        self.assertTrue(stations.named.all())
+        self.assertEqual(stations.lookup(np.array([0, -1])).tolist(), [-1, -1])
+        self.assertEqual(len(stations.intern(np.array([], dtype=np.int64), np.array([], dtype=object))), 0)
+
+    def test_adopt(self):
+        other = registry.StationRegistry()
+        rows = other.intern(self.sample.uid, self.sample.name, self.sample.lat, self.sample.lng)
+        named = other.intern_names(['A'])
+        stations = registry.StationRegistry()
+        stations.intern(np.array([10133]), np.array(['Richmond South'], dtype=object))
+
+        ids = stations.adopt(other, np.concatenate([rows, named]))
+        self.assertEqual(ids[1], 0)
+        self.assertEqual(stations.uid[ids[:3]].tolist(), [4227, 10133, 4226])
+        self.assertEqual(stations.named[ids].tolist(), [False, False, False, True])
+        self.assertEqual(stations.names[ids].tolist(), ['North Delta', 'Richmond South', 'North Delta', 'A'])
+
+    def test_negative_uids(self):
+        # Real stations can have negative uids, and two of them sharing a name are still told apart, adopted and saved
+        other = registry.StationRegistry()
+        rows = other.intern(np.array([-344797, -344798]), np.array(['Sensor A', 'Sensor A'], dtype=object))
+        named = other.intern_names(['Sensor A'])
+        self.assertEqual(len(set(rows.tolist() + named.tolist())), 3)
+
+        stations = registry.StationRegistry(self.path)
+        ids = stations.adopt(other, np.concatenate([rows, named]))
+        self.assertEqual(len(set(ids.tolist())), 3)
+        self.assertEqual(stations.uid[ids[:2]].tolist(), [-344797, -344798])
+        stations.save()
+
+        loaded = registry.StationRegistry(self.path)
+        self.assertEqual(len(loaded), 2)
+        self.assertEqual(loaded.uid[loaded.lookup(np.array([-344797, -344798]))].tolist(), [-344797, -344798])
+        self.assertFalse(loaded.named.any())
+
+    def test_save_and_load(self):
+        # Ids survive a round trip through the file, while stations known only by name are left out of it
+        stations = registry.StationRegistry(self.path)
+        ids = stations.intern(self.sample.uid, self.sample.name, np.array([49.1, np.nan, 49.3]), self.sample.lng, self.sample.time)
+        stations.intern_names(['A'])
+        stations.save()
+        self.assertFalse(os.path.exists(f'{self.path}.tmp'))
+
+        loaded = registry.StationRegistry(self.path)
+        self.assertEqual(len(loaded), 3)
+        self.assertEqual(loaded.lookup(self.sample.uid).tolist(), ids.tolist())
+        self.assertEqual(loaded.names.tolist(), stations.names[:3].tolist())
+        self.assertTrue(np.isnan(loaded.lat[ids[1]]))
+        self.assertEqual(loaded.updated[0], '2024-01-01 10:00:00')
+
+    def test_load_not_a_registry(self):
+        with open(self.path, 'w') as f:
+            json.dump({'stations': []}, f)
+        with self.assertRaises(ValueError):
+            registry.StationRegistry(self.path)
+
+if __name__ == '__main__':
+    unittest.main()
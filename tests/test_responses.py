@@ -0,0 +1,56 @@
+import unittest
+import os
+import tempfile
+from parsers import payloads
+from storage import responses
+
+class TestResponses(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'responses.ndjson.gz')
+        self.response = {'status': 'ok', 'data': [{'uid': 1, 'aqi': '20', 'station': {'name': 'North Delta'}}]}
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_ResponseLog(self):
+        with responses.ResponseLog(self.path) as log:
+            log.write(0, [self.response], timestamp=100.0)
+            log.write(1, [self.response, self.response], timestamp=105.0)
+
+        # Appending to an existing log carries on after its last record
+        with responses.ResponseLog(self.path) as log:
+            log.write(2, [{'status': 'error', 'data': 'Invalid key'}])
+
+        records = list(responses.read(self.path))
+        self.assertEqual([record['sample'] for record in records], [0, 1, 2])
+        self.assertEqual(records[0]['time'], 100.0)
+        self.assertEqual(records[1]['responses'], [self.response, self.response])
+        self.assertEqual(records[2]['responses'][0]['data'], 'Invalid key')
+
+    def test_ResponseLog_payloads(self):
+        # Undecoded responses are logged as they were received, on one line
+        with responses.ResponseLog(self.path) as log:
+            log.write(0, [payloads.Payload(b'{"status": "ok",\n"data": []}'), self.response], timestamp=100.0)
+
+        records = list(responses.read(self.path))
+        self.assertEqual(records[0]['responses'], [{'status': 'ok', 'data': []}, self.response])
+
+    def test_read_truncated(self):
+        with responses.ResponseLog(self.path) as log:
+            for sample in range(50):
+                log.write(sample, [self.response])
+
+        # A log cut short by a crash yields every record written before the cut
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        with open(self.path, 'wb') as f:
+            f.write(data[:-30])
+
+        records = list(responses.read(self.path))
+        self.assertGreater(len(records), 40)
+        self.assertEqual([record['sample'] for record in records], list(range(len(records))))
+
+if __name__ == '__main__':
+    unittest.main()
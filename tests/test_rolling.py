@@ -0,0 +1,47 @@
+import unittest
+import numpy as np
+from aggregators import rolling
+
+class TestRolling(unittest.TestCase):
+
+    def test_RollingAggregator(self):
+        aggregator = rolling.RollingAggregator(windows=(2, 3), capacity=1)
+        readings = {0: [('A', 10.0), ('B', 40.0)], 1: [('A', 20.0)], 2: [('A', 30.0), ('A', 50.0)], 3: [('B', 60.0)]}
+        for minute, sample in readings.items():
+            aggregator.advance(minute)
+            aggregator.add_columns(np.array([name for name, _ in sample], dtype=object), np.array([value for _, value in sample]))
+
+        frame = aggregator.to_frame().set_index('station.name')
+        self.assertEqual(list(frame.columns), ['mean_2', 'mean_3'])
+        self.assertAlmostEqual(frame.loc['A', 'mean_2'], 40.0)
+        self.assertAlmostEqual(frame.loc['A', 'mean_3'], (20.0 + 30.0 + 50.0)/3)
+        self.assertAlmostEqual(frame.loc['B', 'mean_2'], 60.0)
+        self.assertAlmostEqual(frame.loc['B', 'mean_3'], 60.0)
+        self.assertEqual(list(frame.index), ['B', 'A'])
+
+        # Once every reading of a station has left the longest window, it is no longer reported
+        aggregator.advance(5)
+        frame = aggregator.to_frame().set_index('station.name')
+        self.assertEqual(list(frame.index), ['B'])
+        self.assertTrue(np.isnan(frame.loc['B', 'mean_2']))
+
+        aggregator.advance(100)
+        self.assertTrue(aggregator.to_frame().empty)
+        self.assertEqual(aggregator.window_counts.sum(), 0)
+
+    def test_RollingAggregator_fixed_memory(self):
+        aggregator = rolling.RollingAggregator()
+        names = np.array(['A', 'B'], dtype=object)
+        for minute in range(500):
+            aggregator.advance(minute)
+            aggregator.add_columns(names, np.array([minute % 7, 3.0]))
+        shape = aggregator.sums.shape
+
+        frame = aggregator.to_frame().set_index('station.name')
+        self.assertEqual(shape, (64, 60))
+        self.assertAlmostEqual(frame.loc['A', 'mean_5'], np.mean([minute % 7 for minute in range(495, 500)]))
+        self.assertAlmostEqual(frame.loc['A', 'mean_60'], np.mean([minute % 7 for minute in range(440, 500)]))
+        self.assertAlmostEqual(frame.loc['B', 'mean_15'], 3.0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+from unittest.mock import patch
+import io
+import itertools
+import time
+import sampling
+import script
+from aggregators import stations
+from benchmarks import server
+
+class TestSampling(unittest.TestCase):
+
+    def test_samples(self):
+        with server.serve(stations=2000) as stand_in, patch('script.API_URL', stand_in.url), patch('script.MINUTE', 0.05), patch('sys.stdout', new=io.StringIO()) as output:
+            for engine in ['threads', 'asyncio']:
+                aggregator = stations.StationAggregator()
+                records = list(sampling.samples(40, -130, 55, -100, 2, 2, aggregator, engine=engine))
+
+                self.assertEqual([record.sample for record in records], [1, 2, 3, 4])
+                self.assertEqual(aggregator.samples, 4)
+                self.assertTrue(all(len(record.data.aqi) == len(records[0].data.aqi) > 0 for record in records))
+                self.assertTrue(((40 <= records[0].data.lat) & (records[0].data.lat <= 55)).all())
+                self.assertEqual(aggregator.to_frame()['count'].max(), 4)
+            self.assertEqual(output.getvalue(), '')
+
+    def test_samples_stop(self):
+        with server.serve(stations=100) as stand_in, patch('script.API_URL', stand_in.url), patch('script.MINUTE', 0.2):
+            for engine in ['threads', 'asyncio']:
+                log = io.StringIO()
+                generator = sampling.samples(40, -130, 55, -100, None, 2, engine=engine, log=log)
+                records = list(itertools.islice(generator, 3))
+                start = time.monotonic()
+                generator.close()
+
+                # Closing wakes every sample waiting for its deadline rather than waiting out the minute
+                self.assertLess(time.monotonic() - start, 0.15)
+                self.assertEqual(len(records), 3)
+                self.assertIn('Schedule jitter over 3 sample(s)', log.getvalue())
+
+    def test_samples_error(self):
+        with server.serve(stations=100) as stand_in, patch('script.API_URL', stand_in.url), patch('script.MINUTE', 0.05), patch('script.API_KEY', server.INVALID_KEY_TOKEN):
+            with self.assertRaises(script.exceptions.APIInvalidKeyError):
+                list(sampling.samples(40, -130, 55, -100, 2, 2))
+
+    def test_averages(self):
+        with server.serve(stations=2000) as stand_in, patch('script.API_URL', stand_in.url), patch('script.MINUTE', 0.05), patch('sys.stdout', new=io.StringIO()) as output:
+            frame = sampling.averages(40, -130, 55, -100, 1, 2, statistics=['p95', 'std'])
+        self.assertEqual(output.getvalue(), '')
+        self.assertIn('p95', frame.columns)
+        self.assertTrue((frame['count'] == 2).all())
+        self.assertTrue(frame['mean'].is_monotonic_decreasing)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,15 @@
 import unittest
-from unittest.mock import patch
+from unittest.mock import Mock, patch
 from configparser import ConfigParser
-from threading import Event
+from threading import Event, Thread
+import asyncio
+import io
 import json
+import os
+import tempfile
 import script
+from regions import batch
+from benchmarks import server
 
 class TestScript(unittest.TestCase):
 
@@ -301,6 +307,23 @@ class TestScript(unittest.TestCase):
             "data": []
         }
 
+    def test_load_api_key(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = f'{directory}/other.cfg'
+            with open(path, 'w') as f:
+                f.write('[api_keys]\nair_quality: from-file\n')
+
+            with patch.dict('os.environ', {script.API_KEY_VARIABLE: 'from-environment'}):
+                self.assertEqual(script.load_api_key(), 'from-environment')
+                self.assertEqual(script.load_api_key(path), 'from-file')
+            with patch.dict('os.environ', {script.CONFIG_VARIABLE: path}):
+                self.assertEqual(script.load_api_key(), 'from-file')
+            with patch.dict('os.environ', {script.CONFIG_VARIABLE: f'{directory}/missing.cfg'}), self.assertRaises(OSError):
+                script.load_api_key()
+
+        with patch('script.API_KEY', None):
+            self.assertEqual(script.api_key(), self.API_KEY)
+
     def test_normalize_response(self):
         response = script.normalize_response(self.mock_response1)
 
@@ -323,7 +346,7 @@ class TestScript(unittest.TestCase):
         self.assertEqual(list(response.columns.values), ['aqi', 'station.name'])
 
     def test_api_call(self):
-        with patch('script.requests.get') as mock_api_call:
+        with patch('script.http.HTTPClient.get') as mock_api_call:
             url = f'https://api.waqi.info/v2/map/bounds?latlng={self.lat1},{self.lng1},{self.lat2},{self.lng2}&networks=all&token=testinvalid'
             text = '{"status":"error","data":"Invalid key"}'
             mock_api_call.return_value.ok = True
@@ -366,14 +389,439 @@ class TestScript(unittest.TestCase):
     def test_request_data(self):
         event = Event()
 
-        data = script.request_data(self.lat1, self.lng1, self.lat2, self.lng2, 0, 1, 0, event)
-        self.assertEqual(data['status'], 'ok')
-        self.assertEqual(len(data), 2)
+        with server.serve(stations=2000) as stand_in, patch('script.API_URL', stand_in.url):
+            data = script.request_data(self.lat1, self.lng1, self.lat2, self.lng2, 0, 1, 0, event)
+            self.assertEqual(data['status'], 'ok')
+            self.assertEqual(len(data), 2)
+
+            event.set()
+
+            data = script.request_data(self.lat1, self.lng1, self.lat2, self.lng2, 0, 1, 0, event)
+            self.assertIsNone(data)
+
+    def test_start_threads_stand_in(self):
+        with server.serve(stations=2000) as stand_in, patch('script.API_URL', stand_in.url), patch('script.MINUTE', 0.2):
+            with script.http.HTTPClient(pool_size=4) as client:
+                aggregator = script.start_threads(40, -130, 55, -100, 3, 4, client=client)
+
+            self.assertEqual(stand_in.requests, 12)
+            self.assertEqual(aggregator.samples, 12)
+            self.assertGreater(len(aggregator), 0)
+            self.assertTrue((aggregator.to_frame()['count'] == 12).all())
+
+            with patch('script.API_KEY', server.INVALID_KEY_TOKEN), self.assertRaises(script.exceptions.APIInvalidKeyError):
+                script.start_threads(self.lat1, self.lng1, self.lat2, self.lng2, 3, 4, client=script.http.HTTPClient())
+
+    def test_request_data_timeout(self):
+        event = Event()
+
+        with patch('script.http.HTTPClient.get', side_effect=script.requests.exceptions.ReadTimeout):
+            data = script.request_data(self.lat1, self.lng1, self.lat2, self.lng2, 1, 1, 0, event, script.http.HTTPClient())
+            self.assertIsNone(data)
+            self.assertFalse(event.is_set())
+
+    def test_fetch_tile(self):
+        event = Event()
+        tile = (self.lat1, self.lng1, self.lat2, self.lng2)
+        over_quota = {'status': 'error', 'data': 'Over quota'}
+
+        with patch('script.http.HTTPClient.get') as mock_api_call:
+            mock_api_call.return_value.json.side_effect = [over_quota, over_quota, self.mock_response1]
+            limiter = script.limits.RateLimiter(backoff_base=0.01)
+
+            response = script.fetch_tile(tile, script.http.HTTPClient(), event, limiter, script.time.monotonic() + 10)
+            self.assertEqual(response, self.mock_response1)
+            self.assertEqual(limiter.retries, 2)
+            self.assertIsNone(limiter.quota_since)
 
-        event.set()
+            # Backing off past the end of the sample's slot gives up on the sample
+            mock_api_call.return_value.json.side_effect = [over_quota]
+            limiter = script.limits.RateLimiter(backoff_base=10)
+            self.assertIsNone(script.fetch_tile(tile, script.http.HTTPClient(), event, limiter, script.time.monotonic()))
+
+            # Once the quota has been over limits for longer than the deadline, the error is raised
+            mock_api_call.return_value.json.side_effect = None
+            mock_api_call.return_value.json.return_value = over_quota
+            limiter = script.limits.RateLimiter(quota_deadline=0.02, backoff_base=0.05)
+            with self.assertRaises(script.exceptions.APIRequestQuotaError):
+                script.fetch_tile(tile, script.http.HTTPClient(), event, limiter, script.time.monotonic() + 10)
+
+    def test_request_data_cache_deadline(self):
+        # A sample left waiting on another process's cached call past its slot is missed, even without a limiter
+        tile = (self.lat1, self.lng1, self.lat2, self.lng2)
+        with tempfile.TemporaryDirectory() as directory, patch('script.MINUTE', 0.2):
+            path = f'{directory}/responses.sqlite'
+            with script.response_cache.ResponseCache(path, 3600) as owner, script.response_cache.ResponseCache(path, 3600, poll=0.01) as cache:
+                self.assertTrue(owner.claim(tile).owned)
+                script.metrics.registry.reset()
+                progress = io.StringIO()
+                with script.logging_to(progress):
+                    data = script.request_data(*tile, 1, 5, 0, Event(), script.http.HTTPClient(), script.Context(cache=cache))
 
-        data = script.request_data(self.lat1, self.lng1, self.lat2, self.lng2, 0, 1, 0, event)
         self.assertIsNone(data)
+        self.assertEqual(script.metrics.registry.counters['missed_samples'], 1)
+        self.assertIn('Another process was still fetching the response', progress.getvalue())
+
+    def test_start_threads_over_quota(self):
+        with server.serve(stations=100) as stand_in, patch('script.API_URL', stand_in.url), patch('script.MINUTE', 0.2), patch('script.API_KEY', server.OVER_QUOTA_TOKEN):
+            limiter = script.limits.RateLimiter(quota_deadline=10, backoff_base=0.1)
+            aggregator = script.start_threads(40, -130, 55, -100, 2, 2, script.Context(limiter=limiter), client=script.http.HTTPClient())
+
+            self.assertEqual(limiter.missed, 4)
+            self.assertGreater(limiter.retries, 0)
+            self.assertEqual(aggregator.samples, 0)
+
+    def test_run_sampling_keys(self):
+        # Sampling carries on over the keys left after one is not valid and another is over quota
+        with server.serve(stations=100, token_quota=3, quota_window=3600) as stand_in, patch('script.API_URL', stand_in.url), patch('script.MINUTE', 0.1):
+            keys = script.keyring.KeyPool(['first', 'second', server.INVALID_KEY_TOKEN, server.OVER_QUOTA_TOKEN], quarantine=60)
+            aggregator = script.run_sampling(40, -130, 55, -100, 3, 2, script.Options(connect_timeout=5, read_timeout=5), script.Context(keys=keys))
+
+            self.assertEqual(aggregator.samples, 6)
+            self.assertEqual(keys.invalid, {server.INVALID_KEY_TOKEN})
+            self.assertEqual(keys.over_quota[server.OVER_QUOTA_TOKEN], 1)
+            self.assertEqual(keys.requests['first'], 3)
+            self.assertEqual(keys.requests['second'], 3)
+
+            # Each key only has a quota of 3 requests, so one key alone misses samples
+            limiter = script.limits.RateLimiter(quota_deadline=10, backoff_base=0.01)
+            with patch('script.API_KEY', 'third'):
+                aggregator = script.start_threads(40, -130, 55, -100, 3, 2, script.Context(limiter=limiter, keys=script.key_pool()), client=script.http.HTTPClient())
+            self.assertEqual(aggregator.samples, 3)
+
+        # The run only ends on "Invalid key" once none of the keys are valid
+        with server.serve(stations=100, invalid_rate=1.0) as stand_in, patch('script.API_URL', stand_in.url), patch('script.MINUTE', 0.1), patch('script.API_KEY', 'first,second'):
+            with self.assertRaises(script.exceptions.APIInvalidKeyError):
+                script.run_sampling(40, -130, 55, -100, 1, 2, script.Options(connect_timeout=5, read_timeout=5, engine='asyncio'))
+            self.assertLessEqual(stand_in.requests, 4)
+
+    def test_run_sampling_deadlines(self):
+        # Calls slower than a sample's slot are given up on, so the samples are missed instead of holding up their minute
+        for engine in ['threads', 'asyncio']:
+            script.metrics.registry.reset()
+            with server.serve(stations=10, latency=server.Latency('fixed', 0.5)) as stand_in, patch('script.API_URL', stand_in.url), patch('script.MINUTE', 0.2), patch('script.API_KEY', 'key'):
+                start = script.time.monotonic()
+                aggregator = script.run_sampling(40, -130, 55, -100, 2, 2, script.Options(connect_timeout=5, read_timeout=5, engine=engine, deadline_slots=1))
+                self.assertLess(script.time.monotonic() - start, 0.5 + 2*0.2)
+
+            self.assertEqual(aggregator.samples, 0)
+            self.assertEqual(script.metrics.registry.counters['missed_samples'], 4)
+
+    def test_run_sampling_budget(self):
+        # A budget below the rate misses the samples it has no call for, instead of stretching each minute to wait for one
+        for engine in ['threads', 'asyncio']:
+            script.metrics.registry.reset()
+            simulation = script.simulated.SimulatedClient(stations=50, clock=script.clocks.VirtualClock())
+            aggregator = script.run_sampling(-60, -180, 70, 180, 5, 12, script.Options(connect_timeout=5, read_timeout=5, engine=engine, budget=6, simulation=simulation))
+
+            missed = script.metrics.registry.counters['missed_samples']
+            self.assertGreater(missed, 0)
+            self.assertEqual(aggregator.samples + missed, 60)
+            self.assertEqual(simulation.calls, aggregator.samples)
+            self.assertLessEqual(aggregator.samples, 6*5 + 1)
+            self.assertLess(simulation.clock.monotonic(), 5*60 + 5)
+
+    def test_run_sampling_cache(self):
+        # Two runs of the same bounds sharing a cache make one API call per bucket between them
+        with tempfile.TemporaryDirectory() as directory, server.serve(stations=100, latency=server.Latency('fixed', 0.05)) as stand_in, patch('script.API_URL', stand_in.url), patch('script.MINUTE', 0.4), patch('script.API_KEY', 'key'):
+            path = f'{directory}/responses.sqlite'
+            aggregators = {}
+
+            def run(engine):
+                with script.response_cache.ResponseCache(path, 3600) as cache:
+                    aggregators[engine] = script.run_sampling(40, -130, 55, -100, 2, 2, script.Options(connect_timeout=5, read_timeout=5, engine=engine, cache=cache))
+
+            threads = [Thread(target=run, args=(engine,)) for engine in ['threads', 'asyncio']]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            self.assertEqual([aggregator.samples for aggregator in aggregators.values()], [4, 4])
+            self.assertLessEqual(stand_in.requests, 2)
+
+    def test_run_sampling_simulated(self):
+        # An hour sampled every second runs on the virtual clock in moments, with every sample on its deadline
+        simulation = script.simulated.SimulatedClient(stations=200, latency=0.2, clock=script.clocks.VirtualClock())
+        start = script.time.monotonic()
+        minutes = []
+        aggregator = script.run_sampling(-60, -180, 70, 180, 60, 60, script.Options(connect_timeout=5, read_timeout=5, simulation=simulation), script.Context(aggregator=script.stations.StationAggregator(), every_minute=minutes.append))
+        self.assertLess(script.time.monotonic() - start, 30)
+
+        self.assertEqual(aggregator.samples, 3600)
+        self.assertEqual(simulation.calls, 3600)
+        self.assertEqual(minutes, list(range(60)))
+        self.assertAlmostEqual(simulation.clock.monotonic(), 59*60 + 59 + 0.2)
+
+        # Readings are updated every virtual hour, so the hour saw one reading per station with one
+        frame = aggregator.to_frame()
+        self.assertGreater(len(frame), 150)
+        self.assertTrue((frame['count'] == 3600).all())
+        self.assertTrue((frame['min'] == frame['max']).all())
+
+    def test_run_sampling_adaptive(self):
+        # Readings that change every virtual minute push the rate up from 1 to 8 a minute, while the means stay time-weighted
+        simulation = script.simulated.SimulatedClient(stations=100, clock=script.clocks.VirtualClock())
+        simulation.stations.update_every = 60
+        grid = script.grids.GridAggregator((-60, -180, 70, 180), 360)
+        aggregator = script.run_sampling(-60, -180, 70, 180, 10, 8, script.Options(connect_timeout=5, read_timeout=5, simulation=simulation, min_rate=1), script.Context(aggregator=script.stations.StationAggregator(), grid=grid))
+
+        # 1, 1, 2, 4 and then 8 samples a minute
+        self.assertEqual(aggregator.samples, 1 + 1 + 2 + 4 + 8*6)
+        self.assertEqual(simulation.calls, aggregator.samples)
+
+        # Every station goes through each of its ten readings once, one a minute, so its time-weighted mean is halfway between them
+        frame = aggregator.to_frame()
+        self.assertGreater(len(frame), 50)
+        self.assertTrue(((frame['max'] - frame['min']) == 9).all())
+        self.assertTrue(((frame['mean'] - (frame['min'] + frame['max'])/2).abs() < 1e-9).all())
+
+        # So is the mean of the heatmap's one cell
+        self.assertAlmostEqual(grid.means()[0, 0], (aggregator.mean*aggregator.weight).sum()/aggregator.weight.sum())
+
+        # Readings that never change leave the rate at its lowest
+        simulation = script.simulated.SimulatedClient(stations=100, clock=script.clocks.VirtualClock())
+        aggregator = script.run_sampling(-60, -180, 70, 180, 10, 8, script.Options(connect_timeout=5, read_timeout=5, simulation=simulation, min_rate=1), script.Context(aggregator=script.stations.StationAggregator()))
+        self.assertEqual(aggregator.samples, 10)
+
+    def test_main_simulated(self):
+        simulation = script.simulated.SimulatedClient(stations=50)
+        with patch('sys.stdout', new_callable=io.StringIO) as stdout, patch('script.API_KEY', None):
+            aggregator = script.main(-60, -180, 70, 180, 3, 2, output='quiet', simulation=simulation)
+        self.assertEqual(aggregator.samples, 6)
+        self.assertIn('Simulated Station', stdout.getvalue())
+
+    def test_main_station_registry(self):
+        # Stations seen by a run are saved to the registry file, and a later run keeps their ids
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'stations.json')
+            with patch('sys.stdout', new_callable=io.StringIO), patch('script.API_KEY', None):
+                script.main(-60, -180, 70, 180, 1, 2, output='quiet', simulation=script.simulated.SimulatedClient(stations=50), registry=script.station_registry.StationRegistry(path))
+                first = script.station_registry.StationRegistry(path)
+                self.assertGreater(len(first), 40)
+
+                registry = script.station_registry.StationRegistry(path)
+                aggregator = script.main(-60, -180, 70, 180, 1, 2, output='quiet', simulation=script.simulated.SimulatedClient(stations=50), registry=registry)
+            self.assertIs(aggregator.registry, registry)
+            self.assertEqual(registry.uid.tolist(), first.uid.tolist())
+            self.assertEqual(len(aggregator), len(first))
+
+    def test_request_data_tiles(self):
+        event = Event()
+        tiles = [(self.lat1, self.lng1, 49.5, self.lng2), (49.5, self.lng1, self.lat2, self.lng2)]
+
+        with patch('script.http.HTTPClient.get') as mock_api_call:
+            mock_api_call.return_value.json.side_effect = [self.mock_response1, self.mock_response2]
+
+            data = script.request_data(self.lat1, self.lng1, self.lat2, self.lng2, 1, 1, 0, event, script.http.HTTPClient(), tiles=tiles)
+            self.assertEqual(mock_api_call.call_count, 2)
+            self.assertEqual(data['status'], 'ok')
+            self.assertEqual(len(data['data']), 15)
+            self.assertEqual(len({station['uid'] for station in data['data']}), 15)
+
+            mock_api_call.return_value.json.side_effect = [self.mock_response2, self.mock_response3]
+            with script.concurrent.futures.ThreadPoolExecutor() as executor:
+                data = script.request_data(self.lat1, self.lng1, self.lat2, self.lng2, 1, 1, 0, event, script.http.HTTPClient(), tiles=tiles, executor=executor)
+            self.assertEqual(mock_api_call.call_count, 4)
+            self.assertEqual(len(data['data']), 11)
+
+    def test_process_response(self):
+        aggregator = script.stations.StationAggregator()
+        script.process_response(self.mock_response1, aggregator)
+        self.assertEqual(len(aggregator), 14)
+
+        regions = batch.RegionBatch([('South', 49.0, -123.5, 49.25, -122.5), ('Everywhere', 49.0, -123.5, 50.5, -122.5)])
+        script.process_response(self.mock_response1, None, regions)
+        self.assertEqual(len(regions.aggregators['South']), 5)
+        self.assertEqual(len(regions.aggregators['Everywhere']), 14)
+
+    def test_start_threads_parse_workers(self):
+        regions = batch.RegionBatch([('South', 49.0, -123.5, 49.25, -122.5), ('Everywhere', 49.0, -123.5, 50.5, -122.5)])
+        with patch('script.MINUTE', 0.1), patch('script.http.HTTPClient.get') as mock_api_call:
+            # The bodies are shipped to the workers undecoded
+            mock_api_call.side_effect = [Mock(content=json.dumps(response).encode()) for response in [self.mock_response1, self.mock_response2, self.mock_response3, self.mock_response1]]
+            with script.partials.PartialPool(2, regions) as pool:
+                script.start_threads(self.lat1, self.lng1, self.lat2, self.lng2, 2, 2, script.Context(regions=regions, pool=pool), client=script.http.HTTPClient())
+                self.assertFalse(pool.pending)
+
+        expected = batch.RegionBatch([('South', 49.0, -123.5, 49.25, -122.5), ('Everywhere', 49.0, -123.5, 50.5, -122.5)])
+        for response in [self.mock_response1, self.mock_response2, self.mock_response3, self.mock_response1]:
+            script.process_response(response, None, expected, verbose=False)
+        for name in ['South', 'Everywhere']:
+            self.assertEqual(regions.aggregators[name].samples, 4)
+            frame = regions.aggregators[name].to_frame()
+            reference = expected.aggregators[name].to_frame()
+            self.assertEqual(list(frame['station.name']), list(reference['station.name']))
+            self.assertTrue(((frame['mean'] - reference['mean']).abs() < 1e-9).all())
+
+    def test_run_sampling_parse_workers(self):
+        # Decoding on parse workers gives the same averages, rate changes and unchanged readings as decoding in the sampling process
+        results = []
+        for parse_workers in [None, 2]:
+            script.metrics.registry.reset()
+            simulation = script.simulated.SimulatedClient(stations=100, clock=script.clocks.VirtualClock())
+            simulation.stations.update_every = 60
+            aggregator = script.run_sampling(-60, -180, 70, 180, 6, 8, script.Options(connect_timeout=5, read_timeout=5, weighting='reading', simulation=simulation, min_rate=1, parse_workers=parse_workers), script.Context(aggregator=script.stations.StationAggregator()))
+            results.append((aggregator.samples, script.metrics.registry.counters['deduplicated_records'], aggregator.to_frame()))
+
+        (samples, deduplicated, frame), (pooled_samples, pooled_deduplicated, pooled_frame) = results
+        self.assertEqual(pooled_samples, samples)
+        self.assertGreater(samples, 6)
+        self.assertEqual(pooled_deduplicated, deduplicated)
+        self.assertGreater(deduplicated, 0)
+        self.assertEqual(list(pooled_frame['station.name']), list(frame['station.name']))
+        self.assertTrue(((pooled_frame['mean'] - frame['mean']).abs() < 1e-9).all())
+        self.assertTrue((pooled_frame['count'] == frame['count']).all())
+
+    def test_process_response_changes(self):
+        aggregator = script.stations.StationAggregator()
+        changes = script.readings.ChangeFilter()
+        for _ in range(3):
+            script.process_response(self.mock_response1, aggregator, changes=changes)
+
+        self.assertEqual(aggregator.samples, 3)
+        self.assertEqual(changes.skipped, 30)
+        self.assertEqual(aggregator.to_frame()['count'].max(), 1)
+
+    def test_start_threads(self):
+        responses = [self.mock_response1, self.mock_response2, self.mock_response3, self.mock_empty_response]
+
+        with patch('script.MINUTE', 0.2), patch('script.http.HTTPClient.get') as mock_api_call:
+            mock_api_call.return_value.json.side_effect = responses*2
+
+            aggregator = script.start_threads(self.lat1, self.lng1, self.lat2, self.lng2, 2, 4, client=script.http.HTTPClient())
+
+            self.assertEqual(mock_api_call.call_count, 8)
+            self.assertEqual(aggregator.samples, 8)
+            self.assertEqual(len(aggregator), 14)
+
+    def test_print_rolling(self):
+        aggregator = script.rolling.RollingAggregator(windows=(1, 2))
+        aggregator.add_columns(['A', 'B'], [10, 30])
+        aggregator.advance(1)
+        aggregator.add_columns(['A'], [20])
+        with patch('sys.stdout', new=io.StringIO()) as output:
+            script.print_rolling(aggregator, 1)
+        self.assertEqual(output.getvalue().splitlines(), ['Rolling average AQI over the last 1/2 minute(s) at minute 1:', 'Average AQI: 20.0 / 15.0, Station 1: A', 'Average AQI: - / 30.0, Station 2: B', ''])
+
+    def test_run_daemon(self):
+        with server.serve(stations=2000) as stand_in, patch('script.API_URL', stand_in.url), patch('script.MINUTE', 0.1):
+            with patch('script.print_rolling', side_effect=[None, KeyboardInterrupt, None]) as mock_print_rolling:
+                aggregator = script.run_daemon(40, -130, 55, -100, 2, script.Options(connect_timeout=1, read_timeout=5, emit_every=2, windows=(2, 4)))
+
+            self.assertEqual([call.args[1] for call in mock_print_rolling.call_args_list], [2, 4, 3])
+            self.assertEqual(stand_in.requests, 8)
+            self.assertGreater(len(aggregator), 0)
+            self.assertEqual(aggregator.window_counts[0, :len(aggregator)].max(), 4)
+            self.assertEqual(aggregator.window_counts[1, :len(aggregator)].max(), 8)
+
+    def test_main_store(self):
+        with server.serve(stations=2000) as stand_in, patch('script.API_URL', stand_in.url), patch('script.MINUTE', 0.05), tempfile.TemporaryDirectory() as directory:
+            with script.records.SampleStore(directory, (40, -130, 55, -100), 2) as store:
+                script.main(40, -130, 55, -100, 2, 2, store=store)
+                self.assertEqual((store.minutes, store.samples), (2, 4))
+
+            # Resuming the same store only samples the minutes that are left
+            with script.records.SampleStore(directory, (40, -130, 55, -100), 2) as store:
+                script.main(40, -130, 55, -100, 3, 2, store=store)
+                self.assertEqual((store.minutes, store.samples), (3, 6))
+                self.assertEqual(stand_in.requests, 6)
+                self.assertTrue((store.aggregate().to_frame()['count'] == 6).all())
+
+    def test_main_grid(self):
+        with server.serve(stations=2000) as stand_in, patch('script.API_URL', stand_in.url), patch('script.MINUTE', 0.05), tempfile.TemporaryDirectory() as directory:
+            path = f'{directory}/grid.jsonl'
+            with patch('sys.stdout', new=io.StringIO()) as output:
+                script.main(40, -130, 55, -100, 2, 2, grid_size=5, grid_file=path)
+            self.assertIn('Average AQI per 5 degree cell over 4 sample(s)', output.getvalue())
+
+            with open(path) as f:
+                lines = [json.loads(line) for line in f]
+            self.assertEqual(lines[0]['rows'], 3)
+            self.assertEqual(lines[0]['columns'], 6)
+            self.assertEqual([line['sample'] for line in lines[1:]], [1, 2, 3, 4, None])
+            readings = sum(sum(row) for row in lines[-1]['count'])
+            self.assertTrue(readings > 0 and readings % 4 == 0)
+            self.assertEqual(len(lines[-1]['mean']), 3)
+
+    def test_main_output(self):
+        with server.serve(stations=2000) as stand_in, patch('script.API_URL', stand_in.url), patch('script.MINUTE', 0.05):
+            with patch('sys.stdout', new=io.StringIO()) as output, patch('sys.stderr', new=io.StringIO()) as progress:
+                aggregator = script.main(40, -130, 55, -100, 2, 2, statistics=['p50'], output='json')
+            lines = [json.loads(line) for line in output.getvalue().splitlines()]
+            self.assertEqual([line['sample'] for line in lines[:4]], [1, 2, 3, 4])
+            self.assertEqual(len(lines[0]['stations']['aqi']), len(lines[0]['stations']['name']))
+            self.assertEqual([line['station'] for line in lines[4:]], list(aggregator.to_frame()['station.name']))
+            self.assertEqual(set(lines[4]), {'station', 'mean', 'count', 'min', 'max', 'std', 'p50'})
+            self.assertIn('Schedule jitter', progress.getvalue())
+
+            with patch('sys.stdout', new=io.StringIO()) as output:
+                script.main(40, -130, 55, -100, 1, 2, output='quiet')
+            lines = output.getvalue().splitlines()
+            self.assertTrue(lines[0].startswith('Average of 2 PM2.5 readings'))
+            self.assertTrue(all(line.startswith('Average AQI: ') for line in lines[1:]))
+
+    def test_replay(self):
+        with server.serve(stations=2000) as stand_in, patch('script.API_URL', stand_in.url), patch('script.MINUTE', 0.05), tempfile.TemporaryDirectory() as directory:
+            path = f'{directory}/responses.ndjson.gz'
+            with script.recording(path) as recorder:
+                aggregator = script.run_sampling(40, -130, 55, -100, 3, 2, script.Options(connect_timeout=5, read_timeout=5), script.Context(recorder=recorder))
+
+            expected = aggregator.to_frame()
+            for workers in [None, 2]:
+                replayed = script.replay(path, workers=workers, chunk_size=2)
+                self.assertEqual(replayed.samples, 6)
+                frame = replayed.to_frame()
+                self.assertEqual(list(frame['station.name']), list(expected['station.name']))
+                self.assertTrue((frame['mean'] - expected['mean']).abs().max() < 1e-9)
+                self.assertTrue((frame['count'] == expected['count']).all())
+
+            # Error responses are validated on replay just as they were while sampling
+            with script.response_log.ResponseLog(path) as log:
+                log.write(6, [{'status': 'error', 'data': 'Invalid key'}])
+            with self.assertRaises(script.exceptions.APIInvalidKeyError):
+                script.replay(path)
+
+    def test_start_tasks(self):
+        class MockClient:
+            def __init__(self, responses):
+                self.responses = responses
+                self.calls = 0
+
+            async def get_json(self, url):
+                response = self.responses[self.calls % len(self.responses)]
+                self.calls += 1
+                return response
+
+        with patch('script.MINUTE', 0.01):
+            client = MockClient([self.mock_response1, self.mock_response2, self.mock_response3, self.mock_empty_response])
+            aggregator = asyncio.run(script.start_tasks(self.lat1, self.lng1, self.lat2, self.lng2, 2, 4, client))
+
+            self.assertEqual(client.calls, 8)
+            self.assertEqual(aggregator.samples, 8)
+            frame = aggregator.to_frame().set_index('station.name')
+            self.assertEqual(len(frame), 14)
+            self.assertEqual(frame.loc['North Delta, British Comlumbia, Canada', 'count'], 4)
+            self.assertEqual(frame.loc['Burnaby South, British Comlumbia, Canada', 'count'], 2)
+
+            client = MockClient([{'status': 'error', 'data': 'Over quota'}])
+            with self.assertRaises(script.exceptions.APIRequestQuotaError):
+                asyncio.run(script.start_tasks(self.lat1, self.lng1, self.lat2, self.lng2, 2, 4, client))
+            self.assertEqual(client.calls, 1)
+
+    def test_request_data_async(self):
+        class MockClient:
+            async def get_json(self, url):
+                raise asyncio.TimeoutError
+
+        async def run():
+            cancel = asyncio.Event()
+            self.assertIsNone(await script.request_data_async(self.lat1, self.lng1, self.lat2, self.lng2, 1, 1, 0, cancel, MockClient()))
+
+            cancel.set()
+            self.assertIsNone(await script.request_data_async(self.lat1, self.lng1, self.lat2, self.lng2, 1, 2, 1, cancel, MockClient()))
+
+        asyncio.run(run())
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,50 @@
+import unittest
+import requests
+from benchmarks import server
+
+class TestServer(unittest.TestCase):
+
+    def get(self, url, token='test', latlng='-90,-180,90,180'):
+        return requests.get(f'{url}/v2/map/bounds?latlng={latlng}&networks=all&token={token}', timeout=5)
+
+    def test_StandInServer(self):
+        with server.serve(stations=200) as stand_in:
+            response = self.get(stand_in.url)
+            self.assertEqual(response.status_code, 200)
+
+            data = response.json()
+            self.assertEqual(data['status'], 'ok')
+            self.assertEqual(len(data['data']), 200)
+            self.assertEqual(set(data['data'][0]), {'lat', 'lon', 'uid', 'aqi', 'station'})
+            self.assertEqual(set(data['data'][0]['station']), {'name', 'time'})
+
+            data = self.get(stand_in.url, latlng='0,0,70,180').json()
+            self.assertLess(len(data['data']), 200)
+            for station in data['data']:
+                self.assertTrue(0 <= station['lat'] <= 70 and 0 <= station['lon'] <= 180)
+
+            self.assertEqual(self.get(stand_in.url, token=server.OVER_QUOTA_TOKEN).json(), {'status': 'error', 'data': 'Over quota'})
+            self.assertEqual(self.get(stand_in.url, token=server.INVALID_KEY_TOKEN).json(), {'status': 'error', 'data': 'Invalid key'})
+            self.assertEqual(stand_in.requests, 4)
+
+    def test_StandInServer_error_rates(self):
+        with server.serve(stations=10, error_rate=1.0) as stand_in:
+            self.assertEqual(self.get(stand_in.url).status_code, 500)
+
+        with server.serve(stations=10, quota_rate=1.0) as stand_in:
+            self.assertEqual(self.get(stand_in.url).json()['data'], 'Over quota')
+
+    def test_StandInServer_token_quota(self):
+        with server.serve(stations=10, token_quota=2, quota_window=3600) as stand_in:
+            self.assertEqual([self.get(stand_in.url, token='first').json()['status'] for _ in range(3)], ['ok', 'ok', 'error'])
+            self.assertEqual(self.get(stand_in.url, token='second').json()['status'], 'ok')
+
+    def test_Latency(self):
+        self.assertEqual(server.Latency('fixed', 0.2).sample(), 0.2)
+        for _ in range(100):
+            self.assertTrue(0.1 <= server.Latency('uniform', 0.2, 0.1).sample() <= 0.3)
+            self.assertGreaterEqual(server.Latency('exponential', 0.2).sample(), 0)
+            self.assertGreater(server.Latency('lognormal', 0.2, 0.5).sample(), 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+import os
+import tempfile
+from clients import simulated
+from schedulers import clocks
+from storage import responses
+
+class TestSimulated(unittest.TestCase):
+
+    def test_SyntheticStations(self):
+        clock = clocks.VirtualClock(epoch=0.0)
+        stations = simulated.SyntheticStations(500, seed=1, update_every=3600, clock=clock)
+
+        inside = stations.within(0, 0, 40, 90)
+        self.assertTrue(inside)
+        for station in inside:
+            self.assertTrue(0 <= station['lat'] <= 40 and 0 <= station['lon'] <= 90)
+            self.assertEqual(station['station']['name'], f'Simulated Station {station["uid"]}')
+        self.assertEqual(len(stations.within(-90, -180, 90, 180)), 500)
+
+        # Readings stay the same within an update, and change on the next one
+        self.assertEqual(stations.within(0, 0, 40, 90), inside)
+        clock.advance(3600)
+        updated = stations.within(0, 0, 40, 90)
+        self.assertNotEqual([station['aqi'] for station in updated], [station['aqi'] for station in inside])
+        self.assertEqual(updated[0]['station']['time'], '1970-01-01T01:00:00+00:00')
+
+        # The same seed gives the same stations
+        self.assertEqual(simulated.SyntheticStations(500, seed=1, clock=clocks.VirtualClock()).within(0, 0, 40, 90), inside)
+
+    def test_SimulatedClient(self):
+        client = simulated.SimulatedClient(stations=200, latency=0.5)
+
+        async def main():
+            async with client:
+                return await client.get_json('http://localhost/v2/map/bounds?latlng=10,20,-10,-20&networks=all&token=simulated')
+
+        response = clocks.run(main(), client.clock)
+        self.assertEqual(response['status'], 'ok')
+        self.assertTrue(all(-10 <= station['lat'] <= 10 and -20 <= station['lon'] <= 20 for station in response['data']))
+        self.assertEqual(client.calls, 1)
+        self.assertEqual(client.clock.monotonic(), 0.5)
+
+    def test_from_path(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'responses.ndjson.gz')
+            first = {'status': 'ok', 'data': [{'lat': 1, 'lon': 1, 'uid': 1, 'aqi': '20', 'station': {'name': 'A'}}]}
+            second = {'status': 'ok', 'data': [{'lat': 2, 'lon': 2, 'uid': 2, 'aqi': '30', 'station': {'name': 'B'}}]}
+            with responses.ResponseLog(path) as log:
+                log.write(0, [first])
+                log.write(1, [first, second])
+
+            # Recorded samples are answered in turn, tiles merged, starting over once they run out
+            client = simulated.from_path(path)
+            replies = [clocks.run(client.get_json('http://localhost/'), client.clock) for _ in range(3)]
+            self.assertEqual(replies[0], first)
+            self.assertEqual(sorted(station['uid'] for station in replies[1]['data']), [1, 2])
+            self.assertEqual(replies[2], first)
+
+            empty = os.path.join(directory, 'empty.ndjson.gz')
+            with responses.ResponseLog(empty):
+                pass
+            with self.assertRaises(ValueError):
+                clocks.run(simulated.from_path(empty).get_json('http://localhost/'), clocks.VirtualClock())
+
+if __name__ == '__main__':
+    unittest.main()
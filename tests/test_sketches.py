@@ -0,0 +1,43 @@
+import unittest
+import numpy as np
+from aggregators import sketches
+
+class TestSketches(unittest.TestCase):
+
+    def test_QuantileSketch(self):
+        generator = np.random.default_rng(0)
+        values = [generator.integers(1, 500, 2000).astype(float), generator.integers(0, 50, 500).astype(float)]
+        sketch = sketches.QuantileSketch(capacity=2, accuracy=0.01)
+        for row, readings in enumerate(values):
+            sketch.add(np.full(len(readings), row), readings)
+
+        estimates = sketch.quantiles([0.5, 0.95, 0.99], 2)
+        for row, readings in enumerate(values):
+            for column, quantile in enumerate([0.5, 0.95, 0.99]):
+                exact = np.quantile(readings, quantile, method='lower')
+                self.assertLessEqual(abs(estimates[row, column] - exact), 0.01*exact + 1e-9)
+
+    def test_QuantileSketch_merge(self):
+        whole = sketches.QuantileSketch(capacity=1)
+        first = sketches.QuantileSketch(capacity=1)
+        second = sketches.QuantileSketch(capacity=1)
+        readings = np.arange(0, 300, dtype=float)
+        whole.add(np.zeros(300, dtype=np.intp), readings)
+        first.add(np.zeros(100, dtype=np.intp), readings[:100])
+        second.add(np.zeros(200, dtype=np.intp), readings[100:])
+
+        first.merge(second, np.array([0]))
+        np.testing.assert_array_equal(first.counts, whole.counts)
+        with self.assertRaises(ValueError):
+            first.merge(sketches.QuantileSketch(capacity=1, accuracy=0.05), np.array([0]))
+
+    def test_QuantileSketch_bounds(self):
+        sketch = sketches.QuantileSketch(capacity=2)
+        sketch.add(np.array([0, 0, 0]), np.array([0.0, 0.0, 5000.0]))
+        estimates = sketch.quantiles([0.0, 0.5, 1.0], 2)
+        self.assertEqual(list(estimates[0, :2]), [0.0, 0.0])
+        self.assertGreater(estimates[0, 2], 0.98*sketches.MAX_VALUE)
+        self.assertTrue(np.isnan(estimates[1]).all())
+
+if __name__ == '__main__':
+    unittest.main()
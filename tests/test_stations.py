@@ -0,0 +1,156 @@
+import unittest
+import numpy as np
+import pandas as pd
+from aggregators import stations
+from parsers import columnar
+from storage import registry
+
+class TestStations(unittest.TestCase):
+
+    def setUp(self):
+        self.samples = [
+            pd.DataFrame({'aqi': [20.0, 26.0, 13.0], 'station.name': ['North Delta', 'Burnaby South', 'Whistler Meadow Park']}),
+            pd.DataFrame({'aqi': [22.0, 14.0], 'station.name': ['North Delta', 'Whistler Meadow Park']}),
+            pd.DataFrame(columns=['aqi', 'station.name']),
+            pd.DataFrame({'aqi': [35.0, 27.0, 10.0], 'station.name': ['Richmond South', 'North Delta', 'Burnaby South']})
+        ]
+
+    def test_StationAggregator(self):
+        aggregator = stations.StationAggregator(capacity=1)
+        for sample in self.samples:
+            aggregator.add(sample)
+
+        self.assertEqual(aggregator.samples, 4)
+        self.assertEqual(len(aggregator), 4)
+
+        frame = aggregator.to_frame()
+        expected = pd.concat(self.samples[:2] + self.samples[3:], ignore_index=True).groupby('station.name')['aqi'].agg(['mean', 'count', 'min', 'max', 'std'])
+
+        self.assertEqual(list(frame['station.name']), ['Richmond South', 'North Delta', 'Burnaby South', 'Whistler Meadow Park'])
+        for _, row in frame.iterrows():
+            reference = expected.loc[row['station.name']]
+            self.assertAlmostEqual(row['mean'], reference['mean'])
+            self.assertEqual(row['count'], reference['count'])
+            self.assertEqual(row['min'], reference['min'])
+            self.assertEqual(row['max'], reference['max'])
+            if reference['count'] > 1:
+                self.assertAlmostEqual(row['std'], reference['std'])
+            else:
+                self.assertTrue(pd.isna(row['std']))
+
+    def test_StationAggregator_repeated_station(self):
+        aggregator = stations.StationAggregator()
+        aggregator.add(pd.DataFrame({'aqi': [10.0, 20.0], 'station.name': ['A', 'A']}))
+        aggregator.add(pd.DataFrame({'aqi': [30.0], 'station.name': ['A']}))
+
+        frame = aggregator.to_frame()
+        self.assertAlmostEqual(frame.loc[0, 'mean'], 20.0)
+        self.assertEqual(frame.loc[0, 'count'], 3)
+        self.assertAlmostEqual(frame.loc[0, 'std'], 10.0)
+
+    def test_StationAggregator_merge(self):
+        whole = stations.StationAggregator()
+        first = stations.StationAggregator()
+        second = stations.StationAggregator(capacity=1)
+        for index, sample in enumerate(self.samples):
+            whole.add(sample)
+            (first if index < 2 else second).add(sample)
+
+        merged = stations.StationAggregator().merge(first).merge(second)
+        self.assertEqual(merged.samples, 4)
+        expected = whole.to_frame()
+        frame = merged.to_frame()
+        self.assertEqual(list(frame['station.name']), list(expected['station.name']))
+        for column in ['mean', 'count', 'min', 'max', 'std']:
+            for value, reference in zip(frame[column], expected[column]):
+                if pd.isna(reference):
+                    self.assertTrue(pd.isna(value))
+                else:
+                    self.assertAlmostEqual(value, reference)
+
+    def test_StationAggregator_percentiles(self):
+        whole = stations.StationAggregator(percentiles=(50, 95))
+        first = stations.StationAggregator(percentiles=(50, 95))
+        second = stations.StationAggregator(capacity=1, percentiles=(50, 95))
+        for index, sample in enumerate(self.samples):
+            whole.add(sample)
+            (first if index < 2 else second).add(sample)
+
+        frame = whole.to_frame().set_index('station.name')
+        merged = first.merge(second).to_frame().set_index('station.name')
+        self.assertAlmostEqual(frame.loc['North Delta', 'p50'], 22.0, delta=0.22)
+        self.assertAlmostEqual(frame.loc['North Delta', 'p95'], 22.0, delta=0.22)
+        self.assertEqual(frame.loc['Richmond South', 'p50'], 35.0)
+        self.assertEqual(list(merged['p95']), list(frame['p95']))
+        self.assertNotIn('p50', stations.StationAggregator().to_frame().columns)
+
+    def test_StationAggregator_weights(self):
+        # A sample that stands for three slots counts like the same readings sampled three times, but its readings are only counted once
+        weighted = stations.StationAggregator(capacity=1, percentiles=(50,))
+        repeated = stations.StationAggregator(percentiles=(50,))
+        weighted.add_columns(['A', 'B'], [10.0, 40.0], 3)
+        weighted.add_columns(['A'], [30.0])
+        for _ in range(3):
+            repeated.add_columns(['A', 'B'], [10.0, 40.0])
+        repeated.add_columns(['A'], [30.0])
+
+        frame = weighted.to_frame().set_index('station.name')
+        expected = repeated.to_frame().set_index('station.name')
+        self.assertAlmostEqual(frame.loc['A', 'mean'], 15.0)
+        self.assertAlmostEqual(frame.loc['A', 'std'], expected.loc['A', 'std'])
+        self.assertEqual(frame.loc['A', 'p50'], expected.loc['A', 'p50'])
+        self.assertEqual(frame.loc['A', 'count'], 2)
+        self.assertEqual(weighted.samples, 2)
+
+        merged = stations.StationAggregator(percentiles=(50,)).merge(weighted).to_frame().set_index('station.name')
+        self.assertAlmostEqual(merged.loc['A', 'mean'], 15.0)
+        self.assertAlmostEqual(merged.loc['A', 'std'], expected.loc['A', 'std'])
+        self.assertEqual(merged.loc['A', 'count'], 2)
+
+    def test_StationAggregator_uids(self):
+        # Stations are told apart by uid rather than name, and aggregators can share one registry
+        shared = registry.StationRegistry()
+        aggregator = stations.StationAggregator(capacity=1, registry=shared)
+        other = stations.StationAggregator(registry=shared)
+        sample = columnar.Sample(np.array([7, 8, 7]), np.array([10.0, 50.0, 20.0]), np.array(['Hope', 'Hope', 'Hope'], dtype=object), np.zeros(3), np.zeros(3))
+        aggregator.add_sample(sample)
+        other.add_sample(columnar.Sample(np.array([9]), np.array([5.0]), np.array(['Delta'], dtype=object), np.zeros(1), np.zeros(1)))
+
+        frame = aggregator.to_frame()
+        self.assertEqual(list(frame['station.name']), ['Hope', 'Hope'])
+        self.assertEqual(list(frame['mean']), [50.0, 15.0])
+        self.assertEqual(len(aggregator), 2)
+        self.assertEqual(len(shared), 3)
+        self.assertEqual(other.names, ['Delta'])
+
+        # Merging an aggregator with a registry of its own interns its stations by uid
+        partial = stations.StationAggregator()
+        partial.add_sample(columnar.Sample(np.array([8, 9]), np.array([30.0, 15.0]), np.array(['Hope', 'Delta'], dtype=object), np.zeros(2), np.zeros(2)))
+        merged = aggregator.merge(partial).to_frame()
+        self.assertEqual(list(merged['mean']), [40.0, 15.0, 15.0])
+        self.assertEqual(list(merged['count']), [2, 2, 1])
+        self.assertEqual(len(shared), 3)
+
+    def test_StationAggregator_negative_uids(self):
+        # Stations with negative uids are real stations, and two sharing a name keep their own rows through a merge
+        response = {'status': 'ok', 'data': [
+            {'lat': 49.1, 'lon': -123.1, 'uid': -344797, 'aqi': '30', 'station': {'name': 'Sensor A'}},
+            {'lat': 49.2, 'lon': -123.2, 'uid': -344798, 'aqi': '50', 'station': {'name': 'Sensor A'}}
+        ]}
+        partial = stations.StationAggregator()
+        partial.add_sample(columnar.parse(response))
+        merged = stations.StationAggregator().merge(partial).to_frame()
+        self.assertEqual(list(merged['station.name']), ['Sensor A', 'Sensor A'])
+        self.assertEqual(sorted(merged['mean']), [30.0, 50.0])
+        self.assertEqual(list(merged['count']), [1, 1])
+
+    def test_StationAggregator_empty(self):
+        aggregator = stations.StationAggregator()
+        aggregator.add(pd.DataFrame(columns=['aqi', 'station.name']))
+        aggregator.add(None)
+
+        self.assertEqual(len(aggregator), 0)
+        self.assertTrue(aggregator.to_frame().empty)
+
+if __name__ == '__main__':
+    unittest.main()
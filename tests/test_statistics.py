@@ -0,0 +1,21 @@
+import unittest
+from argparse import ArgumentTypeError
+from evaluators import statistics
+
+class TestStatistics(unittest.TestCase):
+
+    def test_statistic(self):
+        self.assertEqual(statistics.statistic('std'), 'std')
+        self.assertEqual(statistics.statistic('p95'), 'p95')
+        self.assertEqual(statistics.statistic('p99.90'), 'p99.9')
+        self.assertEqual(statistics.statistic('p100'), 'p100')
+        self.assertRaises(ArgumentTypeError, statistics.statistic, 'p101')
+        self.assertRaises(ArgumentTypeError, statistics.statistic, 'pabc')
+        self.assertRaises(ArgumentTypeError, statistics.statistic, 'mode')
+
+    def test_percentiles(self):
+        self.assertEqual(statistics.percentiles(['std', 'p50', 'max', 'p99.9']), (50.0, 99.9))
+        self.assertEqual(statistics.percentiles([]), ())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+import itertools
+from regions import tiles
+
+class TestTiles(unittest.TestCase):
+
+    def area(self, box):
+        return (box[2] - box[0])*(box[3] - box[1])
+
+    def covers(self, boxes, lat, lng):
+        return any(box[0] <= lat <= box[2] and box[1] <= lng <= box[3] for box in boxes)
+
+    def test_normalize(self):
+        self.assertEqual(tiles.normalize(50.2, -122.8, 49.1, -123.6), (49.1, -123.6, 50.2, -122.8))
+        self.assertEqual(tiles.normalize(49.1, -123.6, 50.2, -122.8), (49.1, -123.6, 50.2, -122.8))
+
+    def test_union_tiles(self):
+        self.assertEqual(tiles.union_tiles([(0, 0, 2, 2)]), [(0, 0, 2, 2)])
+        self.assertEqual(tiles.union_tiles([(0, 0, 2, 2), (0, 0, 2, 2), (0.5, 0.5, 1, 1)]), [(0, 0, 2, 2)])
+        self.assertEqual(tiles.union_tiles([(0, 0, 1, 1), (0, 1, 1, 2)]), [(0, 0, 1, 2)])
+        self.assertEqual(len(tiles.union_tiles([(0, 0, 1, 1), (5, 5, 6, 6)])), 2)
+
+        boxes = [(0, 0, 2, 2), (1, 1, 3, 3), (2.5, -1, 4, 0.5)]
+        result = tiles.union_tiles(boxes)
+
+        # Tiles never overlap, and cover exactly the union of the boxes
+        for first, second in itertools.combinations(result, 2):
+            overlap = (min(first[2], second[2]) - max(first[0], second[0]), min(first[3], second[3]) - max(first[1], second[1]))
+            self.assertFalse(overlap[0] > 0 and overlap[1] > 0)
+        self.assertAlmostEqual(sum(self.area(tile) for tile in result), 4 + 4 - 1 + 1.5*1.5)
+        for lat, lng in [(0.5, 0.5), (2.5, 2.5), (3, -0.5), (1.5, 2.5)]:
+            self.assertEqual(self.covers(result, lat, lng), self.covers(boxes, lat, lng))
+
+    def test_grid_tiles(self):
+        grid = tiles.grid_tiles((0, 0, 2, 3), 1)
+        self.assertEqual(len(grid), 6)
+        self.assertAlmostEqual(sum(self.area(tile) for tile in grid), 6)
+
+        grid = tiles.grid_tiles((2, 3, 0, 0), 1.5)
+        self.assertEqual(len(grid), 4)
+        self.assertEqual(grid[0], (0, 0, 1, 1.5))
+        self.assertEqual(grid[-1], (1, 1.5, 2, 3))
+
+        self.assertEqual(tiles.grid_tiles((0, 0, 1, 1), 5), [(0, 0, 1, 1)])
+
+    def test_quarter(self):
+        self.assertEqual(tiles.quarter((0, 0, 2, 4)), [(0, 0, 1, 2), (0, 2, 1, 4), (1, 0, 2, 2), (1, 2, 2, 4)])
+
+    def test_Tiler(self):
+        self.assertEqual(tiles.Tiler([(0, 0, 2, 2)]).tiles(), [(0, 0, 2, 2)])
+        self.assertEqual(len(tiles.Tiler([(0, 0, 2, 2)], tile_size=1).tiles()), 4)
+
+        response = {'status': 'ok', 'data': [{'uid': uid, 'lat': 0.1*uid, 'lon': 0.1*uid} for uid in range(1, 5)] + [{'uid': 9, 'lat': 1.9, 'lon': 0.1}]}
+
+        tiler = tiles.Tiler([(0, 0, 2, 2)], tile_size=1, max_stations=3, min_size=0.25)
+        tiler.observe(response)
+        self.assertEqual(len(tiler.tiles()), 7)
+        self.assertIn((0, 0, 0.5, 0.5), tiler.tiles())
+        self.assertIn((1, 0, 2, 1), tiler.tiles())
+
+        # Tiles stop being split once they reach the minimum size
+        for _ in range(5):
+            tiler.observe(response)
+        self.assertEqual(min(tile[2] - tile[0] for tile in tiler.tiles()), 0.25)
+
+        tiler = tiles.Tiler([(0, 0, 2, 2)])
+        tiler.observe(response)
+        self.assertEqual(tiler.tiles(), [(0, 0, 2, 2)])
+
+    def test_merge_responses(self):
+        first = {'status': 'ok', 'data': [{'uid': 1, 'aqi': '10'}, {'uid': 2, 'aqi': '20'}]}
+        second = {'status': 'ok', 'data': [{'uid': 2, 'aqi': '20'}, {'uid': 3, 'aqi': '30'}]}
+        error = {'status': 'error', 'data': 'Unknown error'}
+
+        merged = tiles.merge_responses([first, second, error])
+        self.assertEqual(merged['status'], 'ok')
+        self.assertEqual([station['uid'] for station in merged['data']], [1, 2, 3])
+
+if __name__ == '__main__':
+    unittest.main()